@@ -1,18 +1,31 @@
-from cProfile import label
 from datetime import datetime
-from dotenv import load_dotenv
+from dotenv import load_dotenv, dotenv_values
 import requests
 import logging
 import json
 import logging.handlers as handlers
 import os
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from collections import Counter
 from http import HTTPStatus
 import time
 import argparse
 import csv
 import re
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+import gzip
+import queue
+import atexit
+import contextvars
+from contextlib import nullcontext, contextmanager
 
 # Rich imports for beautiful console output
 from rich.console import Console
@@ -20,16 +33,8 @@ from rich.panel import Panel
 from rich.table import Table
 from rich.text import Text
 from rich.prompt import Prompt, Confirm
-from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.logging import RichHandler
-from rich.tree import Tree
-from rich.columns import Columns
-from rich.align import Align
-from rich.layout import Layout
-from rich.live import Live
-from rich.status import Status
 from rich import box
-from rich.markdown import Markdown
 
 DEFAULT_360_SCIM_API_URL = "https://{domain_id}.scim-api.passport.yandex.net"
 DEFAULT_360_API_URL = "https://api360.yandex.net"
@@ -37,6 +42,12 @@ DEFAULT_360_API_URL_V2 = "https://cloud-api.yandex.net/v1/admin/org"
 ITEMS_PER_PAGE = 100
 MAX_RETRIES = 3
 LOG_FILE = "360_text_admin_console.log"
+# Максимальная длина тела запроса/ответа в логе (LOG_BODY_LIMIT, 0 - без ограничения)
+LOG_BODY_LIMIT = 2000
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+# Кэш ответа whoami (проверка OAuth токена при запуске): каталог и время жизни по умолчанию (WHOAMI_CACHE_TTL, 0 - без кэша)
+WHOAMI_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "y360_text_admin_console")
+DEFAULT_WHOAMI_CACHE_TTL_SEC = 300
 RETRIES_DELAY_SEC = 2
 SLEEP_TIME_BETWEEN_API_CALLS = 0.5
 ALL_USERS_REFRESH_IN_MINUTES = 15
@@ -49,8 +60,49 @@ GROUPS_PER_PAGE_FROM_API = 1000
 DEPARTMENTS_PER_PAGE_FROM_API = 1000
 DEPS_SEPARATOR = '|'
 ALL_DEPS_REFRESH_IN_MINUTES = 15
+# Минимальная схожесть (0..1) и количество кандидатов при нечетком поиске пользователей
+FUZZY_SEARCH_MIN_SCORE = 0.35
+FUZZY_SEARCH_MAX_CANDIDATES = 10
+# Колонки выгрузки пользователей в файл (вложенные поля разворачиваются через точку)
+API_USERS_EXPORT_COLUMNS = [
+    "id", "nickname", "email", "name.first", "name.middle", "name.last", "displayName",
+    "position", "departmentId", "gender", "birthday", "about", "externalId",
+    "isAdmin", "isRobot", "isDismissed", "isEnabled", "isEnabledUpdatedAt",
+    "timezone", "language", "createdAt", "updatedAt", "avatarId",
+    "aliases", "groups", "contacts",
+]
+SCIM_USERS_EXPORT_COLUMNS = [
+    "id", "userName", "displayName", "nickName", "name.givenName", "name.middleName", "name.familyName",
+    "title", "active", "externalId", "emails", "phoneNumbers",
+    "urn:ietf:params:scim:schemas:extension:enterprise:2.0:User.department",
+    "urn:ietf:params:scim:schemas:extension:yandex360:2.0:User.aliases",
+    "meta.created", "meta.lastModified",
+]
+EXPORT_LIST_SEPARATOR = ","
+DEFAULT_EMAIL_EXPORT_COLUMNS = ["nickname", "new_DefaultEmail", "new_DisplayName", "old_DefaultEmail", "old_DisplayName", "uid"]
+FORWARD_RULES_EXPORT_COLUMNS = ["uid", "nickname", "displayName", "isEnabled", "forwardRules", "Autoreplays"]
+USERS_2FA_EXPORT_COLUMNS = [
+    "uid", "nickname", "displayName", "isEnabled", "isAdmin", "domain2FAEnabled", "hasSecurityPhone",
+    "personal2FAEnabled", "global2FAEnabled", "global2FADuration", "global2FAPolicy", "email", "department",
+]
+# Форматы файлов выгрузки: csv (с разделителем ;) или jsonl (одна JSON-запись на строку)
+EXPORT_FORMATS = ["csv", "jsonl"]
+# Журнал долгих выгрузок для продолжения после прерывания: <файл выгрузки>.journal.jsonl
+JOB_JOURNAL_SUFFIX = ".journal.jsonl"
+# Количество одновременных запросов к API при массовых операциях
+DEFAULT_MAX_PARALLEL_API_CALLS = 8
+# Ограничение частоты запросов к API (запросов в секунду, 0 - без ограничения)
+DEFAULT_API_RATE_LIMIT = 0
 
 EXIT_CODE = 1
+# Демон поиска (подкоманда serve): адрес по умолчанию и время жизни кэша прав отправки в группы
+DAEMON_DEFAULT_HOST = "127.0.0.1"
+DAEMON_DEFAULT_PORT = 8360
+DAEMON_PERMISSIONS_TTL_SEC = 60
+# Коды завершения в неинтерактивном режиме (подкоманды)
+CLI_EXIT_OK = 0
+CLI_EXIT_FAILED = 1
+CLI_EXIT_USAGE = 2
 
 # Необходимые права доступа для работы скрипта
 NEEDED_PERMISSIONS = [
@@ -72,8 +124,52 @@ NEEDED_PERMISSIONS = [
 
 ]
 
+class AppConsole(Console):
+    """Console whose spinners can be switched off when several commands print at once (rich allows only one live display)."""
+    spinners = True
+
+    def status(self, *args, **kwargs):
+        if not self.spinners:
+            return nullcontext()
+        return super().status(*args, **kwargs)
+
 # Initialize Rich console
-console = Console()
+console = AppConsole()
+
+# Name of organization processed by the current thread in multi-org mode
+current_org = contextvars.ContextVar("current_org", default=None)
+
+class OrgLogFilter(logging.Filter):
+    """Prefixes log messages with organization name in multi-org mode."""
+    def filter(self, record):
+        org = current_org.get()
+        if org is not None:
+            record.msg = f"{org.replace('%', '%%') if record.args else org} | {record.msg}"
+        return True
+
+class LogBody:
+    """
+    Request or response body for log message: serialized and truncated to LOG_BODY_LIMIT only when record is formatted
+    (for log file - in listener thread, so body must not be modified after logging).
+    """
+    __slots__ = ("body",)
+
+    def __init__(self, body):
+        self.body = body
+
+    def __str__(self):
+        text = self.body if isinstance(self.body, str) else json.dumps(self.body, ensure_ascii=False, default=str)
+        if LOG_BODY_LIMIT and len(text) > LOG_BODY_LIMIT:
+            return f"{text[:LOG_BODY_LIMIT]}... ({len(text)} chars)"
+        return text
+
+class DeferredQueueHandler(handlers.QueueHandler):
+    """
+    Puts records into queue as is: message is formatted by file handler in listener thread,
+    so filtered out messages and LogBody arguments cost nothing in calling thread.
+    """
+    def prepare(self, record):
+        return record
 
 # Setup logger with Rich handler
 logger = logging.getLogger("change_scim_user_name")
@@ -94,8 +190,15 @@ file_handler = handlers.RotatingFileHandler(LOG_FILE, maxBytes=10* 1024 * 1024,
 file_handler.setLevel(logging.DEBUG)
 file_handler.setFormatter(logging.Formatter('%(asctime)s.%(msecs)03d %(levelname)s:\t%(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
 
+# Запись в файл выполняется отдельным потоком: дисковые операции не задерживают потоки вызовов API
+log_queue = queue.SimpleQueue()
+file_log_listener = handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+file_log_listener.start()
+atexit.register(file_log_listener.stop)
+
 logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+logger.addHandler(DeferredQueueHandler(log_queue))
+logger.addFilter(OrgLogFilter())
 
 @dataclass
 class SettingParams:
@@ -109,15 +212,22 @@ class SettingParams:
     default_email_input_file : str
     skip_scim_api_call : bool
     target_group : dict
+    send_perm_group : str
+    send_perm_add_users : str
+    send_perm_remove_users : str
+    send_perm_grant_all : bool
     all_users : list
     all_users_get_timestamp : datetime
+    users_index : "UsersSearchIndex"
     all_scim_users : list
     all_scim_users_get_timestamp : datetime
     all_deps : list
     all_deps_get_timestamp : datetime
+    deps_tree : "DepartmentsTree"
     forward_rules_output_file : str
     shared_mailboxes : list
     shared_mailboxes_get_timestamp : datetime
+    shared_mailboxes_index : "SharedMailboxIndex"
     all_groups : list
     all_groups_get_timestamp : datetime
     ignore_user_domain : bool
@@ -125,48 +235,99 @@ class SettingParams:
     users_2fa_input_file : str
     email_signature_file_prefix : str
     email_signature_input_file : str
+    aliases_check_input_file : str
+    aliases_check_output_file : str
+    alias_owners_map : dict
+    alias_owners_sources : tuple
     email_signature_template_file : str
     email_signature_language : str
     email_signature_is_default : bool
     email_signature_position : list
+    email_signature_skip_unchanged : bool
+    max_parallel_api_calls : int
+    api_rate_limit : float
+    api_session : "ApiSession"
+    export_format : str
+    export_compress : bool
+    interactive : bool
+    assume_yes : bool
     dry_run : bool
-
-def get_settings():
+    output_dir : str
+    show_api_metrics : bool
+    metrics_file : str
+    trace_file : str
+    profile : set
+    profile_dir : str
+
+def get_settings(interactive: bool = True, env: dict = None, configure_process: bool = True):
+    """
+    Build settings from environment (or from given mapping of variables, used for multi-org mode).
+    """
+    if env is None:
+        env = os.environ
+    if configure_process:
+        configure_api_urls(env)
+        configure_logging(env)
     exit_flag = False
     scim_token_bad = False
     oauth_token_bad = False
     settings = SettingParams (
-        scim_token = os.environ.get("SCIM_TOKEN_ARG",""),
-        domain_id = os.environ.get("SCIM_DOMAIN_ID_ARG",""),
-        users_file = os.environ.get("USERS_FILE_ARG"),
-        new_login_default_format = os.environ.get("NEW_LOGIN_DEFAULT_FORMAT_ARG"),
-        oauth_token = os.environ.get("OAUTH_TOKEN_ARG"),
-        org_id = os.environ.get("ORG_ID_ARG"),
-        default_email_output_file = os.environ.get("DEFAULT_EMAIL_OUTPUT_FILE_ARG", "default_email_output.csv"),
-        default_email_input_file = os.environ.get("DEFAULT_EMAIL_INPUT_FILE_ARG", "default_email_input.csv"),
-        forward_rules_output_file  = os.environ.get("DEFAULT_FORWARD_RULES_OUTPUT_FILE_ARG", "forward_rules_output.csv"),
-        users_2fa_output_file  = os.environ.get("DEFAULT_2FA_SETTINGS_OUTPUT_FILE_ARG", "users_2fa_output.csv"),
-        users_2fa_input_file  = os.environ.get("DEFAULT_2FA_SETTINGS_INPUT_FILE_ARG", "users_2fa_input.csv"),
-        email_signature_file_prefix = os.environ.get("EMAIL_SIGNATURE_FILE_PREFIX_ARG", "signature_"),
+        scim_token = env.get("SCIM_TOKEN_ARG",""),
+        domain_id = env.get("SCIM_DOMAIN_ID_ARG",""),
+        users_file = env.get("USERS_FILE_ARG"),
+        new_login_default_format = env.get("NEW_LOGIN_DEFAULT_FORMAT_ARG"),
+        oauth_token = env.get("OAUTH_TOKEN_ARG"),
+        org_id = env.get("ORG_ID_ARG"),
+        default_email_output_file = env.get("DEFAULT_EMAIL_OUTPUT_FILE_ARG", "default_email_output.csv"),
+        default_email_input_file = env.get("DEFAULT_EMAIL_INPUT_FILE_ARG", "default_email_input.csv"),
+        forward_rules_output_file  = env.get("DEFAULT_FORWARD_RULES_OUTPUT_FILE_ARG", "forward_rules_output.csv"),
+        users_2fa_output_file  = env.get("DEFAULT_2FA_SETTINGS_OUTPUT_FILE_ARG", "users_2fa_output.csv"),
+        users_2fa_input_file  = env.get("DEFAULT_2FA_SETTINGS_INPUT_FILE_ARG", "users_2fa_input.csv"),
+        email_signature_file_prefix = env.get("EMAIL_SIGNATURE_FILE_PREFIX_ARG", "signature_"),
         skip_scim_api_call = False,
         target_group = {},
+        send_perm_group = "",
+        send_perm_add_users = "",
+        send_perm_remove_users = "",
+        send_perm_grant_all = False,
         all_users = [],
         all_users_get_timestamp = datetime.now(),
+        users_index = None,
         all_scim_users = [],
         all_scim_users_get_timestamp = datetime.now(),
         all_deps = [],
         all_deps_get_timestamp = datetime.now(),
+        deps_tree = None,
         shared_mailboxes = [],
         shared_mailboxes_get_timestamp = datetime.now(),
+        shared_mailboxes_index = None,
         all_groups = [],
         all_groups_get_timestamp = datetime.now(),
         ignore_user_domain = False,
-        email_signature_input_file = os.environ.get("EMAIL_SIGNATURE_INPUT_FILE", "users_signature_input.csv"),
-        email_signature_template_file = os.environ.get("EMAIL_SIGNATURE_TEMPLATE_FILE", "signature_template.html"),
-        email_signature_language = os.environ.get("EMAIL_SIGNATURE_LANGUAGE", "ru"),
-        email_signature_is_default = os.environ.get("EMAIL_SIGNATURE_IS_DEFAULT", "false").lower() == "true",
-        email_signature_position = os.environ.get("EMAIL_SIGNATURE_POSITION", "bottom"),
-        dry_run = os.environ.get("DRY_RUN", "false").lower() == "true",
+        email_signature_input_file = env.get("EMAIL_SIGNATURE_INPUT_FILE", "users_signature_input.csv"),
+        aliases_check_input_file = env.get("ALIASES_CHECK_INPUT_FILE_ARG", "aliases_check_input.csv"),
+        aliases_check_output_file = env.get("ALIASES_CHECK_OUTPUT_FILE_ARG", "aliases_check_output.csv"),
+        alias_owners_map = {},
+        alias_owners_sources = (),
+        email_signature_template_file = env.get("EMAIL_SIGNATURE_TEMPLATE_FILE", "signature_template.html"),
+        email_signature_language = env.get("EMAIL_SIGNATURE_LANGUAGE", "ru"),
+        email_signature_is_default = env.get("EMAIL_SIGNATURE_IS_DEFAULT", "false").lower() == "true",
+        email_signature_position = env.get("EMAIL_SIGNATURE_POSITION", "bottom"),
+        email_signature_skip_unchanged = env.get("EMAIL_SIGNATURE_SKIP_UNCHANGED", "true").lower() == "true",
+        max_parallel_api_calls = DEFAULT_MAX_PARALLEL_API_CALLS,
+        api_rate_limit = DEFAULT_API_RATE_LIMIT,
+        api_session = None,
+        export_format = env.get("EXPORT_FORMAT", "csv").strip().lower(),
+        export_compress = env.get("EXPORT_COMPRESS", "false").lower() == "true",
+        interactive = interactive,
+        assume_yes = False,
+        dry_run = env.get("DRY_RUN", "false").lower() == "true",
+        output_dir = env.get("OUTPUT_DIR", "").strip(),
+        show_api_metrics = env.get("SHOW_API_METRICS", "true").lower() == "true",
+        metrics_file = env.get("METRICS_FILE", "").strip(),
+        trace_file = env.get("TRACE_FILE", "").strip(),
+        profile = set(),
+        profile_dir = env.get("PROFILE_DIR", "profiles").strip() or "profiles",
     )
 
     if not settings.scim_token:
@@ -204,21 +365,53 @@ def get_settings():
         logger.error("ORG_ID_ARG is not set")
         exit_flag = True
 
-    if not (scim_token_bad or exit_flag):
-        if not check_scim_token(settings.scim_token, settings.domain_id):
+    max_parallel_api_calls = env.get("MAX_PARALLEL_API_CALLS", "").strip()
+    if max_parallel_api_calls:
+        if max_parallel_api_calls.isdigit() and int(max_parallel_api_calls) > 0:
+            settings.max_parallel_api_calls = int(max_parallel_api_calls)
+        else:
+            logger.error(f"MAX_PARALLEL_API_CALLS must be a positive integer, got '{max_parallel_api_calls}'. Using default {DEFAULT_MAX_PARALLEL_API_CALLS}.")
+
+    api_rate_limit = env.get("API_RATE_LIMIT", "").strip()
+    if api_rate_limit:
+        try:
+            settings.api_rate_limit = max(0.0, float(api_rate_limit))
+        except ValueError:
+            logger.error(f"API_RATE_LIMIT must be a number, got '{api_rate_limit}'. Using default {DEFAULT_API_RATE_LIMIT}.")
+
+    whoami_cache_ttl = env.get("WHOAMI_CACHE_TTL", "").strip()
+    if whoami_cache_ttl and not whoami_cache_ttl.isdigit():
+        logger.error(f"WHOAMI_CACHE_TTL must be a non-negative integer, got '{whoami_cache_ttl}'. Using default {DEFAULT_WHOAMI_CACHE_TTL_SEC}.")
+        whoami_cache_ttl = ""
+    whoami_cache_ttl = int(whoami_cache_ttl) if whoami_cache_ttl else DEFAULT_WHOAMI_CACHE_TTL_SEC
+
+    settings.api_session = create_api_session(settings)
+
+    # Токены SCIM и OAuth проверяются одновременно
+    scim_check = oauth_check = None
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        if not (scim_token_bad or exit_flag):
+            scim_check = executor.submit(contextvars.copy_context().run, check_scim_token,
+                                         settings.scim_token, settings.domain_id, settings.api_session)
+        if not (oauth_token_bad or exit_flag):
+            oauth_check = executor.submit(contextvars.copy_context().run, check_token_permissions,
+                                          settings.oauth_token, settings.org_id, NEEDED_PERMISSIONS, settings.api_session, whoami_cache_ttl)
+
+    if scim_check is not None:
+        if not scim_check.result():
             logger.error("SCIM_TOKEN_ARG is not valid")
             scim_token_bad = True
 
-    if not (oauth_token_bad or exit_flag):
-        hard_error, result_ok = check_token_permissions(settings.oauth_token, settings.org_id, NEEDED_PERMISSIONS)
+    if oauth_check is not None:
+        hard_error, result_ok = oauth_check.result()
         if hard_error:            
             logger.debug("OAUTH_TOKEN не является действительным или не имеет необходимых прав доступа")
             console.print("[bold red]❌ OAUTH_TOKEN не является действительным или не имеет необходимых прав доступа.[/bold red]")
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
             oauth_token_bad = True
         elif not result_ok:
             console.print("[bold yellow]⚠️ ВНИМАНИЕ: Функциональность скрипта может быть ограничена. Возможны ошибки при работе с API.[/bold yellow]")
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
 
     if scim_token_bad:
         settings.skip_scim_api_call = True
@@ -226,9 +419,26 @@ def get_settings():
     if oauth_token_bad:
         exit_flag = True
 
-    if os.environ.get("IgnoreUsernameDomain", "false").lower() == "true":
+    if env.get("IgnoreUsernameDomain", "false").lower() == "true":
         settings.ignore_user_domain = True
 
+    if settings.export_format not in EXPORT_FORMATS:
+        logger.error(f"EXPORT_FORMAT must be one of {', '.join(EXPORT_FORMATS)}, got '{settings.export_format}'. Using csv.")
+        settings.export_format = "csv"
+
+    if settings.output_dir:
+        try:
+            os.makedirs(settings.output_dir, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Can not create OUTPUT_DIR {settings.output_dir}: {e}")
+            exit_flag = True
+
+    profile = parse_profile_modes(env.get("PROFILE", ""))
+    if profile is None:
+        logger.error(f"PROFILE must be comma separated list of {', '.join(PROFILE_MODES)}, got '{env.get('PROFILE')}'. Profiling is disabled.")
+    else:
+        settings.profile = profile
+
     if settings.email_signature_position.lower() not in ["under", "bottom"]:
         logger.error("EMAIL_SIGNATURE_POSITION must be 'top' or 'bottom'")
         exit_flag = True
@@ -239,30 +449,341 @@ def get_settings():
     
     return settings
 
-def check_scim_token(scim_token, domain_id):
+# настройки процесса в целом (модульные переменные и уровень логгера), не могут различаться для организаций в multi-org
+PROCESS_ENV_KEYS = ("Y360_API_URL", "Y360_SCIM_API_URL", "Y360_API_URL_V2", "LOG_LEVEL", "LOG_BODY_LIMIT")
+
+def configure_api_urls(env: dict):
+    """
+    Override API base URLs (Y360_API_URL, Y360_SCIM_API_URL, Y360_API_URL_V2), e.g. to point at local mock server.
+    """
+    global DEFAULT_360_API_URL, DEFAULT_360_SCIM_API_URL, DEFAULT_360_API_URL_V2
+    DEFAULT_360_API_URL = env.get("Y360_API_URL", "").strip().rstrip("/") or DEFAULT_360_API_URL
+    DEFAULT_360_SCIM_API_URL = env.get("Y360_SCIM_API_URL", "").strip().rstrip("/") or DEFAULT_360_SCIM_API_URL
+    DEFAULT_360_API_URL_V2 = env.get("Y360_API_URL_V2", "").strip().rstrip("/") or DEFAULT_360_API_URL_V2
+
+def configure_logging(env: dict):
+    """
+    Log level of the run (LOG_LEVEL) and limit of logged request/response bodies (LOG_BODY_LIMIT, 0 - no limit).
+    """
+    global LOG_BODY_LIMIT
+    level = env.get("LOG_LEVEL", "").strip().upper()
+    if level:
+        if level in LOG_LEVELS:
+            logger.setLevel(level)
+        else:
+            logger.error(f"LOG_LEVEL must be one of {', '.join(LOG_LEVELS)}, got '{level}'.")
+    body_limit = env.get("LOG_BODY_LIMIT", "").strip()
+    if body_limit:
+        if body_limit.isdigit():
+            LOG_BODY_LIMIT = int(body_limit)
+        else:
+            logger.error(f"LOG_BODY_LIMIT must be a non-negative integer, got '{body_limit}'. Using {LOG_BODY_LIMIT}.")
+
+def create_api_session(settings: "SettingParams"):
+    return ApiSession(max(settings.max_parallel_api_calls, 10), RateLimiter(settings.api_rate_limit))
+
+class RateLimiter:
+    """
+    Token bucket limiting API calls per second for all threads sharing it. Rate 0 - no limit.
+    """
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Имена параметров пути по предыдущему сегменту: /org/123/users/456 -> /org/{org}/users/{uid}
+ENDPOINT_PARAM_NAMES = {
+    "org": "{org}",
+    "users": "{uid}",
+    "Users": "{uid}",
+    "aliases": "{alias}",
+    "user_rules": "{rule_id}",
+    "shared": "{mailbox_id}",
+    "mail-lists": "{mail_list_id}",
+    "groups": "{group_id}",
+    "departments": "{dep_id}",
+    "scim": "{domain_id}",
+}
+# Сегменты, после которых всегда идет значение, даже нечисловое
+ENDPOINT_VALUE_SEGMENTS = {"aliases"}
+API_METRICS_PERCENTILES = (50, 90, 99)
+
+def endpoint_template(method: str, url: str, params: dict = None) -> str:
+    """
+    Endpoint of request without host, query and ids, e.g. GET /admin/v1/org/{org}/mail/users/{uid}/settings/sender_info
+    Replaced values are put to params if given ({"{org}": "123", "{uid}": "456"}).
+    """
+    segments = urlparse(url).path.split("/")
+    for i in range(1, len(segments)):
+        segment = segments[i]
+        if segment and (segment.isdigit() or "@" in segment or segments[i - 1] in ENDPOINT_VALUE_SEGMENTS):
+            segments[i] = ENDPOINT_PARAM_NAMES.get(segments[i - 1], "{id}")
+            if params is not None:
+                params[segments[i]] = segment
+    return f"{method.upper()} {'/'.join(segments)}"
+
+def percentile(sorted_values: list, percent: float) -> float:
+    """Nearest-rank percentile of sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+@dataclass
+class EndpointStats:
+    calls : int = 0
+    retries : int = 0
+    failures : int = 0
+    bytes_sent : int = 0
+    bytes_received : int = 0
+    statuses : Counter = field(default_factory=Counter)
+    latencies : list = field(default_factory=list)
+
+    def terminal_failures(self) -> int:
+        """Requests that failed (error status or no response) and were not retried."""
+        errors = self.failures + sum(count for status, count in self.statuses.items() if status >= 400)
+        return max(0, errors - self.retries)
+
+class ApiMetrics:
+    """
+    Statistics of API calls by endpoint template. Request is counted as retry if the previous request
+    of the same thread was the same method and URL and it failed (error status or no response).
+    Users are counted by distinct {uid} in URLs of per-user endpoints.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.users = set()
+        self.last_failed = threading.local()
+        self.started = time.time()
+        self.duration = 0.0
+
+    def record(self, method: str, url: str, status: int, latency: float, bytes_sent: int, bytes_received: int):
+        """Returns endpoint template, its parameters and retry flag of the request."""
+        key = (method.upper(), url)
+        retry = getattr(self.last_failed, "key", None) == key
+        self.last_failed.key = key if status is None or status >= 400 else None
+        params = {}
+        endpoint = endpoint_template(method, url, params)
+        with self.lock:
+            if "{uid}" in params:
+                self.users.add(params["{uid}"])
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.calls += 1
+            stats.retries += retry
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.latencies.append(latency)
+            if status is None:
+                stats.failures += 1
+            else:
+                stats.statuses[status] += 1
+        return endpoint, params, retry
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.users = set()
+            self.started = time.time()
+            self.duration = 0.0
+
+    def totals(self) -> EndpointStats:
+        total = EndpointStats()
+        with self.lock:
+            for stats in self.endpoints.values():
+                total.calls += stats.calls
+                total.retries += stats.retries
+                total.failures += stats.failures
+                total.bytes_sent += stats.bytes_sent
+                total.bytes_received += stats.bytes_received
+                total.statuses.update(stats.statuses)
+                total.latencies.extend(stats.latencies)
+        return total
+
+class Tracer:
+    """
+    Spans of operations and API calls in Chrome trace event format (open in https://ui.perfetto.dev or chrome://tracing).
+    Organizations of multi-org mode are shown as separate processes, threads of parallel API calls as separate tracks.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.events = []
+        self.origin = time.perf_counter()
+        self.process_ids = {}
+        self.thread_names = {}
+
+    def start(self):
+        with self.lock:
+            self.events = []
+            self.origin = time.perf_counter()
+        self.enabled = True
+
+    def stop(self):
+        """Stop tracing and drop collected events."""
+        self.enabled = False
+        with self.lock:
+            self.events = []
+
+    @contextmanager
+    def span(self, name: str, category: str, args: dict):
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, category, start, time.perf_counter(), args)
+
+    def add(self, name: str, category: str, start: float, end: float, args: dict):
+        org = current_org.get() or ""
+        thread = threading.current_thread()
+        with self.lock:
+            pid = self.process_ids.setdefault(org, len(self.process_ids) + 1)
+            self.thread_names[(pid, thread.ident)] = thread.name
+            self.events.append({
+                "name": name, "cat": category, "ph": "X", "pid": pid, "tid": thread.ident,
+                "ts": round((start - self.origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1), "args": args,
+            })
+
+    def save(self, path: str):
+        with self.lock:
+            metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": org or "y360"}} for org, pid in self.process_ids.items()]
+            metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}} for (pid, tid), name in self.thread_names.items()]
+            events = metadata + self.events
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+            logger.info(f"Trace with {len(events) - len(metadata)} span(s) saved to {path}.")
+        except OSError as e:
+            logger.error(f"Can not write trace file {path}: {e}")
+
+tracer = Tracer()
+
+def trace_span(name: str, category: str = "operation", **args):
+    """
+    Span of the block in trace (if tracing is enabled). Yields dict of span arguments that can be filled inside the block.
+    """
+    if not tracer.enabled:
+        return nullcontext({})
+    return tracer.span(name, category, args)
+
+class ApiSession(requests.Session):
+    """
+    HTTP session shared by all API calls: keep-alive connection pool sized for parallel calls, common rate limiter
+    and statistics of calls by endpoint.
+    """
+    def __init__(self, pool_size: int, rate_limiter: RateLimiter):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.rate_limiter = rate_limiter
+        self.metrics = ApiMetrics()
+
+    def request(self, method, url, *args, **kwargs):
+        self.rate_limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            end = time.perf_counter()
+            endpoint, params, retry = self.metrics.record(method, url, None, end - start, 0, 0)
+            if tracer.enabled:
+                tracer.add(endpoint, "api", start, end, self.span_args(params, retry, error=type(e).__name__))
+            raise
+        end = time.perf_counter()
+        body = response.request.body
+        endpoint, params, retry = self.metrics.record(method, url, response.status_code, end - start,
+                                                      len(body) if body else 0, len(response.content))
+        if tracer.enabled:
+            request_id = response.headers.get("X-Request-Id") or response.headers.get("Yandex-Cloud-Request-ID", "")
+            tracer.add(endpoint, "api", start, end, self.span_args(params, retry, status=response.status_code, request_id=request_id))
+        return response
+
+    @staticmethod
+    def span_args(params: dict, retry: bool, **args) -> dict:
+        for name, value in params.items():
+            if name != "{org}":
+                args[name.strip("{}")] = value
+        args["retry"] = retry
+        return args
+
+def check_scim_token(scim_token, domain_id, session = requests):
     """Проверяет, что токен SCIM действителен."""
     url = DEFAULT_360_SCIM_API_URL.format(domain_id=domain_id) 
     headers = {
         "Authorization": f"Bearer {scim_token}",
         "Content-Type": "application/json"
     }
-    response = requests.get(f"{url}/v2/Users?startIndex=1&count=100", headers=headers)
+    response = session.get(f"{url}/v2/Users?startIndex=1&count=1", headers=headers)
     if response.status_code == HTTPStatus.OK:
         return True
     return False
 
-def check_oauth_token(oauth_token, org_id):
+def check_oauth_token(oauth_token, org_id, session = requests):
     """Проверяет, что токен OAuth действителен."""
     url = f"{DEFAULT_360_API_URL}/directory/v1/org/{org_id}/users?perPage=100"
     headers = {
         "Authorization": f"OAuth {oauth_token}"
     }
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
     if response.status_code == HTTPStatus.OK:
         return True
     return False
 
-def check_token_permissions(token: str, org_id: int, needed_permissions: list) -> bool:
+def whoami_cache_path(token: str) -> str:
+    key = hashlib.sha256(f"{DEFAULT_360_API_URL}\n{token}".encode("utf-8")).hexdigest()
+    return os.path.join(WHOAMI_CACHE_DIR, f"whoami_{key}.json")
+
+def read_whoami_cache(token: str, ttl: int):
+    """
+    Cached whoami response of token (scopes, orgIds, login) if it is younger than ttl seconds.
+    """
+    if ttl <= 0:
+        return None
+    try:
+        with open(whoami_cache_path(token), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or time.time() - cached.get('cached_at', 0) > ttl:
+        return None
+    logger.debug("Token info is taken from cache (age %.0f s).", time.time() - cached['cached_at'])
+    return cached.get('data')
+
+def write_whoami_cache(token: str, ttl: int, data: dict):
+    """Save whoami response keyed by hash of token (token itself is not stored), file is readable only by owner."""
+    if ttl <= 0:
+        return
+    path = whoami_cache_path(token)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(WHOAMI_CACHE_DIR, mode=0o700, exist_ok=True)
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"cached_at": time.time(), "data": data}, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.debug("Can not save token info cache: %s", e)
+
+def check_token_permissions(token: str, org_id: int, needed_permissions: list, session = requests, cache_ttl: int = 0) -> bool:
     """
     Проверяет права доступа для заданного токена.
     
@@ -270,35 +791,41 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
         token: OAuth токен для проверки
         org_id: ID организации
         needed_permissions: Список необходимых прав доступа
+        cache_ttl: Время жизни кэша ответа whoami на диске в секундах (0 - без кэша)
         
     Returns:
         bool: True если токен невалидный, False в противном случае, продолжение работы невозможно
         bool: True если все права присутствуют и org_id совпадает, False в противном случае, продолжение работы возможно
     """
-    url = 'https://api360.yandex.net/whoami'
+    url = f"{DEFAULT_360_API_URL}/whoami"
     headers = {
         'Authorization': f'OAuth {token}'
     }
     hard_error = False
     try:
-        response = requests.get(url, headers=headers)
-        
-        # Проверка валидности токена
-        if response.status_code != HTTPStatus.OK:
-            logger.debug(f"Невалидный токен. Статус код: {response.status_code}. Ответ: {response.text}")
-            error_body = response.text.strip() or "Нет дополнительной информации"
-            console.print(Panel(
-                "\n".join([
-                    "[bold red]❌ Невалидный OAuth токен[/bold red]",
-                    f"[yellow]Статус код:[/yellow] {response.status_code}",
-                    f"[dim]{error_body}[/dim]"
-                ]),
-                title="[red]Проверка токена[/red]",
-                border_style="red"
-            ))
-            return True, False
-        
-        data = response.json()
+        data = read_whoami_cache(token, cache_ttl)
+        if data is None:
+            response = session.get(url, headers=headers)
+
+            # Проверка валидности токена
+            if response.status_code != HTTPStatus.OK:
+                logger.debug("Невалидный токен. Статус код: %s. Ответ: %s", response.status_code, LogBody(response.text))
+                error_body = response.text.strip() or "Нет дополнительной информации"
+                console.print(Panel(
+                    "\n".join([
+                        "[bold red]❌ Невалидный OAuth токен[/bold red]",
+                        f"[yellow]Статус код:[/yellow] {response.status_code}",
+                        f"[dim]{error_body}[/dim]"
+                    ]),
+                    title="[red]Проверка токена[/red]",
+                    border_style="red"
+                ))
+                return True, False
+
+            data = response.json()
+            from_api = True
+        else:
+            from_api = False
         
         # Извлечение scopes и orgIds из ответа
         token_scopes = data.get('scopes', [])
@@ -306,8 +833,8 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
         login = data.get('login', 'unknown')
         
         logger.info(f"Проверка прав доступа для токена пользователя: {login}")
-        logger.debug(f"Доступные права: {token_scopes}")
-        logger.debug(f"Доступные организации: {token_org_ids}")
+        logger.debug("Доступные права: %s", token_scopes)
+        logger.debug("Доступные организации: %s", token_org_ids)
         orgs_display = ", ".join(str(org) for org in token_org_ids) if token_org_ids else "—"
         console.print(Panel(
             "\n".join([
@@ -320,7 +847,7 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
         
         # Проверка наличия org_id в списке доступных организаций
         if str(org_id) not in [str(org) for org in token_org_ids]:
-            logger.debug(f"ОШИБКА: Токен не имеет доступа к организации с ID {org_id}. Доступные orgIds: {token_org_ids}")
+            logger.debug("ОШИБКА: Токен не имеет доступа к организации с ID %s. Доступные orgIds: %s", org_id, token_org_ids)
             console.print(Panel(
                 "\n".join([
                     "[bold red]⛔ Токен не имеет доступа к указанной организации[/bold red]",
@@ -339,7 +866,7 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
                 missing_permissions.append(permission)
         
         if missing_permissions:
-            logger.debug(f"ОШИБКА: У токена отсутствуют необходимые права доступа: {missing_permissions}")
+            logger.debug("ОШИБКА: У токена отсутствуют необходимые права доступа: %s", missing_permissions)
             permissions_table = Table(
                 show_header=False,
                 box=box.SIMPLE_HEAVY,
@@ -349,6 +876,7 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
             for perm in missing_permissions:
                 permissions_table.add_row(f"[red]•[/red] {perm}")
 
+            from rich.align import Align
             console.print(Panel(
                 Align.left(permissions_table),
                 title="[yellow]⚠️ Недостающие права доступа[/yellow]",
@@ -357,7 +885,10 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
             return False, False
 
         logger.debug("✓ Все необходимые права доступа присутствуют")
-        logger.debug(f"✓ Доступ к организации {org_id} подтвержден")
+        logger.debug("✓ Доступ к организации %s подтвержден", org_id)
+        # кэшируется только ответ, прошедший все проверки: после выдачи прав токен сразу проверяется заново
+        if from_api:
+            write_whoami_cache(token, cache_ttl, data)
         console.print(Panel(
             "\n".join([
                 "[bold green]✅ Все необходимые права доступа присутствуют[/bold green]",
@@ -369,7 +900,7 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
         return False, True
         
     except requests.exceptions.RequestException as e:
-        logger.debug(f"Ошибка при выполнении запроса к API: {e}")
+        logger.debug("Ошибка при выполнении запроса к API: %s", e)
         console.print(Panel(
             f"[bold red]Ошибка при выполнении запроса к API[/bold red]\n[dim]{e}[/dim]",
             title="[red]Ошибка сети[/red]",
@@ -377,7 +908,7 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
         ))
         return True, False
     except json.JSONDecodeError as e:
-        logger.debug(f"Ошибка при парсинге ответа от API: {e}")
+        logger.debug("Ошибка при парсинге ответа от API: %s", e)
         console.print(Panel(
             f"[bold red]Ошибка при парсинге ответа от API[/bold red]\n[dim]{e}[/dim]",
             title="[red]Ошибка данных[/red]",
@@ -385,7 +916,7 @@ def check_token_permissions(token: str, org_id: int, needed_permissions: list) -
         ))
         return True, False
     except Exception as e:
-        logger.debug(f"Неожиданная ошибка при проверке прав доступа: {type(e).__name__}: {e}")
+        logger.debug("Неожиданная ошибка при проверке прав доступа: %s: %s", type(e).__name__, e)
         console.print(Panel(
             "\n".join([
                 "[bold red]Неожиданная ошибка при проверке прав доступа[/bold red]",
@@ -520,21 +1051,1099 @@ def match_with_wildcard(pattern: str, text: str) -> bool:
     if not pattern or not text:
         return False
 
-    # Экранируем специальные символы regex, кроме *
-    escaped = re.escape(pattern)
-    # Заменяем экранированные * на .*
-    wildcard_pattern = escaped.replace(r'\*', '.*')
+    compiled = compile_wildcard(pattern)
+    if compiled is None:
+        # Если regex невалиден, возвращаем False
+        return False
+    return bool(compiled.match(text))
 
-    # Добавляем якоря начала и конца строки
-    regex_pattern = f'^{wildcard_pattern}$'
 
+@lru_cache(maxsize=1024)
+def compile_wildcard(pattern: str):
+    # Экранируем специальные символы regex, кроме *, и заменяем экранированные * на .*
+    wildcard_pattern = re.escape(pattern).replace(r'\*', '.*')
     try:
-        return bool(re.match(regex_pattern, text, re.IGNORECASE))
+        # Добавляем якоря начала и конца строки
+        return re.compile(f'^{wildcard_pattern}$', re.IGNORECASE)
     except re.error:
-        # Если regex невалиден, возвращаем False
+        return None
+
+
+class EmailTemplateMatcher:
+    """
+    Набор шаблонов email (см. match_email_with_template), скомпилированный один раз.
+
+    Частые случаи проверяются по множествам без регулярных выражений:
+        domain.com, *.domain.com, *@domain.com, *@*.domain.com, alias@domain.com, alias@*
+    Остальные шаблоны объединяются в одно регулярное выражение,
+    которое применяется к строке local@domain.
+    """
+
+    def __init__(self, templates: list[str]):
+        self.templates = []
+        self.exact_domains = set()
+        self.domain_suffixes = set()
+        self.any_local_domains = set()
+        self.any_local_domain_suffixes = set()
+        self.exact_emails = set()
+        self.any_domain_locals = set()
+        self.suffix_lengths = []
+        self.any_local_suffix_lengths = []
+        regex_parts = []
+
+        for template in templates:
+            if not template:
+                continue
+            template = template.lower().strip()
+            if not template or template.count('@') > 1:
+                continue
+            self.templates.append(template)
+            if '@' in template:
+                local, domain = template.split('@', 1)
+                if not local or not domain:
+                    continue
+                if '*' not in local and '*' not in domain:
+                    self.exact_emails.add(template)
+                elif '*' not in local and domain == '*':
+                    self.any_domain_locals.add(local)
+                elif local == '*' and '*' not in domain:
+                    self.any_local_domains.add(domain)
+                elif local == '*' and domain.startswith('*.') and '*' not in domain[2:]:
+                    self.any_local_domain_suffixes.add(domain[1:])
+                else:
+                    local_regex = re.escape(local).replace(r'\*', '[^@]*')
+                    domain_regex = re.escape(domain).replace(r'\*', '.*')
+                    regex_parts.append(f'(?=[^@]){local_regex}@(?=.){domain_regex}')
+            else:
+                if '*' not in template:
+                    self.exact_domains.add(template)
+                elif template.startswith('*.') and '*' not in template[2:]:
+                    self.domain_suffixes.add(template[1:])
+                else:
+                    domain_regex = re.escape(template).replace(r'\*', '.*')
+                    regex_parts.append(f'[^@]*@(?=.){domain_regex}')
+
+        self.suffix_lengths = sorted({len(suffix) for suffix in self.domain_suffixes})
+        self.any_local_suffix_lengths = sorted({len(suffix) for suffix in self.any_local_domain_suffixes})
+        self.regex = re.compile('^(?:' + '|'.join(regex_parts) + ')$', re.IGNORECASE) if regex_parts else None
+
+    @staticmethod
+    def _has_suffix(domain: str, suffixes: set, lengths: list) -> bool:
+        for length in lengths:
+            if len(domain) >= length and domain[-length:] in suffixes:
+                return True
+        return False
+
+    def match(self, email: str) -> bool:
+        if not email:
+            return False
+        email = email.lower().strip()
+        if '@' not in email:
+            return False
+        local, domain = email.split('@', 1)
+        if not domain:
+            return False
+        if domain in self.exact_domains or self._has_suffix(domain, self.domain_suffixes, self.suffix_lengths):
+            return True
+        if local:
+            if email in self.exact_emails or local in self.any_domain_locals:
+                return True
+            if domain in self.any_local_domains or self._has_suffix(domain, self.any_local_domain_suffixes, self.any_local_suffix_lengths):
+                return True
+        if self.regex is not None and self.regex.match(email):
+            return True
         return False
 
 
+@dataclass
+class CliCommand:
+    """
+    Non-interactive subcommand: function to run and mapping of command line options to settings attributes
+    """
+    help : str
+    func : "callable"
+    options : dict
+    needs_scim : bool = False
+    export : bool = False
+
+CLI_COMMANDS = {
+    "export-users": CliCommand("Download all users (API 360 and SCIM) to api_users/scim_users files", lambda settings: download_users_attrib_to_file(settings), {}, export=True),
+    "export-2fa": CliCommand("Download 2FA settings of all users", lambda settings: mfa_download_settings(settings), {"output": "users_2fa_output_file"}, export=True),
+    "export-forwards": CliCommand("Download forward rules and autoreplies of all users", lambda settings: forward_rules_download_for_all_users(settings), {"output": "forward_rules_output_file"}, export=True),
+    "export-default-email": CliCommand("Download default sender email and display name of all users", lambda settings: default_email_create_file(settings), {"output": "default_email_output_file"}, export=True),
+    "update-default-email": CliCommand("Update default sender email and display name from file", lambda settings: default_email_update_from_file(settings), {"input": "default_email_input_file"}),
+    "set-signatures": CliCommand("Set email signatures from template for users from file", lambda settings: set_email_signature(settings), {"input": "email_signature_input_file", "template": "email_signature_template_file"}),
+    "logout-from-file": CliCommand("Logout users from file from Yandex 360 services", lambda settings: mfa_logout_users_from_file(settings), {"input": "users_2fa_input_file"}),
+    "logout-no-phone": CliCommand("Logout enabled users with 2FA set and no security phone", lambda settings: mfa_logout_users_with_no_phone(settings), {}),
+    "create-scim-file": CliCommand("Create SCIM userName file for modification", lambda settings: create_SCIM_userName_file(settings), {"output": "users_file"}, needs_scim=True),
+    "scim-rename-file": CliCommand("Change SCIM userName of users from file", lambda settings: update_users_from_SCIM_userName_file(settings), {"input": "users_file"}, needs_scim=True),
+    "check-aliases": CliCommand("Check aliases from file", lambda settings: check_aliases_from_file(settings), {"input": "aliases_check_input_file", "output": "aliases_check_output_file"}),
+    "send-permissions": CliCommand("Change send permissions of group: add or remove users of allow list or allow all users", lambda settings: send_perm_update_from_settings(settings),
+                                   {"group": "send_perm_group", "add": "send_perm_add_users", "remove": "send_perm_remove_users", "grant_all": "send_perm_grant_all"}),
+}
+
+CLI_RUN_JOBS_COMMAND = "run-jobs"
+CLI_SERVE_COMMAND = "serve"
+CLI_MULTI_ORG_COMMAND = "multi-org"
+
+CLI_OPTION_HELP = {
+    "input": "Input file (default from .env)",
+    "output": "Output file (default from .env)",
+    "template": "Signature template file (default from .env)",
+    "group": "Group alias, email, id or uid",
+    "add": "Users to add to allow list: aliases, uids or last names separated by comma",
+    "remove": "Users to remove from allow list: aliases, uids or last names separated by comma",
+    "grant_all": "Allow all users to send to group (clears allow list)",
+}
+
+# опции без значения (--grant-all)
+CLI_FLAG_OPTIONS = ("grant_all",)
+
+def is_cli_command_line(argv: list) -> bool:
+    return len(argv) > 1 and (argv[1] in CLI_COMMANDS or argv[1] in (CLI_RUN_JOBS_COMMAND, CLI_SERVE_COMMAND, CLI_MULTI_ORG_COMMAND, "-h", "--help"))
+
+def parse_cli_arguments(argv: list):
+    """Парсит подкоманды для запуска без интерактивного меню."""
+    parser = argparse.ArgumentParser(
+        description="Yandex 360 Text Admin Console. Run without arguments for interactive menu.",
+        epilog="Legacy rename mode: old new attribute [confirm]",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--yes", "-y", action="store_true", help="Answer yes to all confirmations")
+    common.add_argument("--dry-run", action="store_true", help="Do not make any changes (same as DRY_RUN=true)")
+    common.add_argument("--metrics-file", help="Write OpenMetrics file with operation and API metrics at the end of run (default from METRICS_FILE)")
+    common.add_argument("--trace-file", help="Write trace of operations and API calls in Chrome trace format (default from TRACE_FILE)")
+    common.add_argument("--log-level", type=str.upper, choices=LOG_LEVELS, help="Log level of this run (default from LOG_LEVEL)")
+    common.add_argument("--profile", nargs="?", const=PROFILE_DEFAULT_MODES, metavar="MODES",
+                        help=f"Profile command: comma separated {', '.join(PROFILE_MODES)} (without value: {PROFILE_DEFAULT_MODES}, default from PROFILE)")
+    export_options = argparse.ArgumentParser(add_help=False)
+    export_options.add_argument("--format", choices=EXPORT_FORMATS, help="Export file format (default from EXPORT_FORMAT)")
+    export_options.add_argument("--compress", action="store_true", help="Compress export file with gzip")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, command in CLI_COMMANDS.items():
+        parents = [common, export_options] if command.export else [common]
+        subparser = subparsers.add_parser(name, help=command.help, description=command.help, parents=parents)
+        for option in command.options:
+            if option in CLI_FLAG_OPTIONS:
+                subparser.add_argument(f"--{option.replace('_', '-')}", action="store_true", help=CLI_OPTION_HELP[option])
+            else:
+                subparser.add_argument(f"--{option.replace('_', '-')}", help=CLI_OPTION_HELP[option])
+    subparser = subparsers.add_parser(CLI_RUN_JOBS_COMMAND, parents=[common],
+                                      help="Run several commands from JSON/YAML job spec in one process",
+                                      description="Run several commands from JSON/YAML job spec in one process (shared caches, connections and rate limit)")
+    subparser.add_argument("spec", help="Job spec file (.json, .yaml or .yml)")
+    subparser = subparsers.add_parser(CLI_SERVE_COMMAND,
+                                      help="Run lookup daemon with warm directory caches (JSON over localhost HTTP or Unix socket)",
+                                      description="Run lookup daemon with warm directory caches (JSON over localhost HTTP or Unix socket)")
+    subparser.add_argument("--host", default=DAEMON_DEFAULT_HOST, help=f"Listen address (default {DAEMON_DEFAULT_HOST})")
+    subparser.add_argument("--port", type=int, default=DAEMON_DEFAULT_PORT, help=f"Listen port (default {DAEMON_DEFAULT_PORT})")
+    subparser.add_argument("--socket", help="Listen on Unix socket instead of TCP")
+    subparser.add_argument("--refresh-minutes", type=float, default=ALL_USERS_REFRESH_IN_MINUTES, help=f"Background refresh interval of caches (default {ALL_USERS_REFRESH_IN_MINUTES})")
+    subparser = subparsers.add_parser(CLI_MULTI_ORG_COMMAND,
+                                      help="Run the same command for several organizations concurrently",
+                                      description="Run the same command (or run-jobs) for every organization from JSON/YAML spec concurrently. "
+                                                  "Each organization has its own settings, caches, rate limiter and output directory.",
+                                      epilog=f"Example: {CLI_MULTI_ORG_COMMAND} orgs.json export-2fa --format jsonl")
+    subparser.add_argument("--parallel", type=int, default=0, help="Max organizations processed at once (default - all)")
+    subparser.add_argument("--metrics-file", help="Write OpenMetrics file with metrics of all organizations at the end of run (default from METRICS_FILE)")
+    subparser.add_argument("--trace-file", help="Write trace of all organizations in Chrome trace format (default from TRACE_FILE)")
+    subparser.add_argument("--log-level", type=str.upper, choices=LOG_LEVELS, help="Log level of this run for all organizations (default from LOG_LEVEL)")
+    subparser.add_argument("orgs", help="Organizations spec file (.json, .yaml or .yml)")
+    subparser.add_argument("org_command", nargs=argparse.REMAINDER, metavar="command ...", help="Command with its options to run for every organization")
+    return parser.parse_args(argv)
+
+def attempt_log_level(retries: int) -> int:
+    """
+    Level of API error message of one attempt: WARNING if the request will be retried, ERROR for the last attempt.
+    Only errors are counted as failures of the command, so throttled but finally successful requests do not fail it.
+    """
+    return logging.WARNING if retries < MAX_RETRIES else logging.ERROR
+
+class ErrorCounterHandler(logging.Handler):
+    """Counts errors logged while a command runs (used for exit code). In multi-org mode only errors of the same organization are counted."""
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+        self.org = current_org.get()
+
+    def emit(self, record):
+        if current_org.get() == self.org:
+            self.count += 1
+
+def run_cli_command(settings: "SettingParams", args) -> int:
+    if args.command == CLI_RUN_JOBS_COMMAND:
+        return run_jobs_from_spec(settings, args.spec, args.yes, args.dry_run)
+    if args.command == CLI_SERVE_COMMAND:
+        return run_lookup_daemon(settings, args.host, args.port, args.socket, args.refresh_minutes)
+
+    command = CLI_COMMANDS[args.command]
+    saved = apply_cli_overrides(settings, command, args)
+    try:
+        if command.needs_scim and settings.skip_scim_api_call:
+            logger.error("No SCIM config found. Skip action.")
+            return CLI_EXIT_USAGE
+
+        logger.info(f"Running command {args.command}...")
+        error_counter = ErrorCounterHandler()
+        logger.addHandler(error_counter)
+        try:
+            result = run_operation(settings, args.command, command.func)
+        finally:
+            logger.removeHandler(error_counter)
+    finally:
+        for attribute, value in saved.items():
+            setattr(settings, attribute, value)
+
+    success = record_operation_metrics(settings, args.command, result is not False and not error_counter.count)
+    if not success:
+        logger.info(f"Command {args.command} finished with errors ({error_counter.count} error(s) logged).")
+        return CLI_EXIT_FAILED
+    logger.info(f"Command {args.command} finished successfully.")
+    return CLI_EXIT_OK
+
+def run_operation(settings: "SettingParams", name: str, func):
+    """
+    Run operation with fresh API call statistics and show them when it finishes.
+    """
+    with measured_operation(settings, name):
+        return func(settings)
+
+@contextmanager
+def measured_operation(settings: "SettingParams", name: str, category: str = "operation"):
+    """
+    Block of one operation (subcommand or menu item): resets API call statistics, traces and profiles the block
+    and shows statistics when it finishes. In interactive mode waits for Enter, so the menu does not clear the table.
+    """
+    metrics = settings.api_session.metrics if settings.api_session else None
+    if metrics:
+        metrics.reset()
+    start = time.perf_counter()
+    completed = False
+    try:
+        with trace_span(name, category), profile_block(settings, name):
+            yield
+        completed = True
+    finally:
+        if metrics:
+            metrics.duration = time.perf_counter() - start
+            if settings.show_api_metrics and print_api_metrics(name, metrics, metrics.duration) and completed:
+                wait_for_enter(settings)
+
+PROFILE_MODES = ("cprofile", "sample", "memory")
+PROFILE_DEFAULT_MODES = "cprofile,memory"
+PROFILE_SAMPLE_INTERVAL_SEC = 0.005
+PROFILE_TOP_ENTRIES = 40
+PROFILE_TRACEMALLOC_FRAMES = 10
+# Одновременно профилируется одна операция: вложенные пункты меню и параллельные организации multi-org не профилируются
+profile_lock = threading.Lock()
+
+def parse_profile_modes(value: str):
+    """Set of profiling modes from comma separated string, None if there are unknown modes."""
+    modes = {mode.strip().lower() for mode in value.split(",") if mode.strip()}
+    if modes - set(PROFILE_MODES):
+        return None
+    return modes
+
+class SamplingProfiler:
+    """
+    Wall clock sampling profiler: stacks of all threads are sampled every interval. Result is in collapsed stack
+    format (one "frame;frame;... count" line per stack) for flamegraph.pl, speedscope or inferno.
+    """
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL_SEC):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            # потоки пула объединяются: ThreadPoolExecutor-0_3 -> ThreadPoolExecutor-0
+            thread_names = {thread.ident: re.sub(r"_\d+$", "", thread.name) for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile_block(settings: "SettingParams", name: str):
+    """
+    Profile the block with modes from settings.profile and write results to PROFILE_DIR:
+    cprofile - <name>_<time>.pstats and text summary (calling thread only),
+    sample - <name>_<time>.collapsed with stacks of all threads,
+    memory - tracemalloc peak and top allocations in <name>_<time>_memory.txt.
+    """
+    if not settings.profile or not profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        yield from profile_with_lock(settings, name)
+    finally:
+        profile_lock.release()
+
+def profile_with_lock(settings: "SettingParams", name: str):
+    # модули профилирования импортируются только при профилировании, чтобы не замедлять запуск
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    profile_dir = output_path(settings, settings.profile_dir)
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+    except OSError as e:
+        logger.error(f"Can not create PROFILE_DIR {profile_dir}: {e}. Operation {name} is not profiled.")
+        yield
+        return
+    org = current_org.get()
+    file_name = re.sub(r"[^\w.-]+", "_", f"{org + '_' if org else ''}{name}_{datetime.now():%Y%m%d_%H%M%S}")
+    base_path = os.path.join(profile_dir, file_name)
+
+    profiler = cProfile.Profile() if "cprofile" in settings.profile else None
+    sampler = SamplingProfiler() if "sample" in settings.profile else None
+    trace_memory = "memory" in settings.profile and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+    if sampler:
+        sampler.start()
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        duration = time.perf_counter() - start
+        if sampler:
+            sampler.stop()
+        snapshot = None
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        try:
+            if profiler:
+                profiler.dump_stats(f"{base_path}.pstats")
+                with open(f"{base_path}.txt", "w", encoding="utf-8") as f:
+                    f.write(f"Operation {name}, {duration:.2f} s\n")
+                    pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP_ENTRIES)
+                logger.info(f"cProfile stats of {name} saved to {base_path}.pstats (summary in {base_path}.txt).")
+            if sampler:
+                sampler.save(f"{base_path}.collapsed")
+                logger.info(f"{sampler.samples} stack samples of {name} saved to {base_path}.collapsed.")
+            if snapshot:
+                snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+                with open(f"{base_path}_memory.txt", "w", encoding="utf-8") as f:
+                    f.write(f"Operation {name}, peak traced memory {peak / 1024 / 1024:.1f} MB\n")
+                    f.write(f"Top {PROFILE_TOP_ENTRIES} allocations still held at the end of operation:\n")
+                    for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ENTRIES]:
+                        f.write(f"{stat}\n")
+                logger.info(f"Peak traced memory of {name}: {peak / 1024 / 1024:.1f} MB, details in {base_path}_memory.txt.")
+        except OSError as e:
+            logger.error(f"Can not write profile of {name} to {profile_dir}: {e}")
+
+def print_api_metrics(name: str, metrics: "ApiMetrics", duration: float) -> bool:
+    """Print table of API calls by endpoint. Return False if there were no calls."""
+    with metrics.lock:
+        endpoints = sorted(metrics.endpoints.items(), key=lambda item: sum(item[1].latencies), reverse=True)
+    if not endpoints:
+        return False
+    org = current_org.get()
+    table = Table(title=f"API calls of {name}" + (f" ({org})" if org else "") + f", {duration:.1f} s")
+    table.add_column("Endpoint", style="cyan")
+    for column in ("Calls", "Retries", "Statuses", "Sent, KB", "Received, KB") + tuple(f"p{p}, ms" for p in API_METRICS_PERCENTILES) + ("Max, ms", "Total, s"):
+        table.add_column(column, justify="right")
+    total = metrics.totals()
+    for endpoint, stats in endpoints + [("[bold]Total[/bold]", total)]:
+        latencies = sorted(stats.latencies)
+        statuses = [f"{status}:{count}" for status, count in sorted(stats.statuses.items())]
+        if stats.failures:
+            statuses.append(f"no response:{stats.failures}")
+        table.add_row(
+            endpoint,
+            str(stats.calls),
+            str(stats.retries),
+            " ".join(statuses),
+            f"{stats.bytes_sent / 1024:.1f}",
+            f"{stats.bytes_received / 1024:.1f}",
+            *[f"{percentile(latencies, p) * 1000:.0f}" for p in API_METRICS_PERCENTILES],
+            f"{latencies[-1] * 1000:.0f}",
+            f"{sum(latencies):.1f}",
+        )
+    console.print(table)
+    return True
+
+@dataclass
+class OperationMetrics:
+    """Result of one subcommand for metrics file."""
+    org : str
+    operation : str
+    finished : float
+    duration : float
+    success : bool
+    users : int
+    endpoints : dict
+
+# Завершенные подкоманды процесса по (организация, подкоманда); в multi-org режиме заполняется из нескольких потоков
+completed_operations = {}
+completed_operations_lock = threading.Lock()
+
+def record_operation_metrics(settings: "SettingParams", name: str, success: bool) -> bool:
+    """
+    Save metrics of finished operation. Return its success: operation also fails if some API requests
+    failed after all retries (y360_operation_failures), so success and failures metrics always agree.
+    """
+    metrics = settings.api_session.metrics if settings.api_session else None
+    if metrics is None:
+        return success
+    with metrics.lock:
+        failures = sum(stats.terminal_failures() for stats in metrics.endpoints.values())
+        if failures:
+            logger.debug("Operation %s: %s API request(s) failed after all retries.", name, failures)
+        success = success and not failures
+        operation = OperationMetrics(
+            org = current_org.get() or str(settings.org_id),
+            operation = name,
+            finished = time.time(),
+            duration = metrics.duration,
+            success = success,
+            users = len(metrics.users),
+            endpoints = dict(metrics.endpoints),
+        )
+    with completed_operations_lock:
+        completed_operations[(operation.org, operation.operation)] = operation
+    return success
+
+def metrics_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_metrics(operations: list) -> str:
+    """
+    Operations and API endpoints metrics in OpenMetrics text format (also readable by Prometheus textfile collector).
+    """
+    families = {
+        "y360_operation_duration_seconds": ("gauge", "Duration of the last run of operation", []),
+        "y360_operation_success": ("gauge", "1 if the last run of operation finished without errors", []),
+        "y360_operation_last_run_timestamp_seconds": ("gauge", "Time when operation finished", []),
+        "y360_operation_users_processed": ("gauge", "Users with per-user API calls", []),
+        "y360_operation_requests": ("gauge", "API requests made by operation", []),
+        "y360_operation_retries": ("gauge", "Repeated API requests after error", []),
+        "y360_operation_failures": ("gauge", "API requests failed without retry", []),
+        "y360_operation_throttled": ("gauge", "API responses 429 Too Many Requests", []),
+        "y360_operation_requests_per_second": ("gauge", "API requests per second", []),
+        "y360_operation_users_per_second": ("gauge", "Users processed per second", []),
+        "y360_api_requests": ("gauge", "API requests by endpoint and status", []),
+        "y360_api_retries": ("gauge", "Repeated API requests after error by endpoint", []),
+        "y360_api_received_bytes": ("gauge", "Bytes received by endpoint", []),
+        "y360_api_sent_bytes": ("gauge", "Bytes sent by endpoint", []),
+        "y360_api_latency_seconds": ("summary", "API latency by endpoint", []),
+    }
+    for operation in operations:
+        labels = f'org="{metrics_label_value(operation.org)}",operation="{metrics_label_value(operation.operation)}"'
+        requests_count = retries = failures = throttled = 0
+        for endpoint, stats in sorted(operation.endpoints.items()):
+            endpoint_labels = f'{labels},endpoint="{metrics_label_value(endpoint)}"'
+            requests_count += stats.calls
+            retries += stats.retries
+            failures += stats.terminal_failures()
+            throttled += stats.statuses.get(HTTPStatus.TOO_MANY_REQUESTS.value, 0)
+            for status, count in sorted(stats.statuses.items()):
+                families["y360_api_requests"][2].append(f'y360_api_requests{{{endpoint_labels},status="{status}"}} {count}')
+            if stats.failures:
+                families["y360_api_requests"][2].append(f'y360_api_requests{{{endpoint_labels},status="none"}} {stats.failures}')
+            families["y360_api_retries"][2].append(f"y360_api_retries{{{endpoint_labels}}} {stats.retries}")
+            families["y360_api_received_bytes"][2].append(f"y360_api_received_bytes{{{endpoint_labels}}} {stats.bytes_received}")
+            families["y360_api_sent_bytes"][2].append(f"y360_api_sent_bytes{{{endpoint_labels}}} {stats.bytes_sent}")
+            latencies = sorted(stats.latencies)
+            samples = families["y360_api_latency_seconds"][2]
+            for p in API_METRICS_PERCENTILES:
+                samples.append(f'y360_api_latency_seconds{{{endpoint_labels},quantile="{p / 100}"}} {percentile(latencies, p):.6f}')
+            samples.append(f"y360_api_latency_seconds_sum{{{endpoint_labels}}} {sum(latencies):.6f}")
+            samples.append(f"y360_api_latency_seconds_count{{{endpoint_labels}}} {len(latencies)}")
+        duration = operation.duration
+        values = {
+            "y360_operation_duration_seconds": f"{duration:.3f}",
+            "y360_operation_success": int(operation.success),
+            "y360_operation_last_run_timestamp_seconds": f"{operation.finished:.3f}",
+            "y360_operation_users_processed": operation.users,
+            "y360_operation_requests": requests_count,
+            "y360_operation_retries": retries,
+            "y360_operation_failures": failures,
+            "y360_operation_throttled": throttled,
+            "y360_operation_requests_per_second": f"{requests_count / duration if duration else 0:.3f}",
+            "y360_operation_users_per_second": f"{operation.users / duration if duration else 0:.3f}",
+        }
+        for name, value in values.items():
+            families[name][2].append(f"{name}{{{labels}}} {value}")
+
+    lines = []
+    for name, (metric_type, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(samples)
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path: str):
+    """
+    Write metrics of operations finished by this process. File is replaced atomically, so textfile collector never reads partial file.
+    """
+    with completed_operations_lock:
+        operations = list(completed_operations.values())
+    if not operations:
+        logger.info(f"No operations finished, metrics file {path} is not written.")
+        return
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(format_metrics(operations))
+        os.replace(temp_path, path)
+        logger.info(f"Metrics of {len(operations)} operation(s) saved to {path}.")
+    except OSError as e:
+        logger.error(f"Can not write metrics file {path}: {e}")
+
+def apply_cli_overrides(settings: "SettingParams", command: CliCommand, args) -> dict:
+    """
+    Apply command line options to settings. Returns previous values to restore after the command.
+    """
+    attributes = list(command.options.values()) + ["assume_yes", "dry_run", "export_format", "export_compress", "profile"]
+    saved = {attribute: getattr(settings, attribute) for attribute in attributes}
+    for option, attribute in command.options.items():
+        value = getattr(args, option)
+        if value:
+            setattr(settings, attribute, value)
+    settings.assume_yes = args.yes
+    if args.dry_run:
+        settings.dry_run = True
+    if args.profile:
+        profile = parse_profile_modes(args.profile)
+        if profile is None:
+            logger.error(f"--profile must be comma separated list of {', '.join(PROFILE_MODES)}, got '{args.profile}'. Profiling is disabled.")
+        else:
+            settings.profile = profile
+    if command.export:
+        if args.format:
+            settings.export_format = args.format
+        if args.compress:
+            settings.export_compress = True
+    return saved
+
+def load_jobs_spec(path: str):
+    """
+    Load job spec: {"jobs": [{"name": ..., "command": ..., "args": {...}, "depends_on": [...]}, ...]}
+    or just the list of jobs. YAML is supported if PyYAML is installed.
+    """
+    return load_spec_file(path, 'jobs')
+
+def load_spec_file(path: str, key: str):
+    """
+    Load non-empty list from JSON/YAML spec file: either the list itself or the list under given key.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                logger.error("PyYAML is not installed. Install it (pip install pyyaml) or use JSON spec.")
+                return None
+            spec = yaml.safe_load(text)
+        else:
+            spec = json.loads(text)
+    except Exception as e:
+        logger.error(f"Can not read spec {path}: {type(e).__name__}: {e}")
+        return None
+    if isinstance(spec, dict):
+        spec = spec.get(key)
+    if not isinstance(spec, list) or not spec:
+        logger.error(f"Spec {path} must contain non-empty list of {key}.")
+        return None
+    return spec
+
+def job_to_argv(job: dict) -> list:
+    argv = [job['command']]
+    for key, value in (job.get('args') or {}).items():
+        option = f"--{key.replace('_', '-')}"
+        if value is True:
+            argv.append(option)
+        elif value is not False and value is not None:
+            argv.extend([option, str(value)])
+    return argv
+
+def order_jobs(jobs: list):
+    """
+    Order jobs so that every job runs after its dependencies (otherwise spec order is kept).
+    Returns None if dependencies contain a cycle.
+    """
+    ordered = []
+    done = set()
+    pending = list(jobs)
+    while pending:
+        for job in pending:
+            if all(dep in done for dep in job['depends_on']):
+                ordered.append(job)
+                done.add(job['name'])
+                pending.remove(job)
+                break
+        else:
+            return None
+    return ordered
+
+def run_jobs_from_spec(settings: "SettingParams", spec_path: str, assume_yes: bool = False, dry_run: bool = False) -> int:
+    """
+    Run commands from job spec one by one in this process: caches, HTTP connections and rate limiter are shared.
+    Jobs whose dependencies failed are skipped.
+    """
+    spec = load_jobs_spec(spec_path)
+    if spec is None:
+        return CLI_EXIT_USAGE
+
+    jobs = []
+    names = set()
+    for index, job in enumerate(spec, 1):
+        if not isinstance(job, dict) or job.get('command') not in CLI_COMMANDS:
+            logger.error(f"Job #{index}: unknown command {job.get('command') if isinstance(job, dict) else job}. Available: {', '.join(CLI_COMMANDS)}.")
+            return CLI_EXIT_USAGE
+        name = str(job.get('name') or f"{index}-{job['command']}")
+        if name in names:
+            logger.error(f"Job #{index}: duplicate job name {name}.")
+            return CLI_EXIT_USAGE
+        names.add(name)
+        depends_on = job.get('depends_on') or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        argv = job_to_argv(job)
+        if assume_yes:
+            argv.append("--yes")
+        if dry_run:
+            argv.append("--dry-run")
+        try:
+            args = parse_cli_arguments(argv)
+        except SystemExit:
+            logger.error(f"Job {name}: wrong arguments {' '.join(argv[1:])}.")
+            return CLI_EXIT_USAGE
+        jobs.append({"name": name, "command": job['command'], "depends_on": [str(dep) for dep in depends_on], "args": args})
+
+    for job in jobs:
+        unknown = [dep for dep in job['depends_on'] if dep not in names]
+        if unknown:
+            logger.error(f"Job {job['name']}: unknown dependencies {', '.join(unknown)}.")
+            return CLI_EXIT_USAGE
+
+    ordered = order_jobs(jobs)
+    if ordered is None:
+        logger.error("Job dependencies contain a cycle.")
+        return CLI_EXIT_USAGE
+
+    results = {}
+    for job in ordered:
+        failed_deps = [dep for dep in job['depends_on'] if results[dep]['status'] != "ok"]
+        if failed_deps:
+            logger.error(f"Job {job['name']} skipped: dependencies {', '.join(failed_deps)} failed.")
+            results[job['name']] = {"status": "skipped", "seconds": 0.0}
+            continue
+        logger.info(f"Starting job {job['name']} ({job['command']})...")
+        start = time.monotonic()
+        exit_code = run_cli_command(settings, job['args'])
+        results[job['name']] = {"status": "ok" if exit_code == CLI_EXIT_OK else "failed", "seconds": time.monotonic() - start}
+
+    jobs_table = Table(title="Jobs")
+    jobs_table.add_column("Job", style="cyan")
+    jobs_table.add_column("Command")
+    jobs_table.add_column("Status")
+    jobs_table.add_column("Time, s", justify="right")
+    status_style = {"ok": "green", "failed": "red", "skipped": "yellow"}
+    for job in ordered:
+        result = results[job['name']]
+        jobs_table.add_row(job['name'], job['command'], f"[{status_style[result['status']]}]{result['status']}[/{status_style[result['status']]}]", f"{result['seconds']:.1f}")
+    console.print(jobs_table)
+
+    if all(result['status'] == "ok" for result in results.values()):
+        return CLI_EXIT_OK
+    return CLI_EXIT_FAILED
+
+def build_org_env(org: dict) -> dict:
+    """
+    Environment of one organization: common environment, then variables from org env_file, then org env.
+    Output goes to org output_dir (default - subdirectory named after organization inside OUTPUT_DIR).
+    """
+    env = dict(os.environ)
+    if org.get('env_file'):
+        env.update({key: value for key, value in dotenv_values(org['env_file']).items() if value is not None})
+    env.update({key: str(value) for key, value in (org.get('env') or {}).items()})
+    if org.get('output_dir'):
+        env['OUTPUT_DIR'] = str(org['output_dir'])
+    elif 'OUTPUT_DIR' not in (org.get('env') or {}):
+        env['OUTPUT_DIR'] = os.path.join(os.environ.get("OUTPUT_DIR", ""), org['name'])
+    return env
+
+def run_multi_org(orgs_path: str, command_argv: list, parallel: int = 0) -> int:
+    """
+    Run the same command for every organization from spec concurrently.
+    Every organization gets its own settings (caches, HTTP session, rate limiter, output directory),
+    so total time is close to the time of the slowest organization.
+    """
+    spec = load_spec_file(orgs_path, 'orgs')
+    if spec is None:
+        return CLI_EXIT_USAGE
+
+    if not command_argv or command_argv[0] in (CLI_SERVE_COMMAND, CLI_MULTI_ORG_COMMAND):
+        logger.error(f"Command to run for organizations is not set or not supported. Available: {', '.join(list(CLI_COMMANDS) + [CLI_RUN_JOBS_COMMAND])}.")
+        return CLI_EXIT_USAGE
+    try:
+        args = parse_cli_arguments(command_argv)
+    except SystemExit:
+        logger.error(f"Wrong command for organizations: {' '.join(command_argv)}.")
+        return CLI_EXIT_USAGE
+
+    orgs = []
+    names = set()
+    for index, org in enumerate(spec, 1):
+        if not isinstance(org, dict) or not (org.get('env') or org.get('env_file')):
+            logger.error(f"Organization #{index}: 'env' or 'env_file' must be set.")
+            return CLI_EXIT_USAGE
+        if org.get('env_file') and not os.path.isfile(org['env_file']):
+            logger.error(f"Organization #{index}: env file {org['env_file']} does not exist.")
+            return CLI_EXIT_USAGE
+        name = str(org.get('name') or f"org-{index}")
+        if name in names:
+            logger.error(f"Organization #{index}: duplicate name {name}.")
+            return CLI_EXIT_USAGE
+        names.add(name)
+        org_env = build_org_env(dict(org, name=name))
+        overridden = [key for key in PROCESS_ENV_KEYS if org_env.get(key, "") != os.environ.get(key, "")]
+        if overridden:
+            logger.error(f"Organization {name}: {', '.join(overridden)} can not be set per organization, use common .env.")
+            return CLI_EXIT_USAGE
+        orgs.append(dict(org, name=name))
+
+    def run_org(org: dict) -> dict:
+        current_org.set(org['name'])
+        start = time.monotonic()
+        result = {"org_id": "", "output_dir": "", "exit_code": CLI_EXIT_USAGE}
+        try:
+            settings = get_settings(interactive=False, env=build_org_env(org), configure_process=False)
+            if settings is None:
+                logger.error("Check config of organization and try again.")
+            else:
+                result.update(org_id=str(settings.org_id), output_dir=settings.output_dir)
+                try:
+                    result['exit_code'] = run_cli_command(settings, args)
+                finally:
+                    settings.api_session.close()
+        except Exception as e:
+            logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
+            result['exit_code'] = CLI_EXIT_FAILED
+        result['seconds'] = time.monotonic() - start
+        return result
+
+    max_workers = len(orgs) if parallel <= 0 else min(parallel, len(orgs))
+    logger.info(f"Running {' '.join(command_argv)} for {len(orgs)} organizations ({max_workers} at once)...")
+    # спиннеры rich нельзя показывать из нескольких потоков одновременно
+    console.spinners = False
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {org['name']: executor.submit(contextvars.copy_context().run, run_org, org) for org in orgs}
+        results = {name: future.result() for name, future in futures.items()}
+    wall_seconds = time.monotonic() - start
+
+    status_names = {CLI_EXIT_OK: ("ok", "green"), CLI_EXIT_FAILED: ("failed", "red"), CLI_EXIT_USAGE: ("config error", "yellow")}
+    orgs_table = Table(title=f"Organizations: {args.command}")
+    orgs_table.add_column("Organization", style="cyan")
+    orgs_table.add_column("Org ID")
+    orgs_table.add_column("Status")
+    orgs_table.add_column("Time, s", justify="right")
+    orgs_table.add_column("Output dir")
+    for name, result in results.items():
+        status, style = status_names.get(result['exit_code'], ("failed", "red"))
+        orgs_table.add_row(name, result['org_id'], f"[{style}]{status}[/{style}]", f"{result['seconds']:.1f}", result['output_dir'])
+    console.print(orgs_table)
+    ok_count = sum(1 for result in results.values() if result['exit_code'] == CLI_EXIT_OK)
+    logger.info(f"Organizations: {ok_count} ok, {len(results) - ok_count} failed. "
+                f"Wall time {wall_seconds:.1f} s (sum of organization times {sum(result['seconds'] for result in results.values()):.1f} s).")
+
+    if ok_count == len(results):
+        return CLI_EXIT_OK
+    return CLI_EXIT_FAILED
+
+@dataclass
+class DirectorySnapshot:
+    """
+    Immutable set of lookup indexes served by daemon. Replaced as a whole on refresh,
+    so request threads never see partially rebuilt data.
+    """
+    users_index : "UsersSearchIndex"
+    deps_tree : "DepartmentsTree"
+    alias_owners : dict
+    groups : list
+    groups_by_key : dict
+    shared_mailboxes_index : "SharedMailboxIndex"
+    timestamp : datetime
+
+def build_directory_snapshot(settings: "SettingParams", previous: DirectorySnapshot = None):
+    """
+    Load directory from API into a new snapshot. Return None if some data can not be received:
+    fetchers return empty lists on API errors, so empty users, SCIM users or departments
+    (and groups or shared mailboxes that were not empty in previous snapshot) are treated as errors.
+    """
+    users = get_all_api360_users(settings, force=True)
+    scim_users = get_all_scim_users(settings, force=True)
+    groups = get_all_groups(settings, force=True)
+    shared_mailboxes = get_all_shared_mailboxes(settings, force=True)
+    deps_tree = get_departments_tree(settings, force=True)
+    missing = []
+    if not users:
+        missing.append("users")
+    if not scim_users and not settings.skip_scim_api_call:
+        missing.append("SCIM users")
+    if not deps_tree.source:
+        missing.append("departments")
+    if previous is not None:
+        if not groups and previous.groups:
+            missing.append("groups")
+        if not shared_mailboxes and previous.shared_mailboxes_index.source:
+            missing.append("shared mailboxes")
+    if missing:
+        logger.error(f"Can not build directory snapshot: no {', '.join(missing)} received from API.")
+        return None
+    users_index = get_users_search_index(settings)
+    users_index.docs, users_index.trigrams = build_users_trigrams(users_index.source)
+    groups_by_key = {}
+    for group in groups or []:
+        keys = {str(group.get('id', '')), str(group.get('emailId', ''))}
+        email = group.get('email', '')
+        if email:
+            keys.add(email.lower())
+            keys.add(email.split('@')[0].lower())
+        keys.update(alias.lower() for alias in group.get('aliases', []))
+        for key in keys:
+            if key and key != "0":
+                groups_by_key.setdefault(key, []).append(group)
+    return DirectorySnapshot(
+        users_index=users_index,
+        deps_tree=deps_tree,
+        alias_owners=get_alias_owners_map(settings),
+        groups=groups or [],
+        groups_by_key=groups_by_key,
+        shared_mailboxes_index=get_shared_mailboxes_index(settings),
+        timestamp=datetime.now(),
+    )
+
+class LookupDaemon:
+    """
+    Keeps directory snapshot warm (background refresh) and answers lookups from it.
+    Group send permissions are fetched on demand and cached for DAEMON_PERMISSIONS_TTL_SEC.
+    """
+    def __init__(self, settings: "SettingParams", refresh_minutes: float):
+        self.settings = settings
+        self.refresh_minutes = refresh_minutes
+        self.snapshot = None
+        self.refresh_lock = threading.Lock()
+        self.permissions = {}
+        self.permissions_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def refresh(self) -> bool:
+        """Replace snapshot with a new one. On errors keep the current snapshot and return False."""
+        with self.refresh_lock:
+            # статистика вызовов API демона относится к периоду между обновлениями, иначе она растет все время работы процесса
+            metrics = self.settings.api_session.metrics if self.settings.api_session else None
+            if metrics:
+                requests_count = metrics.totals().calls
+                if requests_count:
+                    logger.debug("API requests since previous refresh: %s.", requests_count)
+                metrics.reset()
+            start = time.monotonic()
+            snapshot = build_directory_snapshot(self.settings, self.snapshot)
+            if snapshot is None:
+                return False
+            self.snapshot = snapshot
+            logger.info(f"Directory snapshot refreshed in {time.monotonic() - start:.1f} s ({len(snapshot.users_index.source)} users, {len(snapshot.groups)} groups).")
+            return True
+
+    def refresh_loop(self):
+        while not self.stop_event.wait(self.refresh_minutes * 60):
+            try:
+                if not self.refresh():
+                    logger.error(f"Directory snapshot refresh failed, keeping snapshot of {self.snapshot.timestamp.isoformat()}.")
+            except Exception as e:
+                logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
+
+    def find_groups(self, term: str) -> list:
+        term = term.strip().lower()
+        groups = self.snapshot.groups_by_key.get(term)
+        if groups:
+            return groups
+        return [group for group in self.snapshot.groups if term in group.get('name', '').lower()]
+
+    def get_permissions(self, group: dict):
+        key = str(group['emailId'])
+        with self.permissions_lock:
+            cached = self.permissions.get(key)
+        if cached and time.monotonic() - cached[0] < DAEMON_PERMISSIONS_TTL_SEC:
+            return cached[1]
+        permissions = get_mailing_list_permissions(self.settings, key)
+        if permissions is not None:
+            with self.permissions_lock:
+                self.permissions[key] = (time.monotonic(), permissions)
+        return permissions
+
+    def group_senders(self, group: dict) -> list:
+        permissions = self.get_permissions(group)
+        if permissions is None:
+            return None
+        senders = []
+        for item in permissions.get('grants', {}).get('items', []):
+            subject = item.get('subject')
+            if not subject:
+                continue
+            sender = {"type": subject.get('type', 'unknown'), "id": str(subject.get('id', '')), "org_id": subject.get('org_id', '')}
+            if sender['type'] == 'user':
+                user = self.snapshot.users_index.by_id.get(sender['id'])
+                if user:
+                    sender['nickname'] = user['nickname']
+                    sender['name'] = f"{user['name']['last']} {user['name']['first']}"
+            elif sender['type'] == 'shared_mailbox':
+                mailbox = self.snapshot.shared_mailboxes_index.by_id.get(sender['id'], {})
+                sender['name'] = mailbox.get('name', '')
+                sender['email'] = mailbox.get('email', '')
+            senders.append(sender)
+        return senders
+
+    def handle(self, method: str, path: str, query: dict):
+        """Return (HTTP status, JSON-serializable body)."""
+        if method == "POST" and path == "/refresh":
+            if not self.refresh():
+                return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "can not refresh directory snapshot", "snapshot": self.snapshot.timestamp.isoformat()}
+            return HTTPStatus.OK, {"refreshed": self.snapshot.timestamp.isoformat()}
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method not allowed"}
+        if path == "/health":
+            return HTTPStatus.OK, {
+                "snapshot": self.snapshot.timestamp.isoformat(),
+                "users": len(self.snapshot.users_index.source),
+                "groups": len(self.snapshot.groups),
+                "departments": len(self.snapshot.deps_tree.source),
+            }
+        if path not in ("/user", "/alias", "/department", "/group", "/group/senders"):
+            return HTTPStatus.NOT_FOUND, {"error": f"unknown path {path}"}
+        term = (query.get('q') or query.get('id') or [""])[0]
+        if not term:
+            return HTTPStatus.BAD_REQUEST, {"error": "parameter q is required"}
+        if path == "/user":
+            term = term.split('@')[0] if '@' in term else term
+            users = self.snapshot.users_index.find_exact(term)
+            if not users:
+                candidates = self.snapshot.users_index.find_fuzzy(term)
+                return HTTPStatus.NOT_FOUND, {"error": f"user {term} not found", "candidates": [
+                    {"score": score, "id": user['id'], "nickname": user['nickname']} for score, user in candidates]}
+            return HTTPStatus.OK, {"users": users}
+        if path == "/alias":
+            alias = term.split('@')[0].lower()
+            owners = self.snapshot.alias_owners.get(alias, [])
+            return HTTPStatus.OK, {"alias": alias, "free": not owners, "owners": owners}
+        if path == "/department":
+            if not term.isdigit() or int(term) not in self.snapshot.deps_tree.by_id:
+                return HTTPStatus.NOT_FOUND, {"error": f"department {term} not found"}
+            return HTTPStatus.OK, {"id": int(term), "name": self.snapshot.deps_tree.name(int(term)), "path": self.snapshot.deps_tree.path(int(term))}
+        if path in ("/group", "/group/senders"):
+            groups = self.find_groups(term)
+            if not groups:
+                return HTTPStatus.NOT_FOUND, {"error": f"group {term} not found"}
+            if path == "/group":
+                return HTTPStatus.OK, {"groups": groups}
+            if len(groups) > 1:
+                return HTTPStatus.CONFLICT, {"error": f"found {len(groups)} groups, specify more precise search", "groups": [
+                    {"id": group['id'], "name": group.get('name', ''), "email": group.get('email', '')} for group in groups]}
+            if str(groups[0].get('emailId', '0')) == "0":
+                return HTTPStatus.CONFLICT, {"error": f"group {term} is not mail enabled"}
+            senders = self.group_senders(groups[0])
+            if senders is None:
+                return HTTPStatus.BAD_GATEWAY, {"error": "can not get mailing list permissions"}
+            return HTTPStatus.OK, {"group": groups[0]['id'], "email": groups[0].get('email', ''), "senders": senders}
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    def _dispatch(self, method: str):
+        parsed = urlparse(self.path)
+        try:
+            status, body = self.server.lookup_daemon.handle(method, parsed.path.rstrip('/') or "/", parse_qs(parsed.query))
+        except Exception as e:
+            logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        data = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        logger.debug("daemon: %s", format % args)
+
+class UnixThreadingHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def run_lookup_daemon(settings: "SettingParams", host: str, port: int, socket_path: str = None, refresh_minutes: float = ALL_USERS_REFRESH_IN_MINUTES) -> int:
+    if tracer.enabled:
+        # события трассировки копятся в памяти до выхода, для долгоживущего процесса это утечка
+        logger.warning("Tracing is not supported in serve mode, TRACE_FILE and --trace-file are ignored.")
+        tracer.stop()
+    daemon = LookupDaemon(settings, refresh_minutes)
+    logger.info("Loading directory snapshot...")
+    if not daemon.refresh():
+        return CLI_EXIT_FAILED
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixThreadingHTTPServer(socket_path, LookupRequestHandler)
+        logger.info(f"Lookup daemon listening on unix socket {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), LookupRequestHandler)
+        logger.info(f"Lookup daemon listening on http://{host}:{port}")
+    server.lookup_daemon = daemon
+
+    threading.Thread(target=daemon.refresh_loop, name="cache-refresh", daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Lookup daemon stopped.")
+    finally:
+        daemon.stop_event.set()
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+    return CLI_EXIT_OK
+
 def parse_arguments():
     """Парсит позиционные аргументы командной строки."""
     parser = argparse.ArgumentParser(
@@ -587,12 +2196,12 @@ def change_SCIM_username_manually(settings: "SettingParams"):
     value = Prompt.ask("[bold yellow]Enter old and new value of userName, separated by space[/bold yellow]").strip()
     if not value:
         console.print("[bold red]❌ String cannot be empty.[/bold red]")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
     if len(value.split()) != 2:
         console.print("[bold red]❌ There must be exactly two arguments.[/bold red]")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
     old_value, new_value = value.split()
@@ -633,25 +2242,25 @@ def single_mode(settings: "SettingParams", old_value, new_value):
                                         ]
                                     }""".replace("alias@domain.tld", new_value))
             
-            logger.debug(f"PATCH URL: {url}/v2/Users/{uid}")
-            logger.debug(f"PATCH DATA: {data}")
+            logger.debug("PATCH URL: %s/v2/Users/%s", url, uid)
+            logger.debug("PATCH DATA: %s", LogBody(data))
             while True:
                 if settings.dry_run:
                     logger.info(f"Dry run: Would change userName for user {old_value} to {new_value}")
                     break
-                response = requests.patch(f"{url}/v2/Users/{uid}", headers=headers, json=data)
-                logger.debug(f"X-Request-Id: {response.headers.get('X-Request-Id','')}")
+                response = settings.api_session.patch(f"{url}/v2/Users/{uid}", headers=headers, json=data)
+                logger.debug("X-Request-Id: %s", response.headers.get('X-Request-Id',''))
                 if response.status_code != HTTPStatus.OK.value:
-                    logger.error(f"Error during PATCH request: {response.status_code}. Error message: {response.text}")
+                    logger.log(attempt_log_level(retries), "Error during PATCH request: %s. Error message: %s", response.status_code, LogBody(response.text))
                     if retries < MAX_RETRIES:
-                        logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                        logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                         time.sleep(RETRIES_DELAY_SEC * retries)
                         retries += 1
                     else:
                         logger.error(f"Error. Patching user {old_value} to {new_value} failed.")
                         break
                 else:
-                    logger.debug(f"Success! userNane for user {old_value} changed to {new_value}.")
+                    logger.debug("Success! userNane for user %s changed to %s.", old_value, new_value)
                     console.print(f"[bold green]🎉 Success! User {old_value} changed to {new_value}.[/bold green]")
                     break
 
@@ -660,8 +2269,33 @@ def single_mode(settings: "SettingParams", old_value, new_value):
     else:
         logger.error("List of SCIM users is empty.")
 
-    console.input("[dim]Press Enter to continue...[/dim]")
+    wait_for_enter(settings)
         
+def wait_for_enter(settings: "SettingParams"):
+    if settings.interactive:
+        console.input("[dim]Press Enter to continue...[/dim]")
+
+def confirm_action(settings: "SettingParams", message: str, default: bool = False) -> bool:
+    """
+    Ask for confirmation. In non-interactive mode the default answer is used, --yes answers yes.
+    """
+    if settings.interactive:
+        return Confirm.ask(message, default=default)
+    answer = settings.assume_yes or default
+    if answer:
+        logger.info(f"{Text.from_markup(message).plain} - yes (non-interactive mode)")
+    else:
+        logger.error(f"{Text.from_markup(message).plain} - no. Use --yes to confirm in non-interactive mode.")
+    return answer
+
+def ask_value(settings: "SettingParams", message: str, default: str) -> str:
+    """
+    Ask for value. In non-interactive mode the default (from settings or command line) is used.
+    """
+    if settings.interactive:
+        return Prompt.ask(message, default=default)
+    return default
+
 def clear_screen():
         os.system('cls' if os.name == 'nt' else 'clear')
 
@@ -694,7 +2328,7 @@ def main(settings: "SettingParams"):
                 logger.error("Wrong agruments count, start interactive mode.")
                 interactive_mode = True
 
-            logger.debug(f"Command line arguments: old={old_value}, new={new_value}, attribute={attribute}, confirm={confirm}")
+            logger.debug("Command line arguments: old=%s, new=%s, attribute=%s, confirm=%s", old_value, new_value, attribute, confirm)
 
         if interactive_mode:
             main_menu(settings)
@@ -830,41 +2464,42 @@ def submenu_1(settings: "SettingParams"):
 
         if choice == "0":
             break
-        elif choice == "1":
-            set_new_loginName_format(settings)
-        elif choice == "2":
-            if settings.skip_scim_api_call:
-                console.print("[bold red]⚠️  No SCIM config found. Skip action.[/bold red]")
-                console.input("[dim]Press Enter to continue...[/dim]")
-            else:
-                create_SCIM_userName_file(settings)
-        elif choice == "3":
-            if settings.skip_scim_api_call:
-                console.print("[bold red]⚠️  No SCIM config found. Skip action.[/bold red]")
-                console.input("[dim]Press Enter to continue...[/dim]")
-            else:
-                update_users_from_SCIM_userName_file(settings)
-        elif choice == "4":
-            if settings.skip_scim_api_call:
-                console.print("[bold red]⚠️  No SCIM config found. Skip action.[/bold red]")
-                console.input("[dim]Press Enter to continue...[/dim]")
-            else:
-                change_SCIM_username_manually(settings)
-        elif choice == "5":
-            change_nickname_prompt(settings)
-        elif choice == "6":
-            check_alias_prompt(settings)
-        elif choice == "7":
-            if settings.skip_scim_api_call:
-                console.print("[bold red]⚠️  No SCIM config found. Skip action.[/bold red]")
-                console.input("[dim]Press Enter to continue...[/dim]")
-            else:
-                remove_contacts_in_scim_prompt(settings)
+        with measured_operation(settings, f"menu 1.{choice}", "menu"):
+            if choice == "1":
+                set_new_loginName_format(settings)
+            elif choice == "2":
+                if settings.skip_scim_api_call:
+                    console.print("[bold red]⚠️  No SCIM config found. Skip action.[/bold red]")
+                    wait_for_enter(settings)
+                else:
+                    create_SCIM_userName_file(settings)
+            elif choice == "3":
+                if settings.skip_scim_api_call:
+                    console.print("[bold red]⚠️  No SCIM config found. Skip action.[/bold red]")
+                    wait_for_enter(settings)
+                else:
+                    update_users_from_SCIM_userName_file(settings)
+            elif choice == "4":
+                if settings.skip_scim_api_call:
+                    console.print("[bold red]⚠️  No SCIM config found. Skip action.[/bold red]")
+                    wait_for_enter(settings)
+                else:
+                    change_SCIM_username_manually(settings)
+            elif choice == "5":
+                change_nickname_prompt(settings)
+            elif choice == "6":
+                check_alias_prompt(settings)
+            elif choice == "7":
+                if settings.skip_scim_api_call:
+                    console.print("[bold red]⚠️  No SCIM config found. Skip action.[/bold red]")
+                    wait_for_enter(settings)
+                else:
+                    remove_contacts_in_scim_prompt(settings)
             
-        elif choice == "8":
-            show_user_attributes_prompt(settings)
-        elif choice == "9":
-            download_users_attrib_to_file(settings)
+            elif choice == "8":
+                show_user_attributes_prompt(settings)
+            elif choice == "9":
+                download_users_attrib_to_file(settings)
     return
 
 def submenu_2(settings: "SettingParams"):
@@ -880,7 +2515,9 @@ def submenu_2(settings: "SettingParams"):
         menu_content.append("2. ", style="bold cyan")
         menu_content.append("Download all users to file (SCIM и API) protocols\n", style="white")
         menu_content.append("3. ", style="bold cyan")
-        menu_content.append("Show user attributes and save their to file\n\n", style="white")
+        menu_content.append("Show user attributes and save their to file\n", style="white")
+        menu_content.append("4. ", style="bold cyan")
+        menu_content.append("Check aliases from file\n\n", style="white")
         menu_content.append("0 or empty string. ", style="bold red")
         menu_content.append("Back to main menu", style="red")
 
@@ -895,18 +2532,21 @@ def submenu_2(settings: "SettingParams"):
         
         choice = Prompt.ask(
             "[bold yellow]Enter your choice[/bold yellow]",
-            choices=["0", "1", "2", "3"],
+            choices=["0", "1", "2", "3", "4"],
             default="0"
         )
 
         if choice == "0":
             break
-        elif choice == "1":
-            check_alias_prompt(settings)
-        elif choice == "2":
-            download_users_attrib_to_file(settings)
-        elif choice == "3":
-            show_user_attributes_prompt(settings)
+        with measured_operation(settings, f"menu 2.{choice}", "menu"):
+            if choice == "1":
+                check_alias_prompt(settings)
+            elif choice == "2":
+                download_users_attrib_to_file(settings)
+            elif choice == "3":
+                show_user_attributes_prompt(settings)
+            elif choice == "4":
+                check_aliases_from_file(settings)
 
     return
 
@@ -944,12 +2584,15 @@ def submenu_3(settings: "SettingParams"):
 
         if choice == "0":
             break
-        elif choice == "1":
-            save_group_data_prompt(settings)
-        elif choice == "2":
-            show_mailing_list_permissions(settings)
-        elif choice == "3":
+        if choice == "3":
+            # вложенное меню: операциями считаются его пункты
             subsubmenu_30(settings)
+            continue
+        with measured_operation(settings, f"menu 3.{choice}", "menu"):
+            if choice == "1":
+                save_group_data_prompt(settings)
+            elif choice == "2":
+                show_mailing_list_permissions(settings)
 
     return
 
@@ -995,20 +2638,21 @@ def submenu_4(settings: "SettingParams"):
 
         if choice == "0":
             break
-        elif choice == "1":
-            default_email_create_file(settings)
-        elif choice == "2":
-            default_email_update_from_file(settings)
-        elif choice == "3":
-            forward_rules_get_for_user(settings)
-        elif choice == "4":
-            forward_rules_download_for_all_users(settings)
-        elif choice == "5":
-            forward_rules_clear_for_user(settings)
-        elif choice == "6":
-            get_email_signature(settings)
-        elif choice == "7":
-            set_email_signature(settings)
+        with measured_operation(settings, f"menu 4.{choice}", "menu"):
+            if choice == "1":
+                default_email_create_file(settings)
+            elif choice == "2":
+                default_email_update_from_file(settings)
+            elif choice == "3":
+                forward_rules_get_for_user(settings)
+            elif choice == "4":
+                forward_rules_download_for_all_users(settings)
+            elif choice == "5":
+                forward_rules_clear_for_user(settings)
+            elif choice == "6":
+                get_email_signature(settings)
+            elif choice == "7":
+                set_email_signature(settings)
 
     return
 
@@ -1052,18 +2696,19 @@ def submenu_5(settings: "SettingParams"):
 
         if choice == "0":
             break
-        elif choice == "1":
-            mfa_download_settings(settings)
-        elif choice == "2":
-            mfa_prompt_settings_for_user(settings)
-        elif choice == "3":
-            mfa_reset_personal_phone_prompt(settings)
-        elif choice == "4":
-            mfa_logout_single_user_prompt(settings)
-        elif choice == "5":
-            mfa_logout_users_from_file(settings)
-        elif choice == "6":
-            mfa_logout_users_with_no_phone(settings)
+        with measured_operation(settings, f"menu 5.{choice}", "menu"):
+            if choice == "1":
+                mfa_download_settings(settings)
+            elif choice == "2":
+                mfa_prompt_settings_for_user(settings)
+            elif choice == "3":
+                mfa_reset_personal_phone_prompt(settings)
+            elif choice == "4":
+                mfa_logout_single_user_prompt(settings)
+            elif choice == "5":
+                mfa_logout_users_from_file(settings)
+            elif choice == "6":
+                mfa_logout_users_with_no_phone(settings)
 
     return
 
@@ -1120,16 +2765,17 @@ def subsubmenu_30(settings: "SettingParams"):
 
         if choice == "0":
             break
-        elif choice == "1":
-            send_perm_set_target_group(settings)
-        elif choice == "2":
-            send_perm_add_users_to_allow_list_prompt(settings)
-        elif choice == "3":
-            send_perm_remove_users_from_allow_list(settings)
-        elif choice == "4":
-            send_perm_grand_all_users(settings)
-        elif choice == "5":
-            send_perm_shared_mailbox(settings)
+        with measured_operation(settings, f"menu 3.3.{choice}", "menu"):
+            if choice == "1":
+                send_perm_set_target_group(settings)
+            elif choice == "2":
+                send_perm_add_users_to_allow_list_prompt(settings)
+            elif choice == "3":
+                send_perm_remove_users_from_allow_list(settings)
+            elif choice == "4":
+                send_perm_grand_all_users(settings)
+            elif choice == "5":
+                send_perm_shared_mailbox(settings)
 
     return
 
@@ -1154,7 +2800,7 @@ def set_new_loginName_format(settings: "SettingParams"):
         settings.new_login_default_format = answer.strip()
         console.print(f"[green]✅ Format set to: {settings.new_login_default_format}[/green]")
     
-    console.input("[dim]Press Enter to continue...[/dim]")
+    wait_for_enter(settings)
     return settings
 
 def get_all_api360_users(settings: "SettingParams", force = False):
@@ -1178,6 +2824,7 @@ def get_all_shared_mailboxes(settings: "SettingParams", force = False):
         if not result:
             logger.error("Can not get shared mailboxes data from Y360 API.")
         settings.shared_mailboxes_get_timestamp = datetime.now()
+        settings.shared_mailboxes_index = build_shared_mailbox_index(settings.shared_mailboxes)
     else:
         if (datetime.now() - settings.shared_mailboxes_get_timestamp).total_seconds() > ALL_USERS_REFRESH_IN_MINUTES * 60:
             logger.info("Getting all shared mailboxes of the organisation from API...")
@@ -1185,8 +2832,70 @@ def get_all_shared_mailboxes(settings: "SettingParams", force = False):
             if not result:
                 logger.error("Can not get shared mailboxes data from Y360 API.")
             settings.shared_mailboxes_get_timestamp = datetime.now()
+            settings.shared_mailboxes_index = build_shared_mailbox_index(settings.shared_mailboxes)
     return settings.shared_mailboxes
 
+def get_shared_mailboxes_index(settings: "SettingParams", force = False):
+    shared_mailboxes = get_all_shared_mailboxes(settings, force)
+    if settings.shared_mailboxes_index is None or settings.shared_mailboxes_index.source is not shared_mailboxes:
+        settings.shared_mailboxes_index = build_shared_mailbox_index(shared_mailboxes)
+    return settings.shared_mailboxes_index
+
+@dataclass
+class SharedMailboxIndex:
+    """
+    Lookup tables over shared mailboxes: by id, by email, by lowercase local part
+    and by name trigrams (substring search without scanning all mailboxes).
+    """
+    source : list
+    by_id : dict
+    by_email : dict
+    by_local_part : dict
+    names : list
+    name_trigrams : dict
+
+    def find_by_email(self, email: str):
+        return self.by_email.get(email.strip().lower())
+
+    def find_by_local_part(self, alias: str):
+        return self.by_local_part.get(alias.strip().lower())
+
+    def find_by_name(self, text: str) -> list:
+        """Return mailboxes whose name contains text (case-insensitive)."""
+        text = text.strip().lower()
+        if len(text) < 3:
+            candidates = range(len(self.names))
+        else:
+            candidates = None
+            for i in range(len(text) - 2):
+                postings = self.name_trigrams.get(text[i:i + 3])
+                if not postings:
+                    return []
+                candidates = postings if candidates is None else candidates & postings
+                if not candidates:
+                    return []
+            candidates = sorted(candidates)
+        return [self.source[i] for i in candidates if text in self.names[i]]
+
+def build_shared_mailbox_index(shared_mailboxes: list) -> "SharedMailboxIndex":
+    by_id = {}
+    by_email = {}
+    by_local_part = {}
+    names = []
+    name_trigrams = {}
+    for position, mailbox in enumerate(shared_mailboxes):
+        by_id[str(mailbox['id'])] = mailbox
+        email = mailbox.get('email', '').lower()
+        if email:
+            by_email.setdefault(email, mailbox)
+            by_local_part.setdefault(email.split("@")[0], mailbox)
+        name = mailbox.get('name', '').lower()
+        names.append(name)
+        for i in range(len(name) - 2):
+            name_trigrams.setdefault(name[i:i + 3], set()).add(position)
+    return SharedMailboxIndex(source=shared_mailboxes, by_id=by_id, by_email=by_email, by_local_part=by_local_part,
+                              names=names, name_trigrams=name_trigrams)
+
 def get_all_groups(settings: "SettingParams", force = False):
     if not force:
         logger.info("Getting all groups of the organisation from cache...")
@@ -1206,13 +2915,13 @@ def http_get_request(url, headers):
     try:
         retries = 1
         while True:
-            logger.debug(f"GET URL - {url}")
+            logger.debug("GET URL - %s", url)
             response = requests.get(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"!!! ERROR !!! during GET request url - {url}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "!!! ERROR !!! during GET request url - %s: %s. Error message: %s", url, response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -1228,10 +2937,21 @@ def http_get_request(url, headers):
 
 def get_all_api360_users_from_api(settings: "SettingParams"):
     logger.info("Getting all users of the organisation...")
+    users = []
+    for page in iter_api360_users_pages(settings):
+        if page is None:
+            logger.error("There are some error during GET requests. Return empty user list.")
+            return []
+        users.extend(page)
+    return users
+
+def iter_api360_users_pages(settings: "SettingParams"):
+    """
+    Yield users of the organisation page by page (robots and service accounts are skipped).
+    Yields None and stops if a page can not be received.
+    """
     url = f"{DEFAULT_360_API_URL}/directory/v1/org/{settings.org_id}/users"
     headers = {"Authorization": f"OAuth {settings.oauth_token}"}
-    has_errors = False
-    users = []
     current_page = 1
     last_page = 1
     while current_page <= last_page:
@@ -1239,40 +2959,32 @@ def get_all_api360_users_from_api(settings: "SettingParams"):
         try:
             retries = 1
             while True:
-                logger.debug(f"GET URL - {url}")
-                response = requests.get(url, headers=headers, params=params)
-                logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+                logger.debug("GET URL - %s", url)
+                response = settings.api_session.get(url, headers=headers, params=params)
+                logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
                 if response.status_code != HTTPStatus.OK.value:
-                    logger.error(f"!!! ERROR !!! during GET request url - {url}: {response.status_code}. Error message: {response.text}")
+                    logger.log(attempt_log_level(retries), "!!! ERROR !!! during GET request url - %s: %s. Error message: %s", url, response.status_code, LogBody(response.text))
                     if retries < MAX_RETRIES:
-                        logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                        logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                         time.sleep(RETRIES_DELAY_SEC * retries)
                         retries += 1
                     else:
-                        has_errors = True
-                        break
+                        yield None
+                        return
                 else:
-                    for user in response.json()['users']:
-                        if not user.get('isRobot') and int(user['id']) >= 1130000000000000:
-                            users.append(user)
-                    logger.debug(f"Get {len(response.json()['users'])} users from page {current_page} (total {last_page} page(s)).")
+                    data = response.json()
+                    page = [user for user in data['users'] if not user.get('isRobot') and int(user['id']) >= 1130000000000000]
+                    logger.debug("Get %s users from page %s (total %s page(s)).", len(data['users']), current_page, last_page)
                     current_page += 1
-                    last_page = response.json()['pages']
+                    last_page = data['pages']
                     break
 
         except requests.exceptions.RequestException as e:
             logger.error(f"!!! ERROR !!! {type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
-            has_errors = True
-            break
-
-        if has_errors:
-            break
+            yield None
+            return
 
-    if has_errors:
-        print("There are some error during GET requests. Return empty user list.")
-        return []
-    
-    return users
+        yield page
 
 def get_all_groups_from_api360(settings: "SettingParams"):
 
@@ -1288,13 +3000,13 @@ def get_all_groups_from_api360(settings: "SettingParams"):
         try:
             retries = 1
             while True:
-                logger.debug(f"GET URL - {url}")
-                response = requests.get(url, headers=headers, params=params)
-                logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+                logger.debug("GET URL - %s", url)
+                response = settings.api_session.get(url, headers=headers, params=params)
+                logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
                 if response.status_code != HTTPStatus.OK.value:
-                    logger.error(f"!!! ERROR !!! during GET request url - {url}: {response.status_code}. Error message: {response.text}")
+                    logger.log(attempt_log_level(retries), "!!! ERROR !!! during GET request url - %s: %s. Error message: %s", url, response.status_code, LogBody(response.text))
                     if retries < MAX_RETRIES:
-                        logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                        logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                         time.sleep(RETRIES_DELAY_SEC * retries)
                         retries += 1
                     else:
@@ -1302,7 +3014,7 @@ def get_all_groups_from_api360(settings: "SettingParams"):
                         break
                 else:
                     groups.extend(response.json()['groups'])
-                    logger.debug(f"Get {len(response.json()['groups'])} groups from page {current_page} (total {last_page} page(s)).")
+                    logger.debug("Get %s groups from page %s (total %s page(s)).", len(response.json()['groups']), current_page, last_page)
                     current_page += 1
                     last_page = response.json()['pages']
                     break
@@ -1323,7 +3035,7 @@ def get_all_groups_from_api360(settings: "SettingParams"):
 
 def find_group_by_param(groups: list, search_string: str, search_type: str ):
     """Find group by exact alias match, email prefix match, or partial group name match"""
-    logger.debug(f"Finding group by search string {search_string}...")
+    logger.debug("Finding group by search string %s...", search_string)
     result = []  # noqa: F811
     for group in groups:
         # Check aliases
@@ -1353,21 +3065,45 @@ def find_group_by_param(groups: list, search_string: str, search_type: str ):
                     result.append(group)
     return result
 
+def run_in_parallel(settings: "SettingParams", func, items: list):
+    """
+    Call func for each item using up to settings.max_parallel_api_calls threads.
+    Results are returned in the order of items, failed calls give None.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
+            return None
+
+    max_workers = min(settings.max_parallel_api_calls, len(items))
+    if max_workers <= 1:
+        return [call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # контекст (организация в multi-org режиме) передается в рабочие потоки
+        futures = [executor.submit(contextvars.copy_context().run, call, item) for item in items]
+        return [future.result() for future in futures]
+
 def get_default_email(settings: "SettingParams", userId: str):
-    logger.debug(f"Getting default email for user {userId}...")
+    logger.debug("Getting default email for user %s...", userId)
     url = f"{DEFAULT_360_API_URL}/admin/v1/org/{settings.org_id}/mail/users/{userId}/settings/sender_info"
     headers = {"Authorization": f"OAuth {settings.oauth_token}"}
     data = {}
     try:
         retries = 1
         while True:
-            logger.debug(f"GET url - {url}")
-            response = requests.get(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            logger.debug("GET url - %s", url)
+            response = settings.api_session.get(url, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request for user {userId}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during GET request for user %s: %s. Error message: %s", userId, response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -1404,47 +3140,57 @@ def get_all_scim_users_from_api(settings: "SettingParams"):
     
     logger.info("Getting all users of the organisation from SCIM...")
     users = []
+    for page in iter_scim_users_pages(settings):
+        if page is None:
+            return []
+        users.extend(page)
+    return users
+
+def iter_scim_users_pages(settings: "SettingParams"):
+    """
+    Yield SCIM users page by page. Yields None and stops if a page can not be received.
+    """
     headers = {
         "Authorization": f"Bearer {settings.scim_token}"
     }
     url = DEFAULT_360_SCIM_API_URL.format(domain_id=settings.domain_id)
     startIndex = 1
     items = ITEMS_PER_PAGE
-    try:
-        retries = 1
-        while True:  
-            logger.debug(f"GET url - {url}/v2/Users?startIndex={startIndex}&count={items}")         
-            response = requests.get(f"{url}/v2/Users?startIndex={startIndex}&count={items}", headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
-            if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request: {response.status_code}. Error message: {response.text}")
-                if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
-                    time.sleep(RETRIES_DELAY_SEC * retries)
-                    retries += 1
+    while True:
+        try:
+            retries = 1
+            while True:  
+                logger.debug("GET url - %s/v2/Users?startIndex=%s&count=%s", url, startIndex, items)
+                response = settings.api_session.get(f"{url}/v2/Users?startIndex={startIndex}&count={items}", headers=headers)
+                logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
+                if response.status_code != HTTPStatus.OK.value:
+                    logger.log(attempt_log_level(retries), "Error during GET request: %s. Error message: %s", response.status_code, LogBody(response.text))
+                    if retries < MAX_RETRIES:
+                        logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                        time.sleep(RETRIES_DELAY_SEC * retries)
+                        retries += 1
+                    else:
+                        logger.error("Forcing exit without getting data.")
+                        yield None
+                        return
                 else:
-                    logger.error("Forcing exit without getting data.")
-                    return
-            else:
-                retries = 1
-                temp_list = response.json()['Resources']
-                logger.debug(f'Received {len(temp_list)} records.')
-                users.extend(temp_list)
-
-                if int(response.json()['startIndex']) + int(response.json()['itemsPerPage']) > int(response.json()['totalResults']) + 1:
+                    data = response.json()
                     break
-                else:
-                    startIndex = int(response.json()['startIndex']) + int(response.json()['itemsPerPage'])
-
-    except Exception as e:
-        logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
-        return []
-    
-    if settings.ignore_user_domain:
-        for user in users:
-            user['userName'] = user['userName'].split("@")[0]
+            page = data['Resources']
+            logger.debug(f'Received {len(page)} records.')
+            if settings.ignore_user_domain:
+                for user in page:
+                    user['userName'] = user['userName'].split("@")[0]
+            last_page = int(data['startIndex']) + int(data['itemsPerPage']) > int(data['totalResults']) + 1
+            startIndex = int(data['startIndex']) + int(data['itemsPerPage'])
+        except Exception as e:
+            logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
+            yield None
+            return
 
-    return users
+        yield page
+        if last_page:
+            return
 
 def get_selected_scim_users_from_api(settings: "SettingParams", user_ids: list[str]):
     
@@ -1464,13 +3210,13 @@ def get_selected_scim_users_from_api(settings: "SettingParams", user_ids: list[s
         for user_id in user_ids:
             retries = 1
             while True:
-                logger.debug(f"GET url - {url}/v2/Users/{user_id}")         
-                response = requests.get(f"{url}/v2/Users/{user_id}", headers=headers)
-                logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+                logger.debug("GET url - %s/v2/Users/%s", url, user_id)
+                response = settings.api_session.get(f"{url}/v2/Users/{user_id}", headers=headers)
+                logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
                 if response.status_code != HTTPStatus.OK.value:
-                    logger.error(f"Error during GET request: {response.status_code}. Error message: {response.text}")
+                    logger.log(attempt_log_level(retries), "Error during GET request: %s. Error message: %s", response.status_code, LogBody(response.text))
                     if retries < MAX_RETRIES:
-                        logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                        logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                         time.sleep(RETRIES_DELAY_SEC * retries)
                         retries += 1
                     else:
@@ -1523,12 +3269,12 @@ def change_nickname_prompt(settings: "SettingParams"):
             break
         elif len(data.split()) != 2:
             console.print("[bold red]❌ Invalid input. Please enter old value and new value separated by space.[/bold red]")
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
         else:
             old_value, new_value = data.split()
             #with console.status(f"[bold green]Changing nickname from '{old_value}' to '{new_value}'...", spinner="dots"):
             change_nickname(settings, old_value, new_value)
-            #console.input("[dim]Press Enter to continue...[/dim]")
+            #wait_for_enter(settings)
     return
 
 def check_alias_prompt(settings: "SettingParams"):
@@ -1554,6 +3300,65 @@ def check_alias_prompt(settings: "SettingParams"):
         
     return
 
+def build_alias_owners_map(users: list, scim_users: list, groups: list, shared_mailboxes: list) -> dict:
+    """
+    Build alias -> owners map over nicknames, aliases, email contacts,
+    SCIM userName, group and shared mailbox addresses.
+    Keys are lowercase local parts (and full SCIM userName).
+    """
+    owners = {}
+
+    def add(key, owner_type, owner, owner_id, display_name):
+        if not key:
+            return
+        owners.setdefault(key.lower(), []).append({
+            "type": owner_type,
+            "owner": owner,
+            "id": str(owner_id),
+            "displayName": display_name or ""
+        })
+
+    for user in users or []:
+        display_name = user.get('displayName', '')
+        add(user['nickname'], "Nickname", user['nickname'], user['id'], display_name)
+        for alias in user.get('aliases', []):
+            add(alias, "Alias", user['nickname'], user['id'], display_name)
+        for contact in user.get('contacts', []):
+            if contact['type'] == 'email':
+                add(contact['value'].split('@')[0], "Email Contact", user['nickname'], user['id'], display_name)
+
+    for user in scim_users or []:
+        local_part = user['userName'].split('@')[0]
+        add(user['userName'], "SCIM userName", user['userName'], user['id'], user.get('displayName', ''))
+        if local_part.lower() != user['userName'].lower():
+            add(local_part, "SCIM userName", user['userName'], user['id'], user.get('displayName', ''))
+
+    for group in groups or []:
+        email = group.get('email', '')
+        if email:
+            add(email.split('@')[0], "Group", email, group['id'], group.get('name', ''))
+        for alias in group.get('aliases', []):
+            add(alias, "Group Alias", email or group.get('name', ''), group['id'], group.get('name', ''))
+
+    for mailbox in shared_mailboxes or []:
+        email = mailbox.get('email', '')
+        if email:
+            add(email.split('@')[0], "Shared Mailbox", email, mailbox['id'], mailbox.get('name', ''))
+
+    return owners
+
+def get_alias_owners_map(settings: "SettingParams") -> dict:
+    users = get_all_api360_users(settings)
+    scim_users = get_all_scim_users(settings)
+    groups = get_all_groups(settings)
+    shared_mailboxes = get_all_shared_mailboxes(settings)
+    sources = (users, scim_users, groups, shared_mailboxes)
+    if len(settings.alias_owners_sources) != len(sources) or any(a is not b for a, b in zip(settings.alias_owners_sources, sources)):
+        logger.debug("Building alias owners map...")
+        settings.alias_owners_map = build_alias_owners_map(users, scim_users, groups, shared_mailboxes)
+        settings.alias_owners_sources = sources
+    return settings.alias_owners_map
+
 def check_alias(settings: "SettingParams", alias: str):
     console.print(f"[bold blue]🔍 Checking alias: [cyan]{alias}[/cyan][/bold blue]")
     
@@ -1571,56 +3376,84 @@ def check_alias(settings: "SettingParams", alias: str):
     results_table.add_column("ID", style="yellow")
     results_table.add_column("Display Name", style="white")
     
-    found_conflicts = False
+    owners = get_alias_owners_map(settings).get(alias.lower(), [])
+    for owner in owners:
+        results_table.add_row(owner['type'], owner['owner'], owner['id'], owner['displayName'])
     
-    for user in users:
-        if alias == user['nickname']:
-            results_table.add_row(
-                "Nickname",
-                user['nickname'],
-                user['id'],
-                user.get('displayName', '')
-            )
-            found_conflicts = True
-            
-        if alias in user['aliases']:
-            results_table.add_row(
-                "Alias",
-                user['nickname'],
-                user['id'],
-                user.get('displayName', '')
-            )
-            found_conflicts = True
-            
-        for contact in user['contacts']:
-            if contact['type'] == 'email' and contact['value'].split('@')[0] == alias:
-                results_table.add_row(
-                    "Email Contact",
-                    user['nickname'],
-                    user['id'],
-                    user.get('displayName', '')
-                )
-                found_conflicts = True
-
-    scim_users = get_all_scim_users(settings)
-    if scim_users:
-        for user in scim_users:
-            if alias == user['userName'] or alias == user['userName'].split('@')[0]:
-                results_table.add_row(
-                    "SCIM userName",
-                    user['userName'],
-                    user['id'],
-                    user['displayName']
-                )
-                found_conflicts = True
-    
-    if found_conflicts:
+    if owners:
         console.print(f"[bold red]⚠️  Alias '{alias}' is already in use:[/bold red]")
         console.print(results_table)
-        #console.input("[dim]Press Enter to continue...[/dim]")
+        #wait_for_enter(settings)
     else:
         console.print(f"[bold blue]✅ Alias '{alias}' is not found in Y360![/bold blue]")
 
+def check_aliases_from_file(settings: "SettingParams"):
+    """
+    Check all candidate aliases from file against alias owners map in one pass
+    """
+    input_file = ask_value(
+        settings,
+        "[bold yellow]Enter path to file with aliases to check[/bold yellow]",
+        settings.aliases_check_input_file
+    )
+    if not os.path.isfile(input_file):
+        console.print(f"[bold red]❌ File '{input_file}' does not exist.[/bold red]")
+        wait_for_enter(settings)
+        return False
+
+    candidates = read_aliases_from_file(input_file)
+    if not candidates:
+        logger.error(f"No aliases found in file {input_file}.")
+        wait_for_enter(settings)
+        return
+
+    with console.status("[bold green]Loading users, groups and shared mailboxes...", spinner="dots"):
+        alias_owners = get_alias_owners_map(settings)
+
+    output_file = output_path(settings, settings.aliases_check_output_file)
+    busy_count = write_aliases_check_result(output_file, candidates, alias_owners)
+    console.print(f"[green]✅ Checked {len(candidates)} aliases: {len(candidates) - busy_count} free, {busy_count} already in use.[/green]")
+    console.print(f"[green]Result saved to file: {output_file}[/green]")
+    wait_for_enter(settings)
+
+def read_aliases_from_file(file_path: str) -> list:
+    """
+    Read candidate aliases (first column, domain is ignored), skipping lines starting with # and header
+    """
+    aliases = []
+    seen = set()
+    pattern = r'[;,\s]+'
+    first_line = True
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            alias = re.split(pattern, line)[0].split('@')[0].lower()
+            # заголовок может быть только первой строкой, дальше "alias" - обычный проверяемый алиас
+            is_header = first_line and alias == "alias"
+            first_line = False
+            if not alias or is_header or alias in seen:
+                continue
+            seen.add(alias)
+            aliases.append(alias)
+    return aliases
+
+def write_aliases_check_result(output_file: str, aliases: list, alias_owners: dict) -> int:
+    busy_count = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("alias;status;type;owner;id;displayName\n")
+        for alias in aliases:
+            owners = alias_owners.get(alias, [])
+            if not owners:
+                f.write(f"{alias};free;;;;\n")
+                continue
+            busy_count += 1
+            for owner in owners:
+                f.write(f"{alias};in_use;{owner['type']};{owner['owner']};{owner['id']};{owner['displayName']}\n")
+    logger.info(f"Aliases check result for {len(aliases)} aliases saved to file {output_file} ({busy_count} in use).")
+    return busy_count
+
 def change_nickname(settings: "SettingParams", old_value: str, new_value: str):
     logger.info(f"Changing nickname of user {old_value} to {new_value}")
     users = get_all_api360_users(settings, True)
@@ -1666,19 +3499,19 @@ def change_nickname(settings: "SettingParams", old_value: str, new_value: str):
     raw_data = {'nickname': new_value}
     url = f"{DEFAULT_360_API_URL}/directory/v1/org/{settings.org_id}/users/{target_user[0]['id']}"
     headers = {"Authorization": f"OAuth {settings.oauth_token}"}
-    logger.debug(f"PATCH URL: {url}")
-    logger.debug(f"PATCH DATA: {raw_data}")
+    logger.debug("PATCH URL: %s", url)
+    logger.debug("PATCH DATA: %s", LogBody(raw_data))
     try:
         if settings.dry_run:
             logger.info(f"Dry run: Would change nickname of user {old_value} to {new_value}")
         else:
-            response = requests.patch(url, headers=headers, data=json.dumps(raw_data))
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            response = settings.api_session.patch(url, headers=headers, data=json.dumps(raw_data))
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.ok:
                 logger.info(f"Nickname of user {old_value} changed to {new_value}")
                 time.sleep(SLEEP_TIME_BETWEEN_API_CALLS)
             else:
-                logger.error(f"Error ({response.status_code}) changing nickname of user {old_value} to {new_value}: {response.text}")
+                logger.error("Error (%s) changing nickname of user %s to %s: %s", response.status_code, old_value, new_value, LogBody(response.text))
                 return
 
     except requests.exceptions.RequestException as e:
@@ -1699,18 +3532,18 @@ def remove_alias_by_api360(settings: "SettingParams", user_id: str, alias: str):
         retries = 1
         url = f"{DEFAULT_360_API_URL}/directory/v1/org/{settings.org_id}/users/{user_id}/aliases/{alias}"
         headers = {"Authorization": f"OAuth {settings.oauth_token}"}
-        logger.debug(f"DELETE URL: {url}")
+        logger.debug("DELETE URL: %s", url)
         
         while True:
             if settings.dry_run:
                 logger.info(f"Dry run: Would remove alias {alias} in _API360_ user {user_id}")
                 break
-            response = requests.delete(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            response = settings.api_session.delete(url, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during DELETE request: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during DELETE request: %s. Error message: %s", response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -1728,9 +3561,9 @@ def remove_alias_in_scim(settings: "SettingParams", user_id: str, alias: str):
     url = DEFAULT_360_SCIM_API_URL.format(domain_id=settings.domain_id)
     headers = {"Authorization": f"Bearer {settings.scim_token}"}
     try:
-        logger.debug(f"GET url - {url}/v2/Users/{user_id}")
-        response = requests.get(f"{url}/v2/Users/{user_id}", headers=headers)
-        logger.debug(f"X-Request-Id: {response.headers.get('X-Request-Id','')}")
+        logger.debug("GET url - %s/v2/Users/%s", url, user_id)
+        response = settings.api_session.get(f"{url}/v2/Users/{user_id}", headers=headers)
+        logger.debug("X-Request-Id: %s", response.headers.get('X-Request-Id',''))
         if response.ok:
             user = response.json()
             if user['urn:ietf:params:scim:schemas:extension:yandex360:2.0:User']['aliases']:
@@ -1752,18 +3585,18 @@ def remove_alias_in_scim(settings: "SettingParams", user_id: str, alias: str):
                                             ]
                                         }""".replace("_data_", json.dumps(user['urn:ietf:params:scim:schemas:extension:yandex360:2.0:User']['aliases'])))
                 
-                logger.debug(f"PATCH URL: {url}/v2/Users/{user_id}")
-                logger.debug(f"PATCH DATA: {data}")
+                logger.debug("PATCH URL: %s/v2/Users/%s", url, user_id)
+                logger.debug("PATCH DATA: %s", LogBody(data))
                 if settings.dry_run:
                     logger.info(f"Dry run: Would remove alias {alias} in _SCIM_ user {user_id}")
                     return
-                response = requests.patch(f"{url}/v2/Users/{user_id}", headers=headers, data=json.dumps(data))
-                logger.debug(f"X-Request-Id: {response.headers.get('X-Request-Id','')}")
+                response = settings.api_session.patch(f"{url}/v2/Users/{user_id}", headers=headers, data=json.dumps(data))
+                logger.debug("X-Request-Id: %s", response.headers.get('X-Request-Id',''))
                 if response.ok:
                     logger.info(f"Alias {alias} removed in user {user_id}")
                     time.sleep(SLEEP_TIME_BETWEEN_API_CALLS)
                 else:
-                    logger.error(f"Error ({response.status_code}) removing alias {alias} in user {user_id}: {response.text}")
+                    logger.error("Error (%s) removing alias %s in user %s: %s", response.status_code, alias, user_id, LogBody(response.text))
     except requests.exceptions.RequestException as e:
         logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
 
@@ -1772,9 +3605,9 @@ def remove_email_in_scim(settings: "SettingParams", user_id: str, alias: str):
     url = DEFAULT_360_SCIM_API_URL.format(domain_id=settings.domain_id) 
     headers = {"Authorization": f"Bearer {settings.scim_token}"}
     try:
-        logger.debug(f"GET url - {url}/v2/Users/{user_id}")
-        response = requests.get(f"{url}/v2/Users/{user_id}", headers=headers)
-        logger.debug(f"X-Request-Id: {response.headers.get('X-Request-Id','')}")
+        logger.debug("GET url - %s/v2/Users/%s", url, user_id)
+        response = settings.api_session.get(f"{url}/v2/Users/{user_id}", headers=headers)
+        logger.debug("X-Request-Id: %s", response.headers.get('X-Request-Id',''))
         if response.ok:
             user = response.json()
             new_emails= []
@@ -1804,18 +3637,18 @@ def remove_email_in_scim(settings: "SettingParams", user_id: str, alias: str):
                                             ]
                                         }""".replace("_data_", json.dumps(new_emails)))
                 
-                logger.debug(f"PATCH URL: {url}/v2/Users/{user_id}")
-                logger.debug(f"PATCH DATA: {data}") 
+                logger.debug("PATCH URL: %s/v2/Users/%s", url, user_id)
+                logger.debug("PATCH DATA: %s", LogBody(data))
                 if settings.dry_run:
                     logger.info(f"Dry run: Would remove alias {alias} from email contacts in _SCIM_ user {user_id}")
                     return
-                response = requests.patch(f"{url}/v2/Users/{user_id}", headers=headers, data=json.dumps(data))
-                logger.debug(f"X-Request-Id: {response.headers.get('X-Request-Id','')}")
+                response = settings.api_session.patch(f"{url}/v2/Users/{user_id}", headers=headers, data=json.dumps(data))
+                logger.debug("X-Request-Id: %s", response.headers.get('X-Request-Id',''))
                 if response.ok:
                     logger.info(f"Alias {alias} removed from email contacts in _SCIM_ user {user_id}")
                     time.sleep(SLEEP_TIME_BETWEEN_API_CALLS)
                 else:
-                    logger.error(f"Error ({response.status_code}) removing alias {alias} from email contacts in _SCIM_ user {user_id}: {response.text}")
+                    logger.error("Error (%s) removing alias %s from email contacts in _SCIM_ user %s: %s", response.status_code, alias, user_id, LogBody(response.text))
     except requests.exceptions.RequestException as e:
         logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
 
@@ -1846,7 +3679,7 @@ def remove_unlinked_domains_in_scim_emails_for_all_users(settings: "SettingParam
                 continue
             
             if found_domains:
-                logger.debug(f"User {user['id']} has email with domains {','.join(domains)}. Removing this email.")
+                logger.debug("User %s has email with domains %s. Removing this email.", user['id'], ','.join(domains))
                 data = json.loads("""   { "Operations":    
                                             [
                                                 {
@@ -1860,24 +3693,24 @@ def remove_unlinked_domains_in_scim_emails_for_all_users(settings: "SettingParam
                                             ]
                                         }""".replace("_data_", json.dumps(new_emails)))
                 
-                logger.debug(f"PATCH URL: {url}/v2/Users/{user['id']}")
-                logger.debug(f"PATCH DATA: {data}") 
+                logger.debug("PATCH URL: %s/v2/Users/%s", url, user['id'])
+                logger.debug("PATCH DATA: %s", LogBody(data))
 
                 retries = 1
                 while True:
                     if settings.dry_run:
                         logger.info(f"Dry run: Would remove email with domains {','.join(domains)} from email contacts in _SCIM_ user {user['id']}")
                         break
-                    response = requests.patch(f"{url}/v2/Users/{user['id']}", headers=headers, data=json.dumps(data))
-                    logger.debug(f"X-Request-Id: {response.headers.get('X-Request-Id','')}")
+                    response = settings.api_session.patch(f"{url}/v2/Users/{user['id']}", headers=headers, data=json.dumps(data))
+                    logger.debug("X-Request-Id: %s", response.headers.get('X-Request-Id',''))
                     if response.status_code != HTTPStatus.OK.value:
-                        logger.error(f"Error during PATCH request: {response.status_code}. Error message: {response.text}")
+                        logger.log(attempt_log_level(retries), "Error during PATCH request: %s. Error message: %s", response.status_code, LogBody(response.text))
                         if retries < MAX_RETRIES:
-                            logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                            logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                             time.sleep(RETRIES_DELAY_SEC * retries)
                             retries += 1
                         else:
-                            logger.error(f"Error ({response.status_code}) removing email with domains {','.join(domains)} from email contacts in _SCIM_ user {user['id']}: {response.text}")
+                            logger.error("Error (%s) removing email with domains %s from email contacts in _SCIM_ user %s: %s", response.status_code, ','.join(domains), user['id'], LogBody(response.text))
                             break
                     else:
                             logger.info(f"Email with domains {','.join(domains)} removed from email contacts in _SCIM_ user {user['id']}")
@@ -1897,6 +3730,8 @@ def remove_emails_matching_templates_in_scim(settings: "SettingParams", template
             scim_users = get_all_scim_users(settings, force_SCIM_call)
         else:
             scim_users = get_selected_scim_users_from_api(settings, api_users_ids)
+        api_users_ids = set(api_users_ids)
+        templates_matcher = EmailTemplateMatcher(templates)
         if not scim_users:
             logger.error("No users found from SCIM calls. Check your settings.")
             return
@@ -1910,12 +3745,9 @@ def remove_emails_matching_templates_in_scim(settings: "SettingParams", template
             emails_to_remove = []
             for email in user['emails']:
                 temp = {}
-                email_matches_template = False
-                for template in templates:
-                    if match_email_with_template(template, email['value']):
-                        email_matches_template = True
-                        emails_to_remove.append(email['value'])
-                        break
+                email_matches_template = templates_matcher.match(email['value'])
+                if email_matches_template:
+                    emails_to_remove.append(email['value'])
 
                 if not email_matches_template and email['value'] not in seen_emails:
                     temp['primary'] = email['primary']
@@ -1935,7 +3767,7 @@ def remove_emails_matching_templates_in_scim(settings: "SettingParams", template
                     for email in emails_to_remove:
                         logger.info(f"User {user['id']} ({user['userName']}) has email to remove: {email} matching templates {','.join(templates)}")
                     continue
-                logger.debug(f"User {user['id']} ({user['userName']}) has emails matching templates {','.join(templates)}. Removing emails: {','.join(emails_to_remove)}")
+                logger.debug("User %s (%s) has emails matching templates %s. Removing emails: %s", user['id'], user['userName'], ','.join(templates), ','.join(emails_to_remove))
                 data = json.loads("""   { "Operations":
                                             [
                                                 {
@@ -1949,24 +3781,24 @@ def remove_emails_matching_templates_in_scim(settings: "SettingParams", template
                                             ]
                                         }""".replace("_data_", json.dumps(new_emails)))
 
-                logger.debug(f"PATCH URL: {url}/v2/Users/{user['id']}")
-                logger.debug(f"PATCH DATA: {data}")
+                logger.debug("PATCH URL: %s/v2/Users/%s", url, user['id'])
+                logger.debug("PATCH DATA: %s", LogBody(data))
 
                 retries = 1
                 while True:
                     if settings.dry_run:
                         logger.info(f"Dry run: Would remove emails matching templates {','.join(templates)} from email contacts in _SCIM_ user {user['id']}: {','.join(emails_to_remove)}")
                         break
-                    response = requests.patch(f"{url}/v2/Users/{user['id']}", headers=headers, data=json.dumps(data))
-                    logger.debug(f"X-Request-Id: {response.headers.get('X-Request-Id','')}")
+                    response = settings.api_session.patch(f"{url}/v2/Users/{user['id']}", headers=headers, data=json.dumps(data))
+                    logger.debug("X-Request-Id: %s", response.headers.get('X-Request-Id',''))
                     if response.status_code != HTTPStatus.OK.value:
-                        logger.error(f"Error during PATCH request: {response.status_code}. Error message: {response.text}")
+                        logger.log(attempt_log_level(retries), "Error during PATCH request: %s. Error message: %s", response.status_code, LogBody(response.text))
                         if retries < MAX_RETRIES:
-                            logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                            logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                             time.sleep(RETRIES_DELAY_SEC * retries)
                             retries += 1
                         else:
-                            logger.error(f"Error ({response.status_code}) removing emails matching templates {','.join(templates)} from email contacts in _SCIM_ user {user['id']}: {response.text}")
+                            logger.error("Error (%s) removing emails matching templates %s from email contacts in _SCIM_ user %s: %s", response.status_code, ','.join(templates), user['id'], LogBody(response.text))
                             break
                     else:
                             logger.info(f"Emails matching templates {','.join(templates)} removed from email contacts in _SCIM_ user {user['id']}: {','.join(emails_to_remove)}")
@@ -1982,7 +3814,7 @@ def remove_contacts_in_scim_prompt(settings: "SettingParams"):
 
     if settings.skip_scim_api_call:
         console.print("[red]SCIM API is disabled. Operation cancelled.[/red]")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
 
     console.print(Panel(
@@ -2066,32 +3898,39 @@ def remove_contacts_in_scim_prompt(settings: "SettingParams"):
         else:
             remove_emails_matching_templates_in_scim(settings, target_templates, users_to_add, show_only = False, force_SCIM_call = False, all_users_flag = all_users_flag)
             console.print("[green]Emails matching templates deleted.[/green]")
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
 
     if break_flag:
         console.print("[yellow]Operation cancelled by user.[/yellow]")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
 
     
 
+def format_new_userName(userName: str, login_format: str) -> str:
+    """
+    New userName by format from NEW_LOGIN_DEFAULT_FORMAT_ARG: alias, domain and tld are replaced by parts of old userName
+    """
+    if "@" not in userName:
+        return userName
+    login = userName.split("@")[0]
+    domain = ".".join(userName.split("@")[1].split(".")[:-1])
+    tld = userName.split("@")[1].split(".")[-1]
+    return login_format.replace("alias", login).replace("domain", domain).replace("tld", tld)
+
 def create_SCIM_userName_file(settings: "SettingParams", onlyList = False):
 
     users = get_all_scim_users(settings)
 
     if users:
         if not onlyList:
-            with open(settings.users_file, "w", encoding="utf-8") as f:
+            file_name = output_path(settings, settings.users_file)
+            with open(file_name, "w", encoding="utf-8") as f:
                 f.write("uid;displayName;old_userName;new_userName\n")
                 for user in users:
-                    new_userName = user['userName']
-                    if "@" in user['userName']:
-                        login = user['userName'].split("@")[0]
-                        domain = ".".join(user['userName'].split("@")[1].split(".")[:-1])
-                        tld = user['userName'].split("@")[1].split(".")[-1]
-                        new_userName = settings.new_login_default_format.replace("alias", login).replace("domain", domain).replace("tld", tld)
+                    new_userName = format_new_userName(user['userName'], settings.new_login_default_format)
                     f.write(f"{user['id']};{user['displayName']};{user['userName']};{new_userName}\n")
-            logger.info(f"{len(users)} users downloaded to file {settings.users_file}")
+            logger.info(f"{len(users)} users downloaded to file {file_name}")
     else:
         logger.info("No users found from SCIM call. Check your settings.")
         return []
@@ -2117,7 +3956,7 @@ def update_users_from_SCIM_userName_file(settings: "SettingParams"):
                     logger.info(f"New userName for uid {uid} ({displayName}) is empty. Skipping.")   
                     continue
                 if old_userName == new_userName:
-                    logger.debug(f"User {old_userName} ({displayName}) has the same new name {new_userName}. Skipping.")
+                    logger.debug("User %s (%s) has the same new name %s. Skipping.", old_userName, displayName, new_userName)
                     continue
                 user_for_change.append(temp)
             except ValueError:
@@ -2129,13 +3968,13 @@ def update_users_from_SCIM_userName_file(settings: "SettingParams"):
     
     if not user_for_change:
         logger.error(f"File {settings.users_file} is empty.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     else:
         for user in user_for_change:
-            logger.debug(f"Will modify - {temp}.")
+            logger.debug("Will modify - %s.", temp)
 
-        if not Confirm.ask(f"[bold yellow]Modify userName SCIM attribute for {len(user_for_change)} users?[/bold yellow]"):
+        if not confirm_action(settings, f"[bold yellow]Modify userName SCIM attribute for {len(user_for_change)} users?[/bold yellow]"):
             console.print("[yellow]Operation cancelled.[/yellow]")
             return
         
@@ -2161,18 +4000,18 @@ def update_users_from_SCIM_userName_file(settings: "SettingParams"):
                                         ]
                                     }""".replace("alias@domain.tld", new_userName))
             
-            logger.debug(f"PATCH URL: {url}/v2/Users/{uid}")
-            logger.debug(f"PATCH DATA: {data}")
+            logger.debug("PATCH URL: %s/v2/Users/%s", url, uid)
+            logger.debug("PATCH DATA: %s", LogBody(data))
             while True:
                 if settings.dry_run:
                     logger.info(f"Dry run: Would change userName for user {old_userName} to {new_userName}")
                     break
-                response = requests.patch(f"{url}/v2/Users/{uid}", headers=headers, json=data)
-                logger.debug(f"X-Request-Id: {response.headers.get('X-Request-Id','')}")
+                response = settings.api_session.patch(f"{url}/v2/Users/{uid}", headers=headers, json=data)
+                logger.debug("X-Request-Id: %s", response.headers.get('X-Request-Id',''))
                 if response.status_code != HTTPStatus.OK.value:
-                    logger.error(f"Error during PATCH request: {response.status_code}. Error message: {response.text}")
+                    logger.log(attempt_log_level(retries), "Error during PATCH request: %s. Error message: %s", response.status_code, LogBody(response.text))
                     if retries < MAX_RETRIES:
-                        logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                        logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                         time.sleep(RETRIES_DELAY_SEC * retries)
                         retries += 1
                     else:
@@ -2226,7 +4065,7 @@ def show_user_attributes(settings: "SettingParams", answer: str):
     scim_users = get_all_scim_users(settings)  
     if not users:
         logger.error("No users found from API 360 calls. Check your settings.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     if not scim_users:
         if not settings.skip_scim_api_call:
@@ -2248,7 +4087,7 @@ def show_user_attributes(settings: "SettingParams", answer: str):
                 for user in scim_users:
                     if user['userName'].lower() == searched:
                         target_scim_user = user
-                        logger.debug(f"SCIM user found: {user['userName']} ({user['id']})")
+                        logger.debug("SCIM user found: %s (%s)", user['userName'], user['id'])
                         target_user = [user for user in users if user['id'] == target_scim_user['id']][0]
                         found_flag = True
                         break
@@ -2260,7 +4099,7 @@ def show_user_attributes(settings: "SettingParams", answer: str):
                 if len(searched.strip()) == 16 and searched.strip().startswith("113"):
                     for user in users:
                         if user['id'] == searched.strip():
-                            logger.debug(f"User found: {user['nickname']} ({user['id']})")
+                            logger.debug("User found: %s (%s)", user['nickname'], user['id'])
                             target_user = user
                             found_flag = True
                             break
@@ -2269,7 +4108,7 @@ def show_user_attributes(settings: "SettingParams", answer: str):
                 for user in users:
                     aliases_lower_case = [r.lower() for r in user['aliases']]
                     if user['nickname'].lower() == searched.lower().strip() or searched.lower().strip() in aliases_lower_case:
-                        logger.debug(f"User found: {user['nickname']} ({user['id']})")
+                        logger.debug("User found: %s (%s)", user['nickname'], user['id'])
                         target_user = user
                         found_flag = True
                         break
@@ -2277,7 +4116,7 @@ def show_user_attributes(settings: "SettingParams", answer: str):
                         found_last_name_user.append(user)
                 if not found_flag and found_last_name_user:
                     if len(found_last_name_user) == 1:
-                        logger.debug(f"User found ({searched}): {found_last_name_user[0]['nickname']} ({found_last_name_user[0]['id']}, {found_last_name_user[0]['position']})")
+                        logger.debug("User found (%s): %s (%s, %s)", searched, found_last_name_user[0]['nickname'], found_last_name_user[0]['id'], found_last_name_user[0]['position'])
                         target_user = found_last_name_user[0]
                         found_flag = True
                     else:
@@ -2290,6 +4129,7 @@ def show_user_attributes(settings: "SettingParams", answer: str):
 
         if not found_flag and not double_users_flag:
             logger.error(f"User {searched} not found in Y360 organization.")
+            log_fuzzy_candidates(settings, searched)
             continue
         else:
             users_to_add.append(target_user)
@@ -2370,7 +4210,17 @@ def show_user_attributes(settings: "SettingParams", answer: str):
             
             console.print(scim_table)
 
-        with open(f"{target_user['nickname']}.txt", "w", encoding="utf-8") as f:
+        file_name = export_file_path(settings, f"{target_user['nickname']}.txt")
+        if settings.export_format == "jsonl":
+            with open_export_sink(settings, f"{target_user['nickname']}.txt") as sink:
+                sink.write({"source": "api", "attributes": target_user})
+                if not settings.skip_scim_api_call:
+                    sink.write({"source": "scim", "attributes": target_scim_user})
+            console.print(f"[green]✅ User attributes saved to file: {file_name}[/green]")
+            logger.info(f"User attributes saved to file: {file_name}")
+            continue
+
+        with open_export_file(file_name) as f:
             f.write(f'API 360 attributes for user with id: {target_user["id"]}\n')
             f.write("--------------------------------------------------------\n")
             for k, v in target_user.items():
@@ -2434,8 +4284,8 @@ def show_user_attributes(settings: "SettingParams", answer: str):
                     else:
                         f.write(f"{k}: {v}\n")
                 f.write("--------------------------------------------------------\n")
-        console.print(f"[green]✅ User attributes saved to file: {target_user['nickname']}.txt[/green]")
-        logger.info(f"User attributes saved to file: {target_user['nickname']}.txt")
+        console.print(f"[green]✅ User attributes saved to file: {file_name}[/green]")
+        logger.info(f"User attributes saved to file: {file_name}")
     return
 
 def get_target_group_data_prompt(settings: "SettingParams", answer: str):
@@ -2551,8 +4401,14 @@ def save_group_data_prompt(settings: "SettingParams"):
         console.print(group_table)
         
         # Save to file
-        filename = f"group_{target_group['id']}.txt"
-        with open(filename, "w", encoding="utf-8") as f:
+        filename = export_file_path(settings, f"group_{target_group['id']}.txt")
+        if settings.export_format == "jsonl":
+            with open_export_sink(settings, f"group_{target_group['id']}.txt") as sink:
+                sink.write(target_group)
+            console.print(f"[green]✅ Group attributes saved to file: {filename}[/green]")
+            continue
+
+        with open_export_file(filename) as f:
             f.write(f'Group attributes for group with id: {target_group["id"]}\n')
             f.write("--------------------------------------------------------\n")
             
@@ -2628,7 +4484,6 @@ def show_mailing_list_permissions(settings: "SettingParams", input_group = {}):
             logger.error(f"Failed to get mailing list permissions for group {target_group['name']}")
             continue
 
-        shared_mailboxes = []
         need_load_shared_mailboxes = False
         if 'grants' in permissions and 'items' in permissions['grants']:
             for item in permissions['grants']['items']:
@@ -2638,12 +4493,9 @@ def show_mailing_list_permissions(settings: "SettingParams", input_group = {}):
                     if subject_type == 'shared_mailbox':
                         need_load_shared_mailboxes = True
                         break
-        if need_load_shared_mailboxes:
-            shared_mailboxes = get_all_shared_mailboxes(settings)   
-
         shared_mailboxes_dict = {}
-        for shared_mailbox in shared_mailboxes:
-            shared_mailboxes_dict[shared_mailbox['id']] = shared_mailbox           
+        if need_load_shared_mailboxes:
+            shared_mailboxes_dict = get_shared_mailboxes_index(settings).by_id
         
         # Display results using Rich components
         group_name = target_group.get('name', 'Unknown')
@@ -2705,30 +4557,30 @@ def show_mailing_list_permissions(settings: "SettingParams", input_group = {}):
         console.print(senders_table)
         
         # if not input_group:
-        #     console.input("[dim]Press Enter to continue...[/dim]")
+        #     wait_for_enter(settings)
 
         if input_group:
             break
     return
 
 def get_mailing_list_permissions(settings: "SettingParams", group_id: str):
-    """Get mailing list permissions for a group using cloud-api.yandex.net API"""
-    logger.debug(f"Getting mailing list permissions for group {group_id}...")
+    """Get mailing list permissions for a group using cloud-api.yandex.net API (DEFAULT_360_API_URL_V2)"""
+    logger.debug("Getting mailing list permissions for group %s...", group_id)
     
     # The API endpoint from the documentation
-    url = f"https://cloud-api.yandex.net/v1/admin/org/{settings.org_id}/mail-lists/{group_id}/permissions"
+    url = f"{DEFAULT_360_API_URL_V2}/{settings.org_id}/mail-lists/{group_id}/permissions"
     headers = {"Authorization": f"OAuth {settings.oauth_token}"}
     
     try:
         retries = 1
         while True:
-            logger.debug(f"GET url - {url}")
-            response = requests.get(url, headers=headers)
-            logger.debug(f"Yandex-Cloud-Request-ID: {response.headers.get('Yandex-Cloud-Request-ID', '')}")
+            logger.debug("GET url - %s", url)
+            response = settings.api_session.get(url, headers=headers)
+            logger.debug("Yandex-Cloud-Request-ID: %s", response.headers.get('Yandex-Cloud-Request-ID', ''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request for group {group_id}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during GET request for group %s: %s. Error message: %s", group_id, response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -2736,76 +4588,282 @@ def get_mailing_list_permissions(settings: "SettingParams", group_id: str):
                     return None
             else:
                 data = response.json()
-                logger.debug(f"Successfully retrieved mailing list permissions for group {group_id}")
-                logger.debug(f"url - GET {url}")
-                logger.debug(f"Raw JSON -  {data}")
+                logger.debug("Successfully retrieved mailing list permissions for group %s", group_id)
+                logger.debug("url - GET %s", url)
+                logger.debug("Raw JSON -  %s", LogBody(data))
                 return data
     except requests.exceptions.RequestException as e:
         logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
         return None
 
 def download_users_attrib_to_file(settings: "SettingParams"):
-    users = get_all_api360_users(settings, force=True)
-    scim_users = get_all_scim_users(settings)  
-    if not users:
+    if cache_is_fresh(settings.all_users, settings.all_users_get_timestamp, ALL_USERS_REFRESH_IN_MINUTES) and \
+        confirm_action(settings, f"[bold yellow]Use cached list of {len(settings.all_users)} API users (received at {settings.all_users_get_timestamp:%H:%M:%S})?[/bold yellow]", default=True):
+        api_pages = [settings.all_users]
+    else:
+        api_pages = iter_api360_users_pages(settings)
+    if not export_users_pages(settings, api_pages, 'api_users.csv', API_USERS_EXPORT_COLUMNS, "API users"):
         logger.error("No users found from API 360 calls.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
+        return
+
+    if settings.skip_scim_api_call:
+        logger.info("No SCIM config found. Skip getting all users of the organisation from SCIM action.")
+        wait_for_enter(settings)
         return
+
+    if cache_is_fresh(settings.all_scim_users, settings.all_scim_users_get_timestamp, ALL_SCIM_USERS_REFRESH_IN_MINUTES) and \
+        confirm_action(settings, f"[bold yellow]Use cached list of {len(settings.all_scim_users)} SCIM users (received at {settings.all_scim_users_get_timestamp:%H:%M:%S})?[/bold yellow]", default=True):
+        scim_pages = [settings.all_scim_users]
     else:
-        with open('api_users.csv', 'w', encoding='utf-8', newline='') as csv_file:
-            fieldnames = list(users[0].keys())
-            if "isEnabledUpdatedAt" not in fieldnames:
-                fieldnames.append("isEnabledUpdatedAt")
-            writer = csv.DictWriter(csv_file, delimiter=';', fieldnames=fieldnames)
-            writer.writeheader()
-            for user in users:
-                writer.writerow(user)
-            logger.info(f"Saved {len(users)} API users to api_users.csv")
-    if not scim_users:
+        scim_pages = iter_scim_users_pages(settings)
+    if not export_users_pages(settings, scim_pages, 'scim_users.csv', SCIM_USERS_EXPORT_COLUMNS, "SCIM users"):
         logger.error("No users found from SCIM calls.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
-    else:
-        with open('scim_users.csv', 'w', encoding='utf-8', newline='') as csv_file:
-            fieldnames = scim_users[0].keys()
-            writer = csv.DictWriter(csv_file, delimiter=';', fieldnames=fieldnames)
-            writer.writeheader()
-            for user in scim_users:
-                writer.writerow(user)
-            logger.info(f"Saved {len(scim_users)} SCIM users to scim_users.csv")
 
-    console.input("[dim]Press Enter to continue...[/dim]")
+    wait_for_enter(settings)
+
+def cache_is_fresh(items: list, timestamp: datetime, refresh_in_minutes: int):
+    return bool(items) and (datetime.now() - timestamp).total_seconds() <= refresh_in_minutes * 60
+
+def export_users_pages(settings: "SettingParams", pages, file_name: str, columns: list, title: str):
+    """
+    Write users to export file page by page as they are received (CSV columns are flattened nested fields).
+    Returns number of written users (0 if nothing was received or receiving failed).
+    """
+    with open_export_sink(settings, file_name, columns) as sink:
+        for page in pages:
+            if page is None:
+                logger.error(f"Receiving {title} failed. File {sink.path} is incomplete ({sink.count} records saved).")
+                return 0
+            for user in page:
+                sink.write(user)
+            sink.flush()
+            logger.debug("Saved %s %s to %s...", sink.count, title, sink.path)
+    if sink.count:
+        logger.info(f"Saved {sink.count} {title} to {sink.path}")
+    return sink.count
+
+def open_job_journal(settings: "SettingParams", output_file: str, job_name: str):
+    """
+    Open journal of long-running export. If unfinished journal of the same job exists,
+    ask whether to resume from it or start from scratch.
+    """
+    journal = JobJournal(output_path(settings, output_file) + JOB_JOURNAL_SUFFIX, job_name)
+    journal.load()
+    if journal.done:
+        if confirm_action(settings, f"[bold yellow]Found unfinished job '{job_name}' ({len(journal.done)} users already processed, journal {journal.path}). Resume?[/bold yellow]", default=True):
+            logger.info(f"Resuming job '{job_name}' from journal {journal.path} ({len(journal.done)} users already processed).")
+        else:
+            journal.done = {}
+            journal.remove()
+    journal.start()
+    return journal
+
+class JobJournal:
+    """
+    Append-only journal (JSON Lines) of completed uids and their results.
+    Every record is flushed to disk immediately, so the job can be resumed after interruption.
+    """
+    def __init__(self, path: str, job_name: str):
+        self.path = path
+        self.job_name = job_name
+        self.done = {}
+        self._file = None
+
+    def load(self):
+        self.done = {}
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get('job') != self.job_name:
+                    logger.warning(f"Journal {self.path} belongs to another job ({header.get('job')}). Ignore it.")
+                    return
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # последняя строка могла быть записана не полностью при прерывании
+                        continue
+                    self.done[record['uid']] = record['result']
+        except Exception as e:
+            logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
+            self.done = {}
+
+    def start(self):
+        # журнал переписывается целиком, чтобы отбросить недописанную при прерывании строку
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(json.dumps({"job": self.job_name, "started": datetime.now().isoformat()}) + "\n")
+        for uid, result in self.done.items():
+            self._file.write(json.dumps({"uid": uid, "result": result}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def record(self, uid: str, result):
+        self.done[uid] = result
+        self._file.write(json.dumps({"uid": uid, "result": result}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Delete journal after the job is completed."""
+        self.close()
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+def output_path(settings: "SettingParams", file_name: str) -> str:
+    """
+    Path of output file: relative names are placed into OUTPUT_DIR (if set)
+    """
+    if settings.output_dir and not os.path.isabs(file_name):
+        return os.path.join(settings.output_dir, file_name)
+    return file_name
+
+def run_file_path(cli_value: str, env_value: str, output_dir: str) -> str:
+    """
+    Path of file written at the end of run (metrics, trace): command line value is used as given,
+    relative name from .env is placed into OUTPUT_DIR
+    """
+    if cli_value:
+        return cli_value
+    if env_value and output_dir and not os.path.isabs(env_value):
+        return os.path.join(output_dir, env_value)
+    return env_value
+
+def export_file_path(settings: "SettingParams", file_name: str) -> str:
+    """
+    Real name of export file in OUTPUT_DIR: extension is changed to .jsonl for JSONL format, .gz is added for compression
+    """
+    file_name = output_path(settings, file_name)
+    if settings.export_format == "jsonl":
+        file_name = os.path.splitext(file_name)[0] + ".jsonl"
+    if settings.export_compress:
+        file_name += ".gz"
+    return file_name
+
+def open_export_file(file_name: str):
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "wt", encoding="utf-8", newline="")
+    return open(file_name, "w", encoding="utf-8", newline="")
+
+def open_export_sink(settings: "SettingParams", file_name: str, columns: list = None):
+    return ExportSink(export_file_path(settings, file_name), settings.export_format, columns)
+
+class ExportSink:
+    """
+    Export file writer. CSV: one row per record with given columns (nested fields are flattened).
+    JSONL: full nested record per line. Files ending with .gz are gzip-compressed.
+    """
+    def __init__(self, path: str, export_format: str, columns: list = None):
+        self.path = path
+        self.format = export_format
+        self.columns = columns
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        self._file = open_export_file(self.path)
+        if self.format == "csv" and self.columns:
+            self._writer = csv.DictWriter(self._file, delimiter=';', fieldnames=self.columns, restval="", extrasaction='ignore', lineterminator='\n')
+            self._writer.writeheader()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+        return False
+
+    def write(self, record: dict, csv_row: dict = None):
+        """Write record; csv_row overrides flattened record in CSV format."""
+        if self.format == "jsonl":
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        else:
+            self._writer.writerow(csv_row if csv_row is not None else flatten_export_record(record))
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+def flatten_export_record(record: dict, prefix: str = "") -> dict:
+    """
+    Flatten nested dicts into 'parent.child' keys, lists are joined into a single value.
+    """
+    result = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            result.update(flatten_export_record(value, f"{prefix}{key}."))
+        else:
+            result[f"{prefix}{key}"] = flatten_export_value(value)
+    return result
+
+def flatten_export_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return EXPORT_LIST_SEPARATOR.join(flatten_export_list_item(item) for item in value)
+    return value
+
+def flatten_export_list_item(item) -> str:
+    if not isinstance(item, dict):
+        return str(item)
+    # contacts/emails/phoneNumbers - "type:value", aliases in SCIM - login, groups - id
+    if 'value' in item:
+        return f"{item['type']}:{item['value']}" if item.get('type') else str(item['value'])
+    if 'login' in item:
+        return str(item['login'])
+    if 'id' in item:
+        return str(item['id'])
+    return json.dumps(item, ensure_ascii=False)
 
 def default_email_create_file(settings: "SettingParams"):
     users = get_all_api360_users(settings)
     if not users:
         logger.error("No users found from API 360 calls.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     else:
         email_dict = {}
         nickname_dict = {}
+        journal = open_job_journal(settings, settings.default_email_output_file, "default_email")
         with console.status(f"[bold green]Downloading default emails for {len(users)} users...", spinner="dots"):
         #logger.info(f"Downloading default emails for {len(users)} users...")
             count = 0
             total = len(users)
             for user in users:
                 if user['id'].startswith("113"):
-                    default_email_json = get_default_email(settings, user['id'])
+                    if user['id'] in journal.done:
+                        default_email_json = journal.done[user['id']]
+                    else:
+                        default_email_json = get_default_email(settings, user['id'])
+                        if default_email_json:
+                            journal.record(user['id'], default_email_json)
                     count += 1
                     if divmod(count, 50)[1] == 0:
                         logger.info(f"Got default email for {count} of {total} users.")
                     email_dict[user['id']] = default_email_json
                     nickname_dict[user['id']] = user['nickname']
 
-        with open(settings.default_email_output_file, "w", encoding="utf-8") as f:
-            f.write("nickname;new_DefaultEmail;new_DisplayName;old_DefaultEmail;old_DisplayName;uid\n")
+        with open_export_sink(settings, settings.default_email_output_file, DEFAULT_EMAIL_EXPORT_COLUMNS) as sink:
             for key in email_dict.keys():
                 email_data = email_dict[key]
                 if email_data:
-                    f.write(f"{nickname_dict[key]};{email_data['defaultFrom']};{email_data['fromName']};{email_data['defaultFrom']};{email_data['fromName']};{key}\n")
-            logger.info(f"Default emails downloaded to {settings.default_email_output_file} file.")
-            console.input("[dim]Press Enter to continue...[/dim]")
+                    sink.write({
+                        "nickname": nickname_dict[key],
+                        "new_DefaultEmail": email_data['defaultFrom'],
+                        "new_DisplayName": email_data['fromName'],
+                        "old_DefaultEmail": email_data['defaultFrom'],
+                        "old_DisplayName": email_data['fromName'],
+                        "uid": key,
+                    })
+            logger.info(f"Default emails downloaded to {sink.path} file.")
+            journal.remove()
+            wait_for_enter(settings)
 
 def default_email_update_from_file(settings: "SettingParams"):
     all_users = []
@@ -2827,7 +4885,7 @@ def default_email_update_from_file(settings: "SettingParams"):
         exit_flag = True
 
     if exit_flag:
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
 
     if "@" in all_users[0] and ";" not in all_users[0]:
@@ -2850,7 +4908,7 @@ def default_email_update_from_file(settings: "SettingParams"):
             exit_flag = True
         
     if exit_flag:
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
 
     exit_flag = False
@@ -2909,95 +4967,189 @@ def default_email_update_from_file(settings: "SettingParams"):
 
     if exit_flag:
         logger.error("There are must be column 'nickname' in input file ('default_email_data.csv').")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
     if not normalized_users:
         logger.info("List of modified users is empty. File must contains column 'nickname' and actual data in 'new_DefaultEmail' or 'new_DisplayName' columns.")
-        console.input("[dim]Press Enter to continue...[/dim]")
-        return
-    
-    if not Confirm.ask(f"[bold yellow]Modify personal email data for {len(normalized_users)} users?[/bold yellow]"):
-        console.print("[yellow]Operation cancelled.[/yellow]")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
     api_users = get_all_api360_users(settings)
     if not api_users:
         logger.error("No users found from API 360 calls.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
-    
-    url = f"{DEFAULT_360_API_URL}/admin/v1/org/{settings.org_id}/mail/users" 
-    headers = {"Authorization": f"OAuth {settings.oauth_token}"}
+
+    with console.status(f"[bold green]Getting current email config for {len(normalized_users)} users...", spinner="dots"):
+        changes, stats = plan_default_email_changes(settings, normalized_users, api_users)
+
+    show_default_email_plan(changes, stats)
+
+    if not changes:
+        console.print("[bold green]✅ Nothing to change.[/bold green]")
+        wait_for_enter(settings)
+        return
+
+    if not confirm_action(settings, f"[bold yellow]Modify personal email data for {len(changes)} users?[/bold yellow]"):
+        console.print("[yellow]Operation cancelled.[/yellow]")
+        wait_for_enter(settings)
+        return
+
+    with console.status(f"[bold green]Changing email config for {len(changes)} users...", spinner="dots"):
+        results = run_in_parallel(settings, lambda change: apply_default_email_change(settings, change), changes)
+
+    success_count = sum(1 for result in results if result)
+    console.print(f"[bold green]✅ Email config changed for {success_count} users.[/bold green]")
+    if success_count < len(changes):
+        console.print(f"[bold red]❌ Failed to change email config for {len(changes) - success_count} users.[/bold red]")
+
+    wait_for_enter(settings)
+
+def build_default_email_uid_map(api_users: list):
+    """
+    Map nickname and aliases of mailbox users (id starts with 113) to uid. The first user in list wins.
+    """
+    uid_map = {}
+    for api_user in api_users:
+        if not api_user['id'].startswith("113"):
+            continue
+        uid_map.setdefault(api_user['nickname'], api_user['id'])
+        for alias in api_user.get('aliases', []):
+            uid_map.setdefault(alias, api_user['id'])
+    return uid_map
+
+def plan_default_email_changes(settings: "SettingParams", normalized_users: list, api_users: list):
+    """
+    Resolve users from input file, prefetch their sender_info concurrently and compute changes.
+    Returns list of changes and dict with counters.
+    """
+    stats = {"not_found": 0, "failed": 0, "unchanged": 0, "name": 0, "address": 0, "both": 0}
+    uid_map = build_default_email_uid_map(api_users)
+
+    targets = []
     for user in normalized_users:
         if "@" in user['nickname']:
             alias = user['nickname'].strip().split("@")[0]
         else:
             alias = user['nickname'].strip()
-        uid = ""
-        for api_user in api_users:
-            if api_user['nickname'] == alias:
-                if api_user['id'].startswith("113"):
-                    uid = api_user['id']
-                    break
-            else:
-                if alias in api_user['aliases']:
-                    if api_user['id'].startswith("113"):
-                        uid = api_user['id']
-                        break
-
+        uid = uid_map.get(alias, "")
         if not uid:
             logger.error(f"User with nickname {alias} not found in API 360 calls.")
+            stats["not_found"] += 1
             continue
+        targets.append((user, alias, uid))
 
-        try:
-            retries = 1
-            data = get_default_email(settings, uid)
-            if not data:
-                logger.error(f"Can not get email config for user {uid} with alias {alias}.")
-                continue
-            change_name = False
-            change_mail = False
-            if user['new_DisplayName'].strip(): 
-                if data['fromName'] != user['new_DisplayName'].strip():
-                    change_name = True
-            if user['new_DefaultEmail'].strip(): 
-                if data['defaultFrom'].lower() != user['new_DefaultEmail'].strip().lower():
-                    change_mail = True 
-            if not (change_name or change_mail):
-                logger.info(f"Skipping to change email configuration for user {uid} with alias {alias} - nothing to change...")
-                continue   
-            else:
-                logger.info(f"Changing user {uid} with alias {alias}: {data['fromName']} ({data['defaultFrom']}) to {user['new_DisplayName']} ({user['new_DefaultEmail']})...")
-            if change_name:
-                data['fromName'] = user['new_DisplayName'].strip()
-            if change_mail:
-                data['defaultFrom'] = user['new_DefaultEmail'].strip()
-            logger.debug(f"POST URL: {url}/{uid}/settings/sender_info")
-            logger.debug(f"POST DATA: {data}")
-            while True:
-                if settings.dry_run:
-                    logger.info(f"Dry run: Would change email configuration for user {uid} with alias {alias} to {user['new_DisplayName']} ({user['new_DefaultEmail']})")
-                    break
-                response = requests.post(f"{url}/{uid}/settings/sender_info", headers=headers, json=data)
-                logger.debug(f"x-request-id: {response.headers.get('X-Request-Id','')}")
-                if response.status_code != HTTPStatus.OK.value:
-                    logger.error(f"Error during POST request: {response.status_code}. Error message: {response.text}")
-                    if retries < MAX_RETRIES:
-                        logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
-                        time.sleep(RETRIES_DELAY_SEC * retries)
-                        retries += 1
-                    else:
-                        logger.error(f"Error. Patching email data for user {uid} ({alias}) failed.")
-                        break
-                else:
-                    logger.info(f"Success - email data for user {uid} ({alias}) changed successfully.")
-                    break
-        except Exception as e:
-            logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
+    sender_infos = run_in_parallel(settings, lambda target: get_default_email(settings, target[2]), targets)
 
-    console.input("[dim]Press Enter to continue...[/dim]")
+    changes = []
+    for (user, alias, uid), data in zip(targets, sender_infos):
+        if not data:
+            logger.error(f"Can not get email config for user {uid} with alias {alias}.")
+            stats["failed"] += 1
+            continue
+        old_name = data.get('fromName')
+        old_email = data.get('defaultFrom')
+        if old_name is None or old_email is None:
+            logger.error(f"Email config of user {uid} with alias {alias} has no fromName or defaultFrom: {data}")
+            stats["failed"] += 1
+            continue
+        change_name = False
+        change_mail = False
+        if user['new_DisplayName'].strip():
+            if old_name != user['new_DisplayName'].strip():
+                change_name = True
+        if user['new_DefaultEmail'].strip():
+            if old_email.lower() != user['new_DefaultEmail'].strip().lower():
+                change_mail = True
+        if not (change_name or change_mail):
+            logger.info(f"Skipping to change email configuration for user {uid} with alias {alias} - nothing to change...")
+            stats["unchanged"] += 1
+            continue
+        if change_name and change_mail:
+            stats["both"] += 1
+        elif change_name:
+            stats["name"] += 1
+        else:
+            stats["address"] += 1
+
+        new_data = dict(data)
+        if change_name:
+            new_data['fromName'] = user['new_DisplayName'].strip()
+        if change_mail:
+            new_data['defaultFrom'] = user['new_DefaultEmail'].strip()
+        changes.append({
+            "uid": uid,
+            "alias": alias,
+            "old_name": old_name,
+            "old_email": old_email,
+            "new_name": new_data['fromName'],
+            "new_email": new_data['defaultFrom'],
+            "data": new_data,
+        })
+    return changes, stats
+
+def show_default_email_plan(changes: list, stats: dict, max_rows: int = 20):
+    summary_table = Table(title="Default email changes", show_header=False, box=box.SIMPLE)
+    summary_table.add_column("Category", style="cyan")
+    summary_table.add_column("Count", style="green", justify="right")
+    summary_table.add_row("Unchanged", str(stats["unchanged"]))
+    summary_table.add_row("Changed name", str(stats["name"]))
+    summary_table.add_row("Changed address", str(stats["address"]))
+    summary_table.add_row("Changed name and address", str(stats["both"]))
+    if stats["not_found"]:
+        summary_table.add_row("[red]Not found[/red]", f"[red]{stats['not_found']}[/red]")
+    if stats["failed"]:
+        summary_table.add_row("[red]Failed to get config[/red]", f"[red]{stats['failed']}[/red]")
+    console.print(summary_table)
+
+    if not changes:
+        return
+    changes_table = Table(box=box.SIMPLE)
+    changes_table.add_column("Alias", style="cyan")
+    changes_table.add_column("Old", style="yellow")
+    changes_table.add_column("New", style="green")
+    for change in changes[:max_rows]:
+        changes_table.add_row(
+            change['alias'],
+            f"{change['old_name']} ({change['old_email']})",
+            f"{change['new_name']} ({change['new_email']})",
+        )
+    console.print(changes_table)
+    if len(changes) > max_rows:
+        console.print(f"[dim]... and {len(changes) - max_rows} more.[/dim]")
+
+def apply_default_email_change(settings: "SettingParams", change: dict):
+    uid = change['uid']
+    alias = change['alias']
+    url = f"{DEFAULT_360_API_URL}/admin/v1/org/{settings.org_id}/mail/users/{uid}/settings/sender_info"
+    headers = {"Authorization": f"OAuth {settings.oauth_token}"}
+    logger.info(f"Changing user {uid} with alias {alias}: {change['old_name']} ({change['old_email']}) to {change['new_name']} ({change['new_email']})...")
+    logger.debug("POST URL: %s", url)
+    logger.debug("POST DATA: %s", LogBody(change['data']))
+    if settings.dry_run:
+        logger.info(f"Dry run: Would change email configuration for user {uid} with alias {alias} to {change['new_name']} ({change['new_email']})")
+        return True
+    try:
+        retries = 1
+        while True:
+            response = settings.api_session.post(url, headers=headers, json=change['data'])
+            logger.debug("x-request-id: %s", response.headers.get('X-Request-Id',''))
+            if response.status_code != HTTPStatus.OK.value:
+                logger.log(attempt_log_level(retries), "Error during POST request: %s. Error message: %s", response.status_code, LogBody(response.text))
+                if retries < MAX_RETRIES:
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    time.sleep(RETRIES_DELAY_SEC * retries)
+                    retries += 1
+                else:
+                    logger.error(f"Error. Patching email data for user {uid} ({alias}) failed.")
+                    return False
+            else:
+                logger.info(f"Success - email data for user {uid} ({alias}) changed successfully.")
+                return True
+    except Exception as e:
+        logger.error(f"{type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}")
+        return False
 
 def send_perm_set_target_group(settings: "SettingParams"):
     console.print(Panel(
@@ -3022,11 +5174,11 @@ def send_perm_set_target_group(settings: "SettingParams"):
         elif str(target_group['emailId']) == "0":
             console.print(f"[bold red]❌ Group with alias {answer} is not mail enabled.[/bold red]")
             settings.target_group = {}
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
             continue
         else:
             console.print(f"[bold green]✅ Target group set: {target_group['name']} ({target_group['id']}, {target_group['emailId']})[/bold green]")
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
             break
     return
 
@@ -3034,7 +5186,7 @@ def send_perm_add_users_to_allow_list_prompt(settings: "SettingParams"):
 
     if not settings.target_group:
         logger.error("No target group set. Exiting.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
     while True:
@@ -3052,14 +5204,14 @@ def send_perm_add_users_to_allow_list_prompt(settings: "SettingParams"):
 
         if send_perm_call_api(settings, users_to_add, "ADD_USER", []):
             show_mailing_list_permissions(settings, settings.target_group)
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
             break
 
 def send_perm_remove_users_from_allow_list(settings: "SettingParams"):
 
     if not settings.target_group:
         logger.error("No target group set. Exiting.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
     while True:
@@ -3076,14 +5228,14 @@ def send_perm_remove_users_from_allow_list(settings: "SettingParams"):
 
         if send_perm_call_api(settings, users_to_remove, "REMOVE_USER", []):
             show_mailing_list_permissions(settings, settings.target_group)
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
             break
         
 def send_perm_grand_all_users(settings: "SettingParams"):
 
     if not settings.target_group:
         logger.error("No target group set. Exiting.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
     show_mailing_list_permissions(settings, settings.target_group)
@@ -3091,12 +5243,63 @@ def send_perm_grand_all_users(settings: "SettingParams"):
     if Confirm.ask("[bold yellow]⚠️  Need confirmation for setting grand all permission?[/bold yellow]"):
         if send_perm_call_api(settings, None, "SET_DEFAULT", []):
             show_mailing_list_permissions(settings, settings.target_group)
-            console.input("[dim]Press Enter to continue...[/dim]")
+            wait_for_enter(settings)
     else:
         console.print("[red]❌ Execution canceled.[/red]")
 
     return
 
+def send_perm_update_from_settings(settings: "SettingParams"):
+    """
+    Change send permissions of group without prompts (send-permissions subcommand and jobs):
+    add and remove users of allow list or allow all users to send to group.
+    """
+    if not settings.send_perm_group:
+        logger.error("Group is not set. Use --group.")
+        return False
+    if not (settings.send_perm_add_users or settings.send_perm_remove_users or settings.send_perm_grant_all):
+        logger.error("Nothing to change. Use --add, --remove or --grant-all.")
+        return False
+    if settings.send_perm_grant_all and (settings.send_perm_add_users or settings.send_perm_remove_users):
+        logger.error("--grant-all can not be used together with --add or --remove.")
+        return False
+
+    target_group, groups = get_target_group_data_prompt(settings, settings.send_perm_group)
+    if not target_group:
+        return False
+    if str(target_group['emailId']) == "0":
+        logger.error(f"Group {target_group['name']} is not mail enabled.")
+        settings.target_group = {}
+        return False
+
+    changes = []
+    if settings.send_perm_grant_all:
+        changes.append(("SET_DEFAULT", None))
+    for mode, answer in (("ADD_USER", settings.send_perm_add_users), ("REMOVE_USER", settings.send_perm_remove_users)):
+        if not answer:
+            continue
+        break_flag, double_users_flag, users, all_users_flag = find_users(settings, answer)
+        if all_users_flag:
+            logger.error("'*' is not supported here. Use --grant-all to allow all users.")
+            return False
+        searched_count = len([searched for searched in re.split(r'[;,\s]+', answer) if searched.strip()])
+        # ничего не меняем, если хотя бы один пользователь не найден однозначно
+        if break_flag or double_users_flag or len(users) != searched_count:
+            logger.error(f"Not all users from '{answer}' found. Send permissions of group {target_group['name']} are not changed.")
+            return False
+        changes.append((mode, users))
+
+    descriptions = {"SET_DEFAULT": "allow all users", "ADD_USER": "add to allow list", "REMOVE_USER": "remove from allow list"}
+    summary = "; ".join(descriptions[mode] + (f" {', '.join(user['nickname'] for user in users)}" if users else "") for mode, users in changes)
+    if not confirm_action(settings, f"[bold yellow]Change send permissions of group {target_group['name']}: {summary}?[/bold yellow]"):
+        return False
+
+    result = True
+    for mode, users in changes:
+        if not send_perm_call_api(settings, users, mode, []):
+            result = False
+    return result
+
 def get_shared_mailbox_detail(settings: "SettingParams"):
      
     shared_mailboxes = []    
@@ -3126,11 +5329,11 @@ def send_perm_shared_mailbox(settings: "SettingParams"):
 
     if not settings.target_group:
         logger.error("No target group set. Exiting.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
-    shared_mailboxes = get_all_shared_mailboxes(settings)
-    if not shared_mailboxes:
+    shared_mailboxes_index = get_shared_mailboxes_index(settings)
+    if not shared_mailboxes_index.source:
         logger.info("List of shared mailboxes is empty.")
         return
     
@@ -3170,39 +5373,29 @@ def send_perm_shared_mailbox(settings: "SettingParams"):
                 op = "ADD_SHARED_MAILBOX"
                 temp = search_mailbox
 
-            found_mailbox = False
             if "@" in temp:
-                for shared_mailbox in shared_mailboxes:
-                    if shared_mailbox['email'] == temp:
-                        found_mailbox = True
-                        logger.info(f"Shared mailbox with name {temp} found:")
-                        logger.info(f" - name{shared_mailbox['name']}, email {shared_mailbox['email']}, description {shared_mailbox['description']}")
-                        logger.info("Adding to list of permissions.")
-                        data_to_add.append({"op":op,"mailbox":shared_mailbox})
-                        break
-                if not found_mailbox:
+                shared_mailbox = shared_mailboxes_index.find_by_email(temp)
+                if shared_mailbox:
+                    logger.info(f"Shared mailbox with name {temp} found:")
+                    logger.info(f" - name{shared_mailbox['name']}, email {shared_mailbox['email']}, description {shared_mailbox['description']}")
+                    logger.info("Adding to list of permissions.")
+                    data_to_add.append({"op":op,"mailbox":shared_mailbox})
+                else:
                     logger.error(f"Shared mailbox {temp} not found. Skip adding to list of permissions.")
                     continue
             else:
-                found_in_name_count = 0
-                found_in_name_list = []
-                for shared_mailbox in shared_mailboxes:
-                    if temp.lower() == shared_mailbox['email'].lower().split("@")[0]:
-                        found_mailbox = True
-                        data_to_add.append({"op":op,"mailbox":shared_mailbox})
-                        break
-                if not found_mailbox:
-                    for shared_mailbox in shared_mailboxes:
-                        if temp.lower() in shared_mailbox['name'].lower():
-                            found_in_name_count += 1
-                            found_in_name_list.append(shared_mailbox)
-                    if found_in_name_count > 1:
+                shared_mailbox = shared_mailboxes_index.find_by_local_part(temp)
+                if shared_mailbox:
+                    data_to_add.append({"op":op,"mailbox":shared_mailbox})
+                else:
+                    found_in_name_list = shared_mailboxes_index.find_by_name(temp)
+                    if len(found_in_name_list) > 1:
                         logger.error(f"Found more than one shared mailbox with name {temp}:")
                         for info in found_in_name_list:
                             logger.error(f" - name {info['name']}, email {info['email']}, description {info['description']}")
                         logger.error("Skip adding to list of permissions shared mailbox with name {temp}.")
                         continue
-                    elif found_in_name_count == 1:
+                    elif len(found_in_name_list) == 1:
                         data_to_add.append({"op":op,"mailbox":found_in_name_list[0]})
                         logger.info(f"Shared mailbox with name {temp} found:")
                         logger.info(f" - name{found_in_name_list[0]['name']}, email {found_in_name_list[0]['email']}, description {found_in_name_list[0]['description']}")
@@ -3355,18 +5548,19 @@ def send_perm_call_api(settings: "SettingParams", users_to_change, mode, shared_
         return return_value
     try:
         retries = 1
-        logger.debug(f"POST url: {url}")
-        logger.debug(f"Raw POST JSON: {json.dumps(data)})")
+        logger.debug("POST url: %s", url)
+        logger.debug("Raw POST JSON: %s)", LogBody(data))
         while True:
             if settings.dry_run:
                 logger.info(f"Dry run: Would change send permissions for group {settings.target_group['name']} ({settings.target_group['id']}, {settings.target_group['emailId']})")
+                return_value = True
                 break
-            response = requests.post(url, headers=headers, json=data)
-            logger.debug(f"Yandex-Cloud-Request-ID: {response.headers.get('Yandex-Cloud-Request-ID', '')}")
+            response = settings.api_session.post(url, headers=headers, json=data)
+            logger.debug("Yandex-Cloud-Request-ID: %s", response.headers.get('Yandex-Cloud-Request-ID', ''))
             if not (response.status_code == 200 or response.status_code == 204):
-                logger.error(f"Error during POST request: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during POST request: %s. Error message: %s", response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -3395,14 +5589,14 @@ def get_shared_mailboxes_from_api(settings: "SettingParams"):
         params['page'] = 1
         retries = 0
         while True: 
-            logger.debug(f"GET url: {url}")
-            logger.debug(f"GET Params: {params}")
-            response = requests.get(url, headers=headers, params=params)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            logger.debug("GET url: %s", url)
+            logger.debug("GET Params: %s", params)
+            response = settings.api_session.get(url, headers=headers, params=params)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during GET request: %s. Error message: %s", response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -3427,7 +5621,7 @@ def get_shared_mailboxes_from_api(settings: "SettingParams"):
     return True, shared_list
 
 def get_shared_mailbox_details_from_api(settings: "SettingParams", shared_mailbox_id: str):
-    logger.debug(f"Get shared mailbox details from API (id - {shared_mailbox_id}).")
+    logger.debug("Get shared mailbox details from API (id - %s).", shared_mailbox_id)
     url = f"{DEFAULT_360_API_URL}/admin/v1/org/{settings.org_id}/mailboxes/shared/{shared_mailbox_id}"
     headers = {
         "Authorization": f"OAuth {settings.oauth_token}",
@@ -3435,13 +5629,13 @@ def get_shared_mailbox_details_from_api(settings: "SettingParams", shared_mailbo
     try:
         retries = 0
         while True: 
-            logger.debug(f"GET url: {url}")
-            response = requests.get(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            logger.debug("GET url: %s", url)
+            response = settings.api_session.get(url, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.debug(f"Error during GET request: {response.status_code}. Error message: {response.text}")
+                logger.debug("Error during GET request: %s. Error message: %s", response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -3533,7 +5727,7 @@ def forward_rules_show_for_user(settings: "SettingParams", user):
     console.print(user_panel)
     console.print(forward_table)
     console.print(autoreply_table)
-    console.input("[dim]Press Enter to continue...[/dim]")
+    wait_for_enter(settings)
 
 def forward_rules_clear_for_user(settings: "SettingParams"):
     logger.info("Clear forward and autoreply rules for users.")
@@ -3554,14 +5748,21 @@ def forward_rules_clear_for_user(settings: "SettingParams"):
             get_and_clear_forward_rules_by_userid(settings, user)
 
 def  find_users_prompt(settings: "SettingParams"):
-    break_flag = False
-    double_users_flag = False
-    users_to_add = []
-    all_users_flag = False
     answer = Prompt.ask(
         "[bold yellow]Enter users aliases or uid or last name, separated by comma or space (* - all users)[/bold yellow]",
         default=""
     )
+    return find_users(settings, answer)
+
+def find_users(settings: "SettingParams", answer: str):
+    """
+    Find users by aliases, uids or last names separated by comma or space (* - all users).
+    Returns break_flag, double_users_flag, found users and all_users_flag.
+    """
+    break_flag = False
+    double_users_flag = False
+    users_to_add = []
+    all_users_flag = False
     if not answer.strip():
         break_flag = True
     else:
@@ -3581,6 +5782,8 @@ def  find_users_prompt(settings: "SettingParams"):
         #anti_rus_pattern = r'[^\u0400-\u04FF\s]'
 
         for searched in search_users:
+            if not searched.strip():
+                continue
             if "@" in searched.strip():
                 searched = searched.split("@")[0]
             found_flag = False
@@ -3588,7 +5791,7 @@ def  find_users_prompt(settings: "SettingParams"):
                 if len(searched.strip()) == 16 and searched.strip().startswith("113"):
                     for user in users:
                         if user['id'] == searched.strip():
-                            logger.debug(f"User found: {user['nickname']} ({user['id']})")
+                            logger.debug("User found: %s (%s)", user['nickname'], user['id'])
                             users_to_add.append(user)
                             found_flag = True
                             break
@@ -3598,7 +5801,7 @@ def  find_users_prompt(settings: "SettingParams"):
                 for user in users:
                     aliases_lower_case = [r.lower() for r in user['aliases']]
                     if user['nickname'].lower() == searched.lower().strip() or searched.lower().strip() in aliases_lower_case:
-                        logger.debug(f"User found: {user['nickname']} ({user['id']})")
+                        logger.debug("User found: %s (%s)", user['nickname'], user['id'])
                         users_to_add.append(user)
                         found_flag = True
                         break
@@ -3606,7 +5809,7 @@ def  find_users_prompt(settings: "SettingParams"):
                         found_last_name_user.append(user)
                 if not found_flag and found_last_name_user:
                     if len(found_last_name_user) == 1:
-                        logger.debug(f"User found ({searched}): {found_last_name_user[0]['nickname']} ({found_last_name_user[0]['id']}, {found_last_name_user[0]['position']})")
+                        logger.debug("User found (%s): %s (%s, %s)", searched, found_last_name_user[0]['nickname'], found_last_name_user[0]['id'], found_last_name_user[0]['position'])
                         users_to_add.append(found_last_name_user[0])
                         found_flag = True
                     else:
@@ -3619,24 +5822,25 @@ def  find_users_prompt(settings: "SettingParams"):
 
             if not found_flag:
                 logger.error(f"User {searched} not found in Y360 organization.")
+                log_fuzzy_candidates(settings, searched)
 
     return break_flag, double_users_flag, users_to_add, all_users_flag
 
 def get_forward_rules_from_api(settings: "SettingParams", user):
-    logger.debug(f"Getting forward rule for user {user['id']} ({user['nickname']})...")
+    logger.debug("Getting forward rule for user %s (%s)...", user['id'], user['nickname'])
     url = f"{DEFAULT_360_API_URL}/admin/v1/org/{settings.org_id}/mail/users/{user['id']}/settings/user_rules"
     headers = {"Authorization": f"OAuth {settings.oauth_token}"}
     data = {}
     try:
         retries = 1
         while True:
-            logger.debug(f"GET url - {url}")
-            response = requests.get(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            logger.debug("GET url - %s", url)
+            response = settings.api_session.get(url, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request for user {user['id']}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during GET request for user %s: %s. Error message: %s", user['id'], response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -3679,19 +5883,19 @@ def clear_forward_rule_by_api(settings: "SettingParams", user, ruleId):
     url = f"{DEFAULT_360_API_URL}/admin/v1/org/{settings.org_id}/mail/users/{user['id']}/settings/user_rules/{ruleId}"
     headers = {"Authorization": f"OAuth {settings.oauth_token}"}
     logger.info(f"Clearing forward rule {ruleId} for user {user['id']} ({user['nickname']})...")
-    logger.debug(f"DELETE URL: {url}")
+    logger.debug("DELETE URL: %s", url)
     try:
         retries = 1
         while True:
             if settings.dry_run:
                 logger.info(f"Dry run: Would clear forward rule {ruleId} for user {user['id']} ({user['nickname']})")
                 break
-            response = requests.delete(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            response = settings.api_session.delete(url, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during DELETE request for user {user['id']}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during DELETE request for user %s: %s. Error message: %s", user['id'], response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -3708,7 +5912,7 @@ def forward_rules_download_for_all_users(settings: "SettingParams"):
     users = get_all_api360_users(settings)
     if not users:
         logger.info("No users found in Y360 organization.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
 
     rules = []
@@ -3716,13 +5920,19 @@ def forward_rules_download_for_all_users(settings: "SettingParams"):
     autoreply_dict = {}
     count = 0
     logger.info(f"Total users count - {len(users)}.")
+    journal = open_job_journal(settings, settings.forward_rules_output_file, "forward_rules")
     with console.status("[bold green]Getting forward rules for all users from API...", spinner="dots"):
         for user in users:
             if user['id'].startswith("113"):
                 count += 1
                 if count % 10 == 0:
                     logger.info(f"Processed {count} users (total users count - {len(users)}).")
-                response_json = get_forward_rules_from_api(settings, user) 
+                if user['id'] in journal.done:
+                    response_json = journal.done[user['id']]
+                else:
+                    response_json = get_forward_rules_from_api(settings, user) 
+                    if response_json:
+                        journal.record(user['id'], response_json)
                 if response_json:   
                     if response_json['forwards']:
                         rules = []
@@ -3735,18 +5945,25 @@ def forward_rules_download_for_all_users(settings: "SettingParams"):
                             rules.append(autoreply)
                         autoreply_dict[user['id']] = rules
 
-    with open(settings.forward_rules_output_file, "w", encoding="utf-8") as f:
-        f.write("uid;nickname;displayName;isEnabled;forwardRules;Autoreplays\n")
+    with open_export_sink(settings, settings.forward_rules_output_file, FORWARD_RULES_EXPORT_COLUMNS) as sink:
         for user in users:
-            forward_rules_string = ""
-            autorepaly_rules_string = ""
-            if user['id'] in forward_dict.keys():
-                forward_rules_string = ",".join([f"{rule['address']}|{rule['withStore']}" for rule in forward_dict[user['id']]])
-            if user['id'] in autoreply_dict.keys():
-                autorepaly_rules_string = "#".join([f"{rule['text']}" for rule in autoreply_dict[user['id']]])
-            f.write(f"{user['id']};{user['nickname']};{user['name']['last']} {user['name']['first']} {user['name']['middle']};{user['isEnabled']};{forward_rules_string};{autorepaly_rules_string}\n")
-        logger.info(f"{len(users)} users downloaded to file {settings.forward_rules_output_file}")
-    console.input("[dim]Press Enter to continue...[/dim]")
+            forwards = forward_dict.get(user['id'], [])
+            autoreplies = autoreply_dict.get(user['id'], [])
+            record = {
+                "uid": user['id'],
+                "nickname": user['nickname'],
+                "displayName": f"{user['name']['last']} {user['name']['first']} {user['name']['middle']}",
+                "isEnabled": user['isEnabled'],
+                "forwardRules": forwards,
+                "Autoreplays": autoreplies,
+            }
+            csv_row = dict(record)
+            csv_row['forwardRules'] = ",".join([f"{rule['address']}|{rule['withStore']}" for rule in forwards])
+            csv_row['Autoreplays'] = "#".join([f"{rule['text']}" for rule in autoreplies])
+            sink.write(record, csv_row)
+        logger.info(f"{len(users)} users downloaded to file {sink.path}")
+    journal.remove()
+    wait_for_enter(settings)
 
 def mfa_download_settings(settings):
     logger.info("Get 2FA settings for all users.")
@@ -3754,13 +5971,14 @@ def mfa_download_settings(settings):
     if not users:
         logger.info("No users found in Y360 organization.")
         return
-    all_deps = generate_deps_hierarchy_from_api(settings)
-    if not all_deps:
+    deps_tree = get_departments_tree(settings)
+    if len(deps_tree.source) <= 1:
         logger.info("No departments found in Y360 organization.")
         
     mfa = []
     count = 0
     logger.info(f"Total users count - {len(users)}.")
+    journal = open_job_journal(settings, settings.users_2fa_output_file, "2fa_settings")
     with console.status("[bold green]Getting 2FA settings for all users from API...", spinner="dots"):
         for user in users:
             user_mfa = {}
@@ -3770,17 +5988,18 @@ def mfa_download_settings(settings):
                 user_mfa['displayName'] = user['name']['last'] + " " + user['name']['first'] + " " + user['name']['middle']
                 user_mfa['isEnabled'] = user['isEnabled']
                 user_mfa['isAdmin'] = user['isAdmin']
-                temp_dep = next((dep for dep in all_deps if dep['id'] == user['departmentId']), None)
-                if temp_dep:
-                    user_mfa['department'] = temp_dep['path']
-                else:
-                    user_mfa['department'] = ""
+                user_mfa['department'] = deps_tree.path(user['departmentId'])
                 user_mfa['email'] = user['email']
 
                 count += 1
                 if count % 10 == 0:
                     logger.info(f"Processed {count} users (total users count - {len(users)}).")
-                mfa_dict = get_2fa_settings_from_api(settings, user) 
+                if user['id'] in journal.done:
+                    mfa_dict = journal.done[user['id']]
+                else:
+                    mfa_dict = get_2fa_settings_from_api(settings, user) 
+                    if mfa_dict['personal_and_phone'] and mfa_dict['per_user_2fa'] and mfa_dict['domain_2fa']:
+                        journal.record(user['id'], mfa_dict)
 
                 if mfa_dict['personal_and_phone']:
                     user_mfa['personal2FAEnabled'] = mfa_dict['personal_and_phone']['has2fa']
@@ -3805,15 +6024,17 @@ def mfa_download_settings(settings):
 
                 mfa.append(user_mfa)
 
-    with open(settings.users_2fa_output_file, "w", encoding="utf-8") as f:
-        f.write("uid;nickname;displayName;isEnabled;isAdmin;domain2FAEnabled;hasSecurityPhone;personal2FAEnabled;global2FAEnabled;global2FADuration;global2FAPolicy;email;department\n")
+    with open_export_sink(settings, settings.users_2fa_output_file, USERS_2FA_EXPORT_COLUMNS) as sink:
         for user in mfa:
-            f.write(f"{user['id']};{user['nickname']};{user['displayName']};{user['isEnabled']};{user['isAdmin']};{user['domain2FAEnabled']};{user['hasSecurityPhone']};{user['personal2FAEnabled']};{user['global2FAEnabled']};{user['global2FADuration']};{user['global2FAPolicy']};{user['email']};{user['department']}\n")
-        logger.info(f"{len(users)} users downloaded to file {settings.users_2fa_output_file}")
-    console.input("[dim]Press Enter to continue...[/dim]")
+            record = dict(user)
+            record['uid'] = record.pop('id')
+            sink.write(record)
+        logger.info(f"{len(users)} users downloaded to file {sink.path}")
+    journal.remove()
+    wait_for_enter(settings)
 
 def get_2fa_settings_from_api(settings: "SettingParams", user):
-    logger.debug(f"Getting 2fa settings for user {user['id']} ({user['nickname']})...")
+    logger.debug("Getting 2fa settings for user %s (%s)...", user['id'], user['nickname'])
 
     url_personal_and_phone = f"{DEFAULT_360_API_URL}/directory/v1/org/{settings.org_id}/users/{user['id']}/2fa"
     url_enable_per_user_2fa = f"{DEFAULT_360_API_URL}/directory/v1/org/{settings.org_id}/users/{user['id']}/domain_2fa"
@@ -3825,13 +6046,13 @@ def get_2fa_settings_from_api(settings: "SettingParams", user):
     try:
         retries = 1
         while True:
-            logger.debug(f"GET url - {url_personal_and_phone}")
-            response = requests.get(url_personal_and_phone, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            logger.debug("GET url - %s", url_personal_and_phone)
+            response = settings.api_session.get(url_personal_and_phone, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request for user {user['id']}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during GET request for user %s: %s. Error message: %s", user['id'], response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -3849,13 +6070,13 @@ def get_2fa_settings_from_api(settings: "SettingParams", user):
     try:
         retries = 1
         while True:
-            logger.debug(f"GET url - {url_enable_per_user_2fa}")
-            response = requests.get(url_enable_per_user_2fa, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            logger.debug("GET url - %s", url_enable_per_user_2fa)
+            response = settings.api_session.get(url_enable_per_user_2fa, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request for user {user['id']}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during GET request for user %s: %s. Error message: %s", user['id'], response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -3873,13 +6094,13 @@ def get_2fa_settings_from_api(settings: "SettingParams", user):
     try:
         retries = 1
         while True:
-            logger.debug(f"GET url - {url_domain_2fa}")
-            response = requests.get(url_domain_2fa, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            logger.debug("GET url - %s", url_domain_2fa)
+            response = settings.api_session.get(url_domain_2fa, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request for user {user['id']}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during GET request for user %s: %s. Error message: %s", user['id'], response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -3970,7 +6191,7 @@ def mfa_show_settings_for_user(settings: "SettingParams", user: dict):
     
     console.print(user_panel)
     console.print(mfa_panel)
-    console.input("[dim]Press Enter to continue...[/dim]")
+    wait_for_enter(settings)
 
 def mfa_reset_personal_phone_prompt(settings: "SettingParams"):
     logger.info("Reset 2FA phone for users.")
@@ -4001,17 +6222,17 @@ def mfa_reset_personal_phone(settings: "SettingParams", user: dict):
         retries = 1
         url = f"{DEFAULT_360_API_URL}/directory/v1/org/{settings.org_id}/users/{user['id']}/2fa"
         headers = {"Authorization": f"OAuth {settings.oauth_token}"}
-        logger.debug(f"DELETE URL: {url}")
+        logger.debug("DELETE URL: %s", url)
         while True:
             if settings.dry_run:
                 logger.info(f"Dry run: Would delete security phone for user {user['id']} ({user['nickname']})")
                 break
-            response = requests.delete(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            response = settings.api_session.delete(url, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during DELETE request: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during DELETE request: %s. Error message: %s", response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -4054,17 +6275,17 @@ def mfa_logout_single_user(settings: "SettingParams", user: dict):
         retries = 1
         url = f"{DEFAULT_360_API_URL}/security/v1/org/{settings.org_id}/domain_sessions/users/{user['id']}/logout"
         headers = {"Authorization": f"OAuth {settings.oauth_token}"}
-        logger.debug(f"PUT URL: {url}")
+        logger.debug("PUT URL: %s", url)
         while True:
             if settings.dry_run:
                 logger.info(f"Dry run: Would logout user {user['id']} ({user['nickname']}) from Yandex 360 services.")
                 break
-            response = requests.put(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+            response = settings.api_session.put(url, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during PUT request: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during PUT request: %s. Error message: %s", response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -4104,7 +6325,7 @@ def mfa_logout_users_from_file(settings: "SettingParams"):
     users = get_all_api360_users(settings)
     if not users:
         logger.info("No users found in Y360 organization.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
 
     for line in all_users:
@@ -4118,7 +6339,7 @@ def mfa_logout_users_from_file(settings: "SettingParams"):
             if len(searched.strip()) == 16 and searched.strip().startswith("113"):
                 for user in users:
                     if user['id'] == searched.strip():
-                        logger.debug(f"User found: {user['nickname']} ({user['id']})")
+                        logger.debug("User found: %s (%s)", user['nickname'], user['id'])
                         users_to_add.append(user)
                         found_flag = True
                         break
@@ -4127,7 +6348,7 @@ def mfa_logout_users_from_file(settings: "SettingParams"):
             for user in users:
                 aliases_lower_case = [r.lower() for r in user['aliases']]
                 if user['nickname'].lower() == searched.lower().strip() or searched.lower().strip() in aliases_lower_case:
-                    logger.debug(f"User found: {user['nickname']} ({user['id']})")
+                    logger.debug("User found: %s (%s)", user['nickname'], user['id'])
                     users_to_add.append(user)
                     found_flag = True
                     break
@@ -4135,7 +6356,7 @@ def mfa_logout_users_from_file(settings: "SettingParams"):
                     found_last_name_user.append(user)
             if not found_flag and found_last_name_user:
                 if len(found_last_name_user) == 1:
-                    logger.debug(f"User found ({searched}): {found_last_name_user[0]['nickname']} ({found_last_name_user[0]['id']}, {found_last_name_user[0]['position']})")
+                    logger.debug("User found (%s): %s (%s, %s)", searched, found_last_name_user[0]['nickname'], found_last_name_user[0]['id'], found_last_name_user[0]['position'])
                     users_to_add.append(found_last_name_user[0])
                     found_flag = True
                 else:
@@ -4151,12 +6372,10 @@ def mfa_logout_users_from_file(settings: "SettingParams"):
 
     if len(users_to_add) == 0:
         logger.error("No users from file {settings.users_2fa_input_file} found in Y360 organization.")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
 
-    if len(users_to_add) == 1:
-            answer = input("Do you want to logout {user['id'] (user['nickname]) from Yandex 360 services? (yes/n): ")
-    else:
+    if len(users_to_add) > 1:
         logger.info(f"Some users from file {settings.users_2fa_input_file} found in Y360 organization:")
         if len(users_to_add) <= 3:
             for user in users_to_add:
@@ -4170,16 +6389,16 @@ def mfa_logout_users_from_file(settings: "SettingParams"):
             logger.info(f" - nickname - {users_to_add[-1]['nickname']}, id - {users_to_add[-1]['id']}, name - {users_to_add[-1]['name']['last']} {users_to_add[-1]['name']['first']} {users_to_add[-1]['name']['middle']}")
 
     if len(users_to_add) == 1:
-        if not Confirm.ask(f"[bold yellow]Do you want to logout {users_to_add[0]['id']} ({users_to_add[0]['nickname']}) from Yandex 360 services?[/bold yellow]"):
+        if not confirm_action(settings, f"[bold yellow]Do you want to logout {users_to_add[0]['id']} ({users_to_add[0]['nickname']}) from Yandex 360 services?[/bold yellow]"):
             return
     else:
-        if not Confirm.ask(f"[bold yellow]Do you want to logout {len(users_to_add)} users from Yandex 360 services?[/bold yellow]"):
+        if not confirm_action(settings, f"[bold yellow]Do you want to logout {len(users_to_add)} users from Yandex 360 services?[/bold yellow]"):
             return
 
     for user in users_to_add:
         mfa_logout_single_user(settings, user)
 
-    console.input("[dim]Press Enter to continue...[/dim]")
+    wait_for_enter(settings)
     return
 
 def mfa_logout_users_with_no_phone(settings: "SettingParams"):
@@ -4217,20 +6436,17 @@ def mfa_logout_users_with_no_phone(settings: "SettingParams"):
 
     if not need_logout:
         logger.info("No users found to logout (with 2FA set and no security phone added).")
-        console.input("[dim]Press Enter to continue...[/dim]")
+        wait_for_enter(settings)
         return
     
-    if len(need_logout) == 1:
-            full_name = f"{need_logout[0]['name']['last']} {need_logout[0]['name']['first']} {need_logout[0]['name']['middle']}"
-            answer = input(f"Do you want to logout {need_logout[0]['id']} ({need_logout[0]['nickname']}, {full_name}) from Yandex 360 services? (yes/n): ")
-    else:
+    if len(need_logout) > 1:
         logger.info("Enabled users with 2FA set and no security phone added:")
         if len(need_logout) <= 3:
             for user in need_logout:
                 logger.info(f" - nickname - {user['nickname']}, id - {user['id']}, name - {user['name']['last']} {user['name']['first']} {need_logout[0]['name']['middle']}")
         else:
             for user in need_logout:
-                logger.debug(f" - nickname - {user['nickname']}, id - {user['id']}, name - {user['name']['last']} {user['name']['first']} {need_logout[0]['name']['middle']}")
+                logger.debug(" - nickname - %s, id - %s, name - %s %s %s", user['nickname'], user['id'], user['name']['last'], user['name']['first'], need_logout[0]['name']['middle'])
 
             middle_index = len(need_logout) // 2
             logger.info(f" - nickname - {need_logout[0]['nickname']}, id - {need_logout[0]['id']}, name - {need_logout[0]['name']['last']} {need_logout[0]['name']['first']} {need_logout[0]['name']['middle']}")
@@ -4238,26 +6454,150 @@ def mfa_logout_users_with_no_phone(settings: "SettingParams"):
             logger.info(f" - nickname - {need_logout[middle_index]['nickname']}, id - {need_logout[middle_index]['id']}, name - {need_logout[middle_index]['name']['last']} {need_logout[middle_index]['name']['first']} {need_logout[middle_index]['name']['middle']}")
             logger.info(" - ...")
             logger.info(f" - nickname - {need_logout[-1]['nickname']}, id - {need_logout[-1]['id']}, name - {need_logout[-1]['name']['last']} {need_logout[-1]['name']['first']} {need_logout[-1]['name']['middle']}")
-            if not Confirm.ask(f"[bold yellow]Do you want to logout {len(need_logout)} users from Yandex 360 services?[/bold yellow]"):
-                return
+        if not confirm_action(settings, f"[bold yellow]Do you want to logout {len(need_logout)} users from Yandex 360 services?[/bold yellow]"):
+            return
 
-    # This condition is now handled above, but keeping for single user case
     if len(need_logout) == 1:
         full_name = f"{need_logout[0]['name']['last']} {need_logout[0]['name']['first']} {need_logout[0]['name']['middle']}"
-        if not Confirm.ask(f"[bold yellow]Do you want to logout {need_logout[0]['id']} ({need_logout[0]['nickname']}, {full_name}) from Yandex 360 services?[/bold yellow]"):
+        if not confirm_action(settings, f"[bold yellow]Do you want to logout {need_logout[0]['id']} ({need_logout[0]['nickname']}, {full_name}) from Yandex 360 services?[/bold yellow]"):
             return
 
     for user in need_logout:
         mfa_logout_single_user(settings, user)
 
-    console.input("[dim]Press Enter to continue...[/dim]")
+    wait_for_enter(settings)
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's',
+    'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+# Приведение распространенных вариантов латинской транслитерации к одной форме
+LATIN_TRANSLIT_VARIANTS = [
+    ('kh', 'h'), ('ja', 'ya'), ('ju', 'yu'), ('jo', 'yo'), ('iy', 'y'), ('ij', 'y'), ('yy', 'y'),
+    ('x', 'ks'), ('w', 'v'), ('ck', 'k'),
+]
+CYRILLIC_TRANSLATION = str.maketrans(CYRILLIC_TO_LATIN)
+
+def normalize_search_text(text: str) -> str:
+    """
+    Normalize name for fuzzy search: casefold, ё -> е, transliterate cyrillic to latin
+    and fold common latin transliteration variants
+    """
+    text = (text or '').casefold().replace('ё', 'е').translate(CYRILLIC_TRANSLATION)
+    text = re.sub(r'[^a-z0-9]+', ' ', text).strip()
+    for variant, canonical in LATIN_TRANSLIT_VARIANTS:
+        text = text.replace(variant, canonical)
+    return text
+
+def text_trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+@dataclass
+class UsersSearchIndex:
+    """
+    Exact lookup tables (uid, nickname/alias, last name) and trigram index
+    over normalized last names, first names and nicknames of API 360 users.
+    """
+    source : list
+    by_id : dict
+    by_login : dict
+    by_last_name : dict
+    docs : list
+    trigrams : dict
+
+    def find_exact(self, search_term: str) -> list:
+        """Same rules as interactive search: uid, then nickname/alias, then last name."""
+        term = search_term.strip().lower()
+        if term.isdigit() and len(term) == 16 and term.startswith("113"):
+            user = self.by_id.get(term)
+            if user:
+                return [user]
+        user = self.by_login.get(term)
+        if user:
+            return [user]
+        return self.by_last_name.get(term, [])
+
+    def find_fuzzy(self, search_term: str, limit = FUZZY_SEARCH_MAX_CANDIDATES, min_score = FUZZY_SEARCH_MIN_SCORE) -> list:
+        """Return [(score, user)] ranked by trigram similarity."""
+        query = normalize_search_text(search_term)
+        if not query:
+            return []
+        if self.trigrams is None:
+            self.docs, self.trigrams = build_users_trigrams(self.source)
+        query_trigrams = text_trigrams(query)
+        common = {}
+        for trigram in query_trigrams:
+            for doc_id in self.trigrams.get(trigram, ()):
+                common[doc_id] = common.get(doc_id, 0) + 1
+        best = {}
+        for doc_id, count in common.items():
+            user_pos, doc_size = self.docs[doc_id]
+            score = 2.0 * count / (len(query_trigrams) + doc_size)
+            if score >= min_score and score > best.get(user_pos, 0.0):
+                best[user_pos] = score
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(round(score, 3), self.source[user_pos]) for user_pos, score in ranked]
+
+def build_users_search_index(users: list) -> "UsersSearchIndex":
+    by_id = {}
+    by_login = {}
+    by_last_name = {}
+    for user in users:
+        by_id[user['id']] = user
+        by_login.setdefault(user['nickname'].lower(), user)
+        for alias in user.get('aliases', []):
+            by_login.setdefault(alias.lower(), user)
+        by_last_name.setdefault(user.get('name', {}).get('last', '').lower(), []).append(user)
+    # Триграммный индекс строится при первом нечетком поиске
+    return UsersSearchIndex(source=users, by_id=by_id, by_login=by_login, by_last_name=by_last_name, docs=None, trigrams=None)
+
+def build_users_trigrams(users: list):
+    docs = []
+    trigrams = {}
+    for user_pos, user in enumerate(users):
+        name = user.get('name', {})
+        last_name = normalize_search_text(name.get('last', ''))
+        first_name = normalize_search_text(name.get('first', ''))
+        fields = {last_name, first_name, f"{last_name} {first_name}".strip(), normalize_search_text(user['nickname'])}
+        for field_text in fields:
+            if not field_text:
+                continue
+            field_trigrams = text_trigrams(field_text)
+            doc_id = len(docs)
+            docs.append((user_pos, len(field_trigrams)))
+            for trigram in field_trigrams:
+                trigrams.setdefault(trigram, []).append(doc_id)
+    return docs, trigrams
+
+def get_users_search_index(settings: "SettingParams") -> "UsersSearchIndex":
+    users = get_all_api360_users(settings)
+    if settings.users_index is None or settings.users_index.source is not users:
+        settings.users_index = build_users_search_index(users or [])
+    return settings.users_index
+
+def search_users_fuzzy(settings: "SettingParams", search_term: str, limit = FUZZY_SEARCH_MAX_CANDIDATES) -> list:
+    """
+    Ranked candidates for search term (last name, first name or nickname with typos,
+    ё/е and cyrillic/latin spelling variants)
+    """
+    return get_users_search_index(settings).find_fuzzy(search_term, limit)
+
+def log_fuzzy_candidates(settings: "SettingParams", search_term: str):
+    candidates = search_users_fuzzy(settings, search_term)
+    if candidates:
+        logger.info(f"Possible matches for '{search_term}':")
+        for score, user in candidates:
+            logger.info(f" - {user['name']['last']} {user['name']['first']}, nickname {user['nickname']} ({user['id']}, {user.get('position', '')}), score {score}")
 
 def find_user_by_search_term(settings: "SettingParams", search_term: str):
     """
     Find user by login, email, uid or last name
     """
-    users = get_all_api360_users(settings)
-    if not users:
+    users_index = get_users_search_index(settings)
+    if not users_index.source:
         logger.error("No users found in Y360 organization.")
         return None
 
@@ -4267,29 +6607,9 @@ def find_user_by_search_term(settings: "SettingParams", search_term: str):
     
     search_term = search_term.strip()
     
-    # Check if it's a UID (16 digits starting with 113)
-    if all(char.isdigit() for char in search_term) and len(search_term) == 16 and search_term.startswith("113"):
-        for user in users:
-            if user['id'] == search_term:
-                logger.info(f"User found by UID: {user['nickname']} ({user['id']})")
-                return user
-    
-    # Search by nickname or aliases
-    for user in users:
-        aliases_lower_case = [alias.lower() for alias in user['aliases']]
-        if (user['nickname'].lower() == search_term.lower() or 
-            search_term.lower() in aliases_lower_case):
-            logger.info(f"User found by nickname/alias: {user['nickname']} ({user['id']})")
-            return user
-    
-    # Search by last name
-    found_users = []
-    for user in users:
-        if user['name']['last'].lower() == search_term.lower():
-            found_users.append(user)
-    
+    found_users = users_index.find_exact(search_term)
     if len(found_users) == 1:
-        logger.info(f"User found by last name: {found_users[0]['nickname']} ({found_users[0]['id']})")
+        logger.info(f"User found: {found_users[0]['nickname']} ({found_users[0]['id']})")
         return found_users[0]
     elif len(found_users) > 1:
         logger.error(f"Multiple users found with last name '{search_term}':")
@@ -4298,6 +6618,7 @@ def find_user_by_search_term(settings: "SettingParams", search_term: str):
         return None
     
     logger.error(f"User '{search_term}' not found in Y360 organization.")
+    log_fuzzy_candidates(settings, search_term)
     return None
 
 def get_user_email_signature(settings: "SettingParams", user_id: str):
@@ -4311,14 +6632,14 @@ def get_user_email_signature(settings: "SettingParams", user_id: str):
     try:
         retries = 1
         while True:
-            logger.debug(f"GET url - {url}")
-            response = requests.get(url, headers=headers)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id', '')}")
+            logger.debug("GET url - %s", url)
+            response = settings.api_session.get(url, headers=headers)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id', ''))
             
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during GET request for user {user_id}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during GET request for user %s: %s. Error message: %s", user_id, response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -4347,10 +6668,17 @@ def save_signature_to_file(settings: "SettingParams", user: dict, signature_data
         return None
     
     # Create filename with prefix and user login
-    filename = f"{settings.email_signature_file_prefix}{user['nickname']}.txt"
+    filename = export_file_path(settings, f"{settings.email_signature_file_prefix}{user['nickname']}.txt")
     
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
+        if settings.export_format == "jsonl":
+            with open_export_sink(settings, f"{settings.email_signature_file_prefix}{user['nickname']}.txt") as sink:
+                for sign in signs:
+                    sink.write({"nickname": user['nickname'], **sign})
+            logger.info(f"Signatures saved to file: {filename}")
+            return filename
+
+        with open_export_file(filename) as f:
             f.write(f"Email Signatures for {user['nickname']}\n")
             f.write("=" * 50 + "\n\n")
             
@@ -4440,8 +6768,7 @@ def get_email_signature(settings: "SettingParams"):
         console.print("[bold yellow]⚠️ No signatures found for this user.[/bold yellow]")
     
     # Wait for user input before returning to menu
-    console.print("\n[bold cyan]Press Enter to continue...[/bold cyan]")
-    input()
+    wait_for_enter(settings)
 
 def read_users_from_file(file_path: str):
     """
@@ -4502,7 +6829,7 @@ def load_signature_template(template_path: str):
         logger.error(f"Error loading template {template_path}: {e}")
         return None
 
-def substitute_template_variables(template: str, user: dict, deps: list, primary_email: str):
+def substitute_template_variables(template, user: dict, deps_tree: "DepartmentsTree", primary_email: str):
     """
     Substitute user variables in template with double curly braces {{field}}
     Hide sections with empty values
@@ -4511,10 +6838,7 @@ def substitute_template_variables(template: str, user: dict, deps: list, primary
     if user['departmentId'] == 1:
         department = ''
     else:
-        for dep in deps:
-            if dep['id'] == user['departmentId']:
-                department = dep['name']
-                break
+        department = deps_tree.name(user['departmentId'])
 
     # Get user attributes
     first_name = user.get('name', {}).get('first', '')
@@ -4546,28 +6870,49 @@ def substitute_template_variables(template: str, user: dict, deps: list, primary
         'department': department
     }
     
+    compiled = template if isinstance(template, SignatureTemplate) else compile_signature_template(template)
+    return compiled.render(field_mapping)
+
+SIGNATURE_TEMPLATE_FIELDS = ['first', 'middle', 'last', 'name', 'position', 'mail', 'telephone', 'mobile', 'department']
+
+# Pattern to match HTML elements containing only empty variables
+SIGNATURE_EMPTY_SECTION_PATTERNS = [re.compile(pattern, flags=re.MULTILINE | re.IGNORECASE) for pattern in [
+    # Remove divs with only empty content
+    r'<div[^>]*>\s*{{[^}]+}}\s*</div>',
+    # Remove paragraphs with only empty content  
+    r'<p[^>]*>\s*{{[^}]+}}\s*</p>',
+    # Remove spans with only empty content
+    r'<span[^>]*>\s*{{[^}]+}}\s*</span>',
+    # Remove blockquotes with only empty content
+    r'<blockquote[^>]*>\s*{{[^}]+}}\s*</blockquote>',
+    # Remove lines with only empty variables
+    r'^\s*{{[^}]+}}\s*$',
+]]
+SIGNATURE_EMPTY_LINE = re.compile(r'^\s*$')
+SIGNATURE_EMPTY_TAG_LINE = re.compile(r'^\s*<[^>]*>\s*</[^>]*>\s*$')
+SIGNATURE_COLON_TAG_LINE = re.compile(r'^\s*<[^>]*>\s*:\s*</[^>]*>\s*$')
+SIGNATURE_COLON_OPEN_TAG_LINE = re.compile(r'^\s*<[^>]*>\s*:\s*$')
+SIGNATURE_EMPTY_BLOCKQUOTE = re.compile(r'<blockquote[^>]*>\s*<div[^>]*>\s*[^<]*:\s*</div>\s*</blockquote>', flags=re.MULTILINE | re.IGNORECASE)
+SIGNATURE_COLON_DIV = re.compile(r'<div[^>]*>\s*[^<]*:\s*</div>', flags=re.MULTILINE | re.IGNORECASE)
+SIGNATURE_EMPTY_DIV = re.compile(r'<div[^>]*>\s*</div>', flags=re.MULTILINE | re.IGNORECASE)
+
+# Значения, которые могут изменить результат очистки шаблона (разметка, двоеточие,
+# переносы строк, фигурные скобки), подставляются медленным путем
+SIGNATURE_UNSAFE_VALUE = re.compile(r'[<>:{}\x00\n]')
+SIGNATURE_SLOT = re.compile(r'\x00(\d+)\x00')
+
+def render_signature_text(template: str, field_mapping: dict) -> str:
+    """
+    Reference rendering: substitute variables, then hide sections with empty values
+    """
     # First, substitute all variables
     substituted = template
-    for field, value in field_mapping.items():
-        substituted = substituted.replace(f'{{{{{field}}}}}', value)
+    for field_name, value in field_mapping.items():
+        substituted = substituted.replace(f'{{{{{field_name}}}}}', value)
     
     # Remove sections with empty values using regex
-    # Pattern to match HTML elements containing only empty variables
-    patterns_to_remove = [
-        # Remove divs with only empty content
-        r'<div[^>]*>\s*{{[^}]+}}\s*</div>',
-        # Remove paragraphs with only empty content  
-        r'<p[^>]*>\s*{{[^}]+}}\s*</p>',
-        # Remove spans with only empty content
-        r'<span[^>]*>\s*{{[^}]+}}\s*</span>',
-        # Remove blockquotes with only empty content
-        r'<blockquote[^>]*>\s*{{[^}]+}}\s*</blockquote>',
-        # Remove lines with only empty variables
-        r'^\s*{{[^}]+}}\s*$',
-    ]
-    
-    for pattern in patterns_to_remove:
-        substituted = re.sub(pattern, '', substituted, flags=re.MULTILINE | re.IGNORECASE)
+    for pattern in SIGNATURE_EMPTY_SECTION_PATTERNS:
+        substituted = pattern.sub('', substituted)
     
     # Additional cleanup for empty content after substitution
     # Remove lines that contain only empty values or whitespace
@@ -4575,17 +6920,17 @@ def substitute_template_variables(template: str, user: dict, deps: list, primary
     cleaned_lines = []
     for line in lines:
         # Check if line contains only empty variables or whitespace
-        if re.match(r'^\s*$', line):
+        if SIGNATURE_EMPTY_LINE.match(line):
             # Keep empty lines for formatting
             if cleaned_lines and cleaned_lines[-1].strip():
                 cleaned_lines.append('')
-        elif re.search(r'^\s*<[^>]*>\s*</[^>]*>\s*$', line):
+        elif SIGNATURE_EMPTY_TAG_LINE.search(line):
             # Remove empty HTML tags
             continue
-        elif re.search(r'^\s*<[^>]*>\s*:\s*</[^>]*>\s*$', line):
+        elif SIGNATURE_COLON_TAG_LINE.search(line):
             # Remove lines with only colons (empty field values)
             continue
-        elif re.search(r'^\s*<[^>]*>\s*:\s*$', line):
+        elif SIGNATURE_COLON_OPEN_TAG_LINE.search(line):
             # Remove lines with only colons (empty field values)
             continue
         else:
@@ -4594,11 +6939,11 @@ def substitute_template_variables(template: str, user: dict, deps: list, primary
     substituted = '\n'.join(cleaned_lines)
     
     # Final pass: remove any remaining empty blockquotes or divs
-    substituted = re.sub(r'<blockquote[^>]*>\s*<div[^>]*>\s*[^<]*:\s*</div>\s*</blockquote>', '', substituted, flags=re.MULTILINE | re.IGNORECASE)
-    substituted = re.sub(r'<div[^>]*>\s*[^<]*:\s*</div>', '', substituted, flags=re.MULTILINE | re.IGNORECASE)
+    substituted = SIGNATURE_EMPTY_BLOCKQUOTE.sub('', substituted)
+    substituted = SIGNATURE_COLON_DIV.sub('', substituted)
     
     # Remove empty divs that might be left
-    substituted = re.sub(r'<div[^>]*>\s*</div>', '', substituted, flags=re.MULTILINE | re.IGNORECASE)
+    substituted = SIGNATURE_EMPTY_DIV.sub('', substituted)
     
     # Clean up empty lines and extra whitespace
     lines = substituted.split('\n')
@@ -4617,17 +6962,64 @@ def substitute_template_variables(template: str, user: dict, deps: list, primary
     
     return '\n'.join(cleaned_lines)
 
-def set_user_signature(settings: "SettingParams", user: dict, signature_text: str, default_email: str):
+class SignatureTemplate:
     """
-    Set email signature for user via API
+    Signature template compiled into literal segments and {{field}} slots.
+
+    Which sections are removed depends only on which fields are empty, so for
+    every combination of empty fields the reference rendering is run once with
+    placeholder values and split into literals and slots. Each user is then
+    rendered by a single join. Values that could interact with the cleanup rules
+    fall back to the reference rendering, so the output is always identical.
     """
-    logger.info(f"Setting signature for user {user['id']} ({user['nickname']})...")
-    
-    url = f"{DEFAULT_360_API_URL}/admin/v1/org/{settings.org_id}/mail/users/{user['id']}/settings/sender_info"
-    headers = {"Authorization": f"OAuth {settings.oauth_token}"}
-    
-    # Prepare signature data
-    signature_data = {
+
+    def __init__(self, template: str):
+        self.template = template
+        self.skeletons = {}
+        self.always_reference = '\x00' in template
+
+    def render(self, field_mapping: dict) -> str:
+        values = [field_mapping.get(field_name, '') for field_name in SIGNATURE_TEMPLATE_FIELDS]
+        if self.always_reference or len(field_mapping) != len(SIGNATURE_TEMPLATE_FIELDS) \
+                or any(not isinstance(value, str) or (value and (not value.strip() or SIGNATURE_UNSAFE_VALUE.search(value))) for value in values):
+            return render_signature_text(self.template, field_mapping)
+        mask = tuple(bool(value) for value in values)
+        skeleton = self.skeletons.get(mask)
+        if skeleton is None:
+            skeleton = self._compile(mask)
+        literals, slots = skeleton
+        parts = [literals[0]]
+        for slot, literal in zip(slots, literals[1:]):
+            parts.append(values[slot])
+            parts.append(literal)
+        return ''.join(parts)
+
+    def _compile(self, mask: tuple):
+        placeholders = {field_name: (f'\x00{i}\x00' if mask[i] else '') for i, field_name in enumerate(SIGNATURE_TEMPLATE_FIELDS)}
+        pieces = SIGNATURE_SLOT.split(render_signature_text(self.template, placeholders))
+        skeleton = (pieces[0::2], [int(slot) for slot in pieces[1::2]])
+        self.skeletons[mask] = skeleton
+        return skeleton
+
+@lru_cache(maxsize=16)
+def compile_signature_template(template: str) -> "SignatureTemplate":
+    return SignatureTemplate(template)
+
+def normalize_signature_text(text: str) -> str:
+    """
+    Normalize signature HTML for comparison: unify line endings and collapse whitespace
+    """
+    if not text:
+        return ""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = re.sub(r'>\s+<', '><', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def build_signature_data(settings: "SettingParams", signature_text: str, default_email: str) -> dict:
+    """
+    Body of sender_info POST that replaces all signatures of user with one signature
+    """
+    return {
         "signs": [
             {
                 "emails": [default_email],
@@ -4636,23 +7028,50 @@ def set_user_signature(settings: "SettingParams", user: dict, signature_text: st
                 "lang": settings.email_signature_language
             }
         ],
-        "signPosition": "bottom"
+        "signPosition": settings.email_signature_position.lower()
     }
+
+def is_signature_unchanged(sender_info: dict, signature_data: dict) -> bool:
+    """
+    True if POST of signature_data would not change sender_info: same number of signatures, position,
+    and the same language, default flag, emails and normalized text of every signature
+    """
+    current_signs = sender_info.get('signs') or []
+    new_signs = signature_data['signs']
+    if len(current_signs) != len(new_signs) or sender_info.get('signPosition') != signature_data['signPosition']:
+        return False
+    for current, new in zip(current_signs, new_signs):
+        if (current.get('lang') != new['lang'] or bool(current.get('isDefault')) != new['isDefault']
+                or sorted(email.lower() for email in current.get('emails') or []) != sorted(email.lower() for email in new['emails'])
+                or normalize_signature_text(current.get('text', '')) != normalize_signature_text(new['text'])):
+            return False
+    return True
+
+def set_user_signature(settings: "SettingParams", user: dict, signature_text: str, default_email: str):
+    """
+    Set email signature for user via API
+    """
+    logger.info(f"Setting signature for user {user['id']} ({user['nickname']})...")
+    
+    url = f"{DEFAULT_360_API_URL}/admin/v1/org/{settings.org_id}/mail/users/{user['id']}/settings/sender_info"
+    headers = {"Authorization": f"OAuth {settings.oauth_token}"}
+    
+    signature_data = build_signature_data(settings, signature_text, default_email)
     
     try:
         retries = 1
-        logger.debug(f"POST url - {url}")
+        logger.debug("POST url - %s", url)
         while True:
             if settings.dry_run:
                 logger.info(f"Dry run: Would set signature for user {user['id']} ({user['nickname']})")
                 break
-            response = requests.post(url, headers=headers, json=signature_data)
-            logger.debug(f"x-request-id: {response.headers.get('x-request-id', '')}")
+            response = settings.api_session.post(url, headers=headers, json=signature_data)
+            logger.debug("x-request-id: %s", response.headers.get('x-request-id', ''))
             
             if response.status_code != HTTPStatus.OK.value:
-                logger.error(f"Error during POST request for user {user['id']}: {response.status_code}. Error message: {response.text}")
+                logger.log(attempt_log_level(retries), "Error during POST request for user %s: %s. Error message: %s", user['id'], response.status_code, LogBody(response.text))
                 if retries < MAX_RETRIES:
-                    logger.error(f"Retrying ({retries+1}/{MAX_RETRIES})")
+                    logger.warning(f"Retrying ({retries+1}/{MAX_RETRIES})")
                     time.sleep(RETRIES_DELAY_SEC * retries)
                     retries += 1
                 else:
@@ -4669,37 +7088,44 @@ def set_email_signature(settings: "SettingParams"):
     """
     Main function to set email signatures for users from file
     """
-    console.clear()
-    clear_screen()
+    if settings.interactive:
+        console.clear()
+        clear_screen()
     
-    # Create header
-    header_panel = Panel(
-        "[bold blue]📧 Set Email Signatures[/bold blue]",
-        title="[bold green]Email Signature Setup[/bold green]",
-        border_style="green",
-        padding=(1, 2)
-    )
-    console.print(header_panel)
+        # Create header
+        header_panel = Panel(
+            "[bold blue]📧 Set Email Signatures[/bold blue]",
+            title="[bold green]Email Signature Setup[/bold green]",
+            border_style="green",
+            padding=(1, 2)
+        )
+        console.print(header_panel)
     
     # Get input file path
     while True:
-        input_file = Prompt.ask(
+        input_file = ask_value(
+            settings,
             "[bold yellow]Enter path to users file (CSV format)[/bold yellow]",
-            default=settings.email_signature_input_file
+            settings.email_signature_input_file
         )
         if not os.path.isfile(input_file):
             console.print(f"[bold red]❌ File '{input_file}' does not exist. Please try again.[/bold red]")
+            if not settings.interactive:
+                return False
             continue
         break
     
     # Get  template file path
     while True:
-        template_file = Prompt.ask(
+        template_file = ask_value(
+            settings,
             "[bold yellow]Enter path to signature template file[/bold yellow]",
-            default=settings.email_signature_template_file
+            settings.email_signature_template_file
         )
         if not os.path.isfile(template_file):
             console.print(f"[bold red]❌ File '{template_file}' does not exist. Please try again.[/bold red]")
+            if not settings.interactive:
+                return False
             continue
         break
     
@@ -4709,7 +7135,7 @@ def set_email_signature(settings: "SettingParams"):
     
     if users_data is None:
         console.print("[bold red]❌ Failed to read users file.[/bold red]")
-        return
+        return False
     
     if not users_data:
         console.print("[bold yellow]⚠️ No users found in file.[/bold yellow]")
@@ -4718,7 +7144,7 @@ def set_email_signature(settings: "SettingParams"):
     console.print(f"[bold green]✅ Found {len(users_data)} users in file.[/bold green]")
     
     # Validate users
-    with console.status("[bold green]Validating users..."):
+    with console.status("[bold green]Validating users..."), trace_span("validate users", users=len(users_data)):
         problematic_lines = validate_users(settings, users_data)
     
     if problematic_lines:
@@ -4727,9 +7153,8 @@ def set_email_signature(settings: "SettingParams"):
             console.print(f"[bold red]Line {line_data['line_num']}: {line_data['search_term']} - {line_data['error']}[/bold red]")
         
         console.print("\n[bold yellow]Please fix the problematic lines and try again.[/bold yellow]")
-        console.print("\n[bold cyan]Press Enter to continue...[/bold cyan]")
-        input()
-        return
+        wait_for_enter(settings)
+        return False
     
     console.print("[bold green]✅ All users validated successfully.[/bold green]")
     
@@ -4739,7 +7164,9 @@ def set_email_signature(settings: "SettingParams"):
     
     if not template:
         console.print("[bold red]❌ Failed to load signature template.[/bold red]")
-        return
+        return False
+
+    compiled_template = compile_signature_template(template)
     
     console.print("[bold green]✅ Signature template loaded.[/bold green]")
     
@@ -4749,42 +7176,63 @@ def set_email_signature(settings: "SettingParams"):
                        title="Template Preview", border_style="blue"))
     
     # Ask for confirmation
-    if not Confirm.ask("[bold yellow]Do you want to proceed with setting signatures for {len(users_data)} users?[/bold yellow]"):
+    if not confirm_action(settings, f"[bold yellow]Do you want to proceed with setting signatures for {len(users_data)} users?[/bold yellow]"):
         console.print("[bold yellow]Operation cancelled.[/bold yellow]")
         return
     
     # Set signatures
     success_count = 0
     error_count = 0
+    unchanged_count = 0
+
+    deps_tree = get_departments_tree(settings)
+    users = [user_data['user'] for user_data in users_data]
+
+    # Один GET sender_info отдает и адрес по умолчанию, и текущие подписи
+    with console.status("[bold green]Getting current signatures..."), trace_span("prefetch sender_info", users=len(users)):
+        sender_infos = run_in_parallel(settings, lambda user: get_default_email(settings, user['id']), users)
+
+    planned = []
+    with trace_span("render signatures", users=len(users)):
+        for user, sender_info in zip(users, sender_infos):
+            with trace_span("render signature", "render", uid=user['id'], nickname=user['nickname']):
+                sender_info = sender_info or {}
+                primary_email = sender_info.get('defaultFrom')
+                if not primary_email:
+                    primary_email = user['email']
+                # Substitute template variables
+                signature_text = substitute_template_variables(compiled_template, user, deps_tree, primary_email)
+
+                if settings.email_signature_skip_unchanged and sender_info:
+                    if is_signature_unchanged(sender_info, build_signature_data(settings, signature_text, primary_email)):
+                        unchanged_count += 1
+                        logger.info(f"Signature for {user['nickname']} is unchanged, skipping.")
+                        continue
+                planned.append((user, signature_text, primary_email))
 
-    deps = get_all_api360_departments(settings)
-    
-    with console.status("[bold green]Setting signatures..."):
-        for user_data in users_data:
-            user = user_data['user']
+    if settings.email_signature_skip_unchanged:
+        console.print(f"[bold green]✅ Unchanged signatures: {unchanged_count}, to update: {len(planned)}.[/bold green]")
 
-            primary_email = get_default_email(settings, user['id'])['defaultFrom']
-            if not primary_email:
-                primary_email = user['email']
-            # Substitute template variables
-            signature_text = substitute_template_variables(template, user, deps, primary_email)
-            
-            # Set signature
-            if set_user_signature(settings, user, signature_text, primary_email):
-                success_count += 1
-                logger.info(f"✅ Successfully set signature for {user['nickname']}")
-            else:
-                error_count += 1
-                logger.error(f"❌ Failed to set signature for {user['nickname']}")
+    with console.status("[bold green]Setting signatures..."), trace_span("set signatures", users=len(planned)):
+        results = run_in_parallel(settings, lambda item: set_user_signature(settings, *item), planned)
+
+    for (user, _, _), result in zip(planned, results):
+        if result:
+            success_count += 1
+            logger.info(f"✅ Successfully set signature for {user['nickname']}")
+        else:
+            error_count += 1
+            logger.error(f"❌ Failed to set signature for {user['nickname']}")
     
     # Show results
     console.print(f"\n[bold green]✅ Successfully set signatures for {success_count} users.[/bold green]")
+    if unchanged_count > 0:
+        console.print(f"[bold green]✅ Skipped {unchanged_count} users with unchanged signatures.[/bold green]")
     if error_count > 0:
         console.print(f"[bold red]❌ Failed to set signatures for {error_count} users.[/bold red]")
     
     # Wait for user input before returning to menu
-    console.print("\n[bold cyan]Press Enter to continue...[/bold cyan]")
-    input()
+    wait_for_enter(settings)
 
 def get_all_api360_departments(settings: "SettingParams", force = False, show_messages = False):
     if not force:
@@ -4811,13 +7259,13 @@ def get_all_api360_departments_from_api(settings: "SettingParams"):
         try:
             retries = 1
             while True:
-                logger.debug(f"GET URL - {url}")
-                response = requests.get(url, headers=headers, params=params)
-                logger.debug(f"x-request-id: {response.headers.get('x-request-id','')}")
+                logger.debug("GET URL - %s", url)
+                response = settings.api_session.get(url, headers=headers, params=params)
+                logger.debug("x-request-id: %s", response.headers.get('x-request-id',''))
                 if response.status_code != HTTPStatus.OK.value:
-                    logger.error(f"!!! ОШИБКА !!! при GET запросе url - {url}: {response.status_code}. Сообщение об ошибке: {response.text}")
+                    logger.log(attempt_log_level(retries), "!!! ОШИБКА !!! при GET запросе url - %s: %s. Сообщение об ошибке: %s", url, response.status_code, LogBody(response.text))
                     if retries < MAX_RETRIES:
-                        logger.error(f"Повторная попытка ({retries+1}/{MAX_RETRIES})")
+                        logger.warning(f"Повторная попытка ({retries+1}/{MAX_RETRIES})")
                         time.sleep(RETRIES_DELAY_SEC * retries)
                         retries += 1
                     else:
@@ -4826,7 +7274,7 @@ def get_all_api360_departments_from_api(settings: "SettingParams"):
                 else:
                     for deps in response.json()['departments']:
                         departments.append(deps)
-                    logger.debug(f"Загружено {len(response.json()['departments'])} подразделений. Текущая страница - {current_page} (всего {last_page} страниц).")
+                    logger.debug("Загружено %s подразделений. Текущая страница - %s (всего %s страниц).", len(response.json()['departments']), current_page, last_page)
                     current_page += 1
                     last_page = response.json()['pages']
                     break
@@ -4840,42 +7288,93 @@ def get_all_api360_departments_from_api(settings: "SettingParams"):
             break
 
     if has_errors:
-        print("Есть ошибки при GET запросах. Возвращается пустой список подразделений.")
+        logger.error("Есть ошибки при GET запросах. Возвращается пустой список подразделений.")
         return []
     
     return departments
 
-def generate_deps_hierarchy_from_api(settings: "SettingParams", force = False, show_messages = False):
+@dataclass
+class DepartmentsTree:
+    """
+    Department hierarchy built once per refresh of the departments cache.
+    Full paths are computed in a single pass over the departments list.
+    """
+    source : list
+    by_id : dict
+    paths : dict
+
+    def name(self, dep_id) -> str:
+        dep = self.by_id.get(dep_id)
+        return dep['name'] if dep else ''
+
+    def path(self, dep_id) -> str:
+        return self.paths.get(dep_id, '')
+
+def build_departments_tree(all_deps_from_api: list) -> "DepartmentsTree":
+    by_id = {}
+    for item in all_deps_from_api:
+        by_id[item['id']] = item
+
+    # Путь корневого подразделения (id = 1) не включается в пути дочерних подразделений
+    paths = {1: ''}
+    for item in all_deps_from_api:
+        if item['id'] in paths or item['parentId'] <= 0:
+            continue
+        chain = []
+        current = item
+        while current is not None and current['id'] not in paths:
+            chain.append(current)
+            parent_id = current['parentId']
+            if parent_id <= 0:
+                break
+            current = by_id.get(parent_id)
+            if current is None:
+                logger.debug("Parent department %s not found, department %s is treated as top level.", parent_id, chain[-1]['id'])
+        prefix = paths.get(current['id'], '') if current is not None else ''
+        for dep in reversed(chain):
+            name = dep['name'].strip()
+            prefix = f'{prefix}{DEPS_SEPARATOR}{name}' if prefix else name
+            paths[dep['id']] = prefix
+
+    return DepartmentsTree(source=all_deps_from_api, by_id=by_id, paths=paths)
+
+def get_departments_tree(settings: "SettingParams", force = False, show_messages = False):
     all_deps_from_api = get_all_api360_departments(settings, force, show_messages)
-    if len(all_deps_from_api) == 1:
+    if settings.deps_tree is None or settings.deps_tree.source is not all_deps_from_api:
+        settings.deps_tree = build_departments_tree(all_deps_from_api)
+    return settings.deps_tree
+
+def generate_deps_hierarchy_from_api(settings: "SettingParams", force = False, show_messages = False):
+    deps_tree = get_departments_tree(settings, force, show_messages)
+    if len(deps_tree.source) == 1:
         #print('There are no departments in organozation! Exit.')
         return []
     all_deps = []
-    for item in all_deps_from_api:        
-        path = item['name'].strip()
-        prevId = item['parentId']
-        if prevId > 0:
-            while not prevId == 1:
-                d = next(i for i in all_deps_from_api if i['id'] == prevId)
-                path = f'{d["name"].strip()}{DEPS_SEPARATOR}{path}'
-                prevId = d['parentId']
-            element = {'id':item['id'], 'parentId':item['parentId'], 'path':path}
+    for item in deps_tree.source:
+        if item['parentId'] > 0:
+            element = {'id':item['id'], 'parentId':item['parentId'], 'path':deps_tree.path(item['id'])}
             all_deps.append(element)
     return all_deps
 
 if __name__ == "__main__":
-    # Display startup banner
-    console.print(Panel(
-        Text.assemble(
-            ("🚀 ", "bold blue"),
-            ("Yandex 360 Text Admin Console", "bold green"),
-            (" 🚀\n", "bold blue"),
-            ("Version 2.0 with Rich UI", "cyan"),
-        ),
-        title="[bold yellow]Welcome[/bold yellow]",
-        border_style="green",
-        padding=(1, 2)
-    ))
+    cli_args = None
+    if is_cli_command_line(sys.argv):
+        # Неинтерактивный режим: без баннера и меню, вывод в stderr, результат - код завершения
+        console.stderr = True
+        cli_args = parse_cli_arguments(sys.argv[1:])
+    else:
+        # Display startup banner
+        console.print(Panel(
+            Text.assemble(
+                ("🚀 ", "bold blue"),
+                ("Yandex 360 Text Admin Console", "bold green"),
+                (" 🚀\n", "bold blue"),
+                ("Version 2.0 with Rich UI", "cyan"),
+            ),
+            title="[bold yellow]Welcome[/bold yellow]",
+            border_style="green",
+            padding=(1, 2)
+        ))
 
     denv_path = os.path.join(os.path.dirname(__file__), '.env')
 
@@ -4889,11 +7388,52 @@ if __name__ == "__main__":
 
     #with console.status("[bold green]Initializing settings...", spinner="dots"):
     
-    settings = get_settings()
+    if cli_args and cli_args.command == CLI_MULTI_ORG_COMMAND:
+        # настройки каждой организации собираются отдельно, общие настройки из .env не проверяются
+        configure_api_urls(os.environ)
+        configure_logging(os.environ)
+        if cli_args.log_level:
+            logger.setLevel(cli_args.log_level)
+        trace_file = run_file_path(cli_args.trace_file, os.environ.get("TRACE_FILE", "").strip(), os.environ.get("OUTPUT_DIR", "").strip())
+        if trace_file:
+            tracer.start()
+        try:
+            exit_code = run_multi_org(cli_args.orgs, cli_args.org_command, cli_args.parallel)
+        except KeyboardInterrupt:
+            logger.error("Interrupted by Ctrl+C.")
+            exit_code = CLI_EXIT_FAILED
+        metrics_file = run_file_path(cli_args.metrics_file, os.environ.get("METRICS_FILE", "").strip(), os.environ.get("OUTPUT_DIR", "").strip())
+        if metrics_file:
+            write_metrics_file(metrics_file)
+        if trace_file:
+            tracer.save(trace_file)
+        sys.exit(exit_code)
+
+    settings = get_settings(interactive = cli_args is None)
     
     if settings is None:
         console.print("[bold red]❌ Check config setting in .env file and try again.[/bold red]")
-        sys.exit(EXIT_CODE)
+        sys.exit(CLI_EXIT_USAGE if cli_args else EXIT_CODE)
+
+    if getattr(cli_args, "log_level", None):
+        logger.setLevel(cli_args.log_level)
+
+    trace_file = run_file_path(getattr(cli_args, "trace_file", None), settings.trace_file, settings.output_dir)
+    if trace_file:
+        tracer.start()
+
+    if cli_args:
+        try:
+            exit_code = run_cli_command(settings, cli_args)
+        except KeyboardInterrupt:
+            logger.error("Interrupted by Ctrl+C.")
+            exit_code = CLI_EXIT_FAILED
+        metrics_file = run_file_path(getattr(cli_args, "metrics_file", None), settings.metrics_file, settings.output_dir)
+        if metrics_file:
+            write_metrics_file(metrics_file)
+        if trace_file and tracer.enabled:
+            tracer.save(trace_file)
+        sys.exit(exit_code)
 
     # Display configuration info
     config_table = Table(title="Configuration Parameters")
@@ -4914,4 +7454,7 @@ if __name__ == "__main__":
         sys.exit(EXIT_CODE)
     except Exception as e:
         console.print(f"[bold red]❌ {type(e).__name__} at line {e.__traceback__.tb_lineno}: {e}[/bold red]")
-        sys.exit(EXIT_CODE)
\ No newline at end of file
+        sys.exit(EXIT_CODE)
+    finally:
+        if trace_file:
+            tracer.save(trace_file)
\ No newline at end of file
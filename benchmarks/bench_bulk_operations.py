@@ -0,0 +1,297 @@
+"""
+End-to-end benchmark of bulk operations of 360_text_admin_console.py against local mock server.
+
+For every organization size and API latency a synthetic organization is generated and served by
+y360_mock_server.py; every operation runs in a separate process (clean caches and peak RSS).
+Reported: wall time, API requests/sec, API calls per user, peak RSS. Results are saved as JSON;
+--compare marks operations that became slower than in previous results (exit code 1).
+
+Usage:
+    python benchmarks/bench_bulk_operations.py --sizes 1000 5000 --latencies 0 20
+    python benchmarks/bench_bulk_operations.py --compare benchmarks/results/bulk_20250101_120000.json
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from dataclasses import dataclass
+
+from bench_common import REPO_DIR, load_console, run_metadata, default_results_path
+
+from rich.console import Console
+from rich.table import Table
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from y360_mock_server import mock_env
+from y360_synthetic_org import generate_org, save_dataset
+
+DEFAULT_SIZES = [1000, 5000]
+DEFAULT_LATENCIES_MS = [0, 20]
+DEFAULT_THRESHOLD = 0.15
+CHILD_TIMEOUT_SEC = 3600
+
+console = Console()
+
+
+@dataclass
+class BulkOperation:
+    """Operation to benchmark: console subcommand (placeholders are replaced by prepared input files) or function name."""
+    argv : list = None
+    func : str = None
+
+
+def cleanup_old_domain_emails(console_module, settings, files: dict):
+    users = console_module.get_all_api360_users(settings)
+    console_module.remove_emails_matching_templates_in_scim(settings, [f"*@old-{files['domain']}"], users, all_users_flag=True)
+
+
+OPERATIONS = {
+    "list-users": BulkOperation(["export-users"]),
+    "export-default-email": BulkOperation(["export-default-email"]),
+    "export-forwards": BulkOperation(["export-forwards"]),
+    "export-2fa": BulkOperation(["export-2fa"]),
+    "set-signatures": BulkOperation(["set-signatures", "--input", "{signature_input}", "--template", "{signature_template}", "--yes"]),
+    "create-scim-file": BulkOperation(["create-scim-file", "--output", "{scim_file}"]),
+    "scim-rename-file": BulkOperation(["scim-rename-file", "--input", "{scim_rename_input}", "--yes"]),
+    "logout-from-file": BulkOperation(["logout-from-file", "--input", "{logout_input}", "--yes"]),
+    "email-template-cleanup": BulkOperation(func="cleanup_old_domain_emails"),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_mock_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/_mock/stats", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def start_mock(dataset_path: str, latency_ms: float, rate_429: float, seed: int, log_file):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "y360_mock_server.py"), "--data", dataset_path, "--port", str(port),
+         "--latency-ms", str(latency_ms), "--rate-429", str(rate_429), "--seed", str(seed)],
+        stdout=log_file, stderr=log_file,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Mock server exited with code {process.returncode}")
+        try:
+            get_mock_stats(base_url)
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Mock server did not start in 300 seconds")
+
+
+def prepare_inputs(data: dict, workdir: str) -> dict:
+    """Input files of write operations: all users of the organization."""
+    users = [user for user in data['users'] if not user['isRobot']]
+    files = {
+        "domain": data['domain'],
+        "signature_input": os.path.join(workdir, "signature_input.csv"),
+        "signature_template": os.path.join(REPO_DIR, "signature_template.html"),
+        "scim_file": os.path.join(workdir, "scim_users_file.csv"),
+        "scim_rename_input": os.path.join(workdir, "scim_rename_input.csv"),
+        "logout_input": os.path.join(workdir, "logout_input.csv"),
+    }
+    with open(files['signature_input'], "w", encoding="utf-8") as f:
+        f.writelines(f"{user['nickname']}\n" for user in users)
+    with open(files['logout_input'], "w", encoding="utf-8") as f:
+        f.writelines(f"{user['id']}\n" for user in users)
+    with open(files['scim_rename_input'], "w", encoding="utf-8") as f:
+        f.write("uid;displayName;old_userName;new_userName\n")
+        f.writelines(f"{user['id']};{user['displayName']};{user['userName']};{user['userName'].split('@')[0]}\n" for user in data['scim_users'])
+    return files
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - килобайты, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(operation_name: str, base_url: str, workdir: str, files: dict) -> dict:
+    """Run one operation in this (child) process and return measurements."""
+    os.chdir(workdir)
+    console_module = load_console()
+    console_module.console.stderr = True
+    env = dict(os.environ, **mock_env(base_url, files['org_id']))
+    env.update(USERS_FILE_ARG=files['scim_file'], OUTPUT_DIR=workdir)
+    settings = console_module.get_settings(interactive=False, env=env)
+    if settings is None:
+        return {"exit_code": console_module.CLI_EXIT_USAGE}
+
+    operation = OPERATIONS[operation_name]
+    before = get_mock_stats(base_url)
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    if operation.argv:
+        args = console_module.parse_cli_arguments([arg.format(**files) for arg in operation.argv])
+        exit_code = console_module.run_cli_command(settings, args)
+    else:
+        globals()[operation.func](console_module, settings, files)
+        exit_code = console_module.CLI_EXIT_OK
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    after = get_mock_stats(base_url)
+    return {
+        "exit_code": exit_code,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "requests": after['requests'] - before['requests'],
+        "injected_429": after['injected_429'] - before['injected_429'],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_operation(operation_name: str, base_url: str, workdir: str, files: dict, verbose: bool) -> dict:
+    """Start child process for operation, it prints measurements as the last line of stdout."""
+    op_dir = os.path.join(workdir, operation_name)
+    os.makedirs(op_dir, exist_ok=True)
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", operation_name, "--mock-url", base_url,
+         "--workdir", op_dir, "--files", json.dumps(files)],
+        stdout=subprocess.PIPE, stderr=None if verbose else subprocess.DEVNULL, text=True, timeout=CHILD_TIMEOUT_SEC,
+    )
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return {"exit_code": result.returncode or 1, "error": "benchmark process failed"}
+    return json.loads(lines[-1])
+
+
+def run_benchmarks(args) -> list:
+    runs = []
+    workdir = tempfile.mkdtemp(prefix="y360_bench_")
+    try:
+        for size in args.sizes:
+            console.print(f"[bold]Generating organization with {size} users (seed {args.seed})...[/bold]")
+            data = generate_org(size, seed=args.seed)
+            size_dir = os.path.join(workdir, f"org_{size}")
+            os.makedirs(size_dir)
+            dataset_path = os.path.join(size_dir, "org.json")
+            save_dataset(data, dataset_path)
+            users_count = sum(1 for user in data['users'] if not user['isRobot'])
+            for latency in args.latencies:
+                case_dir = os.path.join(size_dir, f"latency_{latency:g}")
+                os.makedirs(case_dir)
+                files = dict(prepare_inputs(data, case_dir), org_id=data['org_id'])
+                with open(os.path.join(case_dir, "mock.log"), "w") as mock_log:
+                    mock, base_url = start_mock(dataset_path, latency, args.rate_429, args.seed, mock_log)
+                    try:
+                        for operation_name in args.operations:
+                            console.print(f"  {operation_name}: {size} users, latency {latency:g} ms...")
+                            result = run_operation(operation_name, base_url, case_dir, files, args.verbose)
+                            result.update(operation=operation_name, users=users_count, latency_ms=latency)
+                            if result.get('wall_s'):
+                                result['requests_per_sec'] = round(result['requests'] / result['wall_s'], 1)
+                                result['calls_per_user'] = round(result['requests'] / users_count, 2)
+                            runs.append(result)
+                    finally:
+                        mock.terminate()
+                        mock.wait()
+    finally:
+        if args.keep_workdir:
+            console.print(f"Work directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return runs
+
+
+def run_key(run: dict) -> tuple:
+    return run['operation'], run['users'], run['latency_ms']
+
+
+def compare_runs(runs: list, baseline_path: str, threshold: float) -> dict:
+    """Slowdown of wall time against baseline for matching (operation, users, latency)."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {run_key(run): run for run in json.load(f)['runs'] if run.get('wall_s')}
+    comparison = {}
+    for run in runs:
+        old = baseline.get(run_key(run))
+        if old and run.get('wall_s'):
+            change = run['wall_s'] / old['wall_s'] - 1
+            comparison[run_key(run)] = {"baseline_wall_s": old['wall_s'], "change": round(change, 3), "regression": change > threshold}
+    return comparison
+
+
+def show_results(runs: list, comparison: dict):
+    table = Table(title="Bulk operations benchmark")
+    for column in ("Operation", "Users", "Latency, ms", "Wall, s", "CPU, s", "Requests", "Req/s", "Calls/user", "Peak RSS, MB", "Exit"):
+        table.add_column(column, justify="left" if column == "Operation" else "right")
+    if comparison:
+        table.add_column("vs baseline", justify="right")
+    for run in runs:
+        row = [run['operation'], str(run['users']), f"{run['latency_ms']:g}", str(run.get('wall_s', '-')), str(run.get('cpu_s', '-')),
+               str(run.get('requests', '-')), str(run.get('requests_per_sec', '-')), str(run.get('calls_per_user', '-')),
+               str(run.get('peak_rss_mb', '-')), str(run['exit_code'])]
+        if comparison:
+            diff = comparison.get(run_key(run))
+            row.append("" if diff is None else f"[{'red' if diff['regression'] else 'green'}]{diff['change']:+.0%}[/]")
+        table.add_row(*row)
+    console.print(table)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of bulk operations against local mock Y360 API")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help=f"Organization sizes, users (default {DEFAULT_SIZES})")
+    parser.add_argument("--latencies", type=float, nargs="+", default=DEFAULT_LATENCIES_MS, help=f"API latencies, ms (default {DEFAULT_LATENCIES_MS})")
+    parser.add_argument("--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS), help="Operations to run (default all)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of 429 responses of mock server")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of synthetic organization (default 42)")
+    parser.add_argument("--output", "-o", help="Results file (default benchmarks/results/bulk_<date>.json)")
+    parser.add_argument("--compare", help="Previous results file to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Slowdown treated as regression (default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep generated files, outputs and logs")
+    parser.add_argument("--verbose", action="store_true", help="Show console output of operations")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--mock-url", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--files", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if args.child:
+        print(json.dumps(run_child(args.child, args.mock_url, args.workdir, json.loads(args.files))))
+        sys.exit(0)
+
+    runs = run_benchmarks(args)
+    comparison = compare_runs(runs, args.compare, args.threshold) if args.compare else {}
+    show_results(runs, comparison)
+
+    output = args.output or default_results_path("bulk")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": dict(run_metadata(), sizes=args.sizes, latencies_ms=args.latencies, rate_429=args.rate_429, seed=args.seed),
+                   "runs": runs,
+                   "comparison": [dict(operation=key[0], users=key[1], latency_ms=key[2], **value) for key, value in comparison.items()]},
+                  f, ensure_ascii=False, indent=2)
+    console.print(f"Results saved to {output}")
+
+    failed = [run for run in runs if run['exit_code'] != 0]
+    regressions = [key for key, value in comparison.items() if value['regression']]
+    if failed:
+        console.print(f"[red]{len(failed)} operation(s) finished with errors.[/red]")
+    if regressions:
+        console.print(f"[red]{len(regressions)} regression(s) slower than baseline by more than {args.threshold:.0%}.[/red]")
+    sys.exit(1 if failed or regressions else 0)
@@ -0,0 +1,46 @@
+"""
+Helpers shared by benchmark scripts.
+The console file name (360_text_admin_console.py) is not importable, so it is loaded by path.
+"""
+import importlib.util
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONSOLE_PATH = os.path.join(REPO_DIR, "360_text_admin_console.py")
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+# y360_mock_server.py и y360_synthetic_org.py лежат в корне репозитория
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def load_console():
+    """Import 360_text_admin_console.py as module y360_console."""
+    spec = importlib.util.spec_from_file_location("y360_console", CONSOLE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_metadata() -> dict:
+    """Where and on what code the benchmark was run (stored with results to compare releases)."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def default_results_path(prefix: str) -> str:
+    return os.path.join(RESULTS_DIR, f"{prefix}_{datetime.now():%Y%m%d_%H%M%S}.json")
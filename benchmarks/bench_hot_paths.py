@@ -0,0 +1,240 @@
+"""
+Micro-benchmarks of CPU-bound helpers of 360_text_admin_console.py on synthetic organizations.
+
+Each benchmark processes a list of inputs built from y360_synthetic_org.py dataset; reported are
+time per operation (best of --repeat runs) and allocations of one run measured with tracemalloc:
+peak of traced memory and memory still allocated after the run.
+Console logger is disabled: log records are not written, but f-string messages are still built.
+
+Usage:
+    python benchmarks/bench_hot_paths.py --sizes 10000 100000
+    python benchmarks/bench_hot_paths.py --sizes 10000 --only match_email_with_template find_user_by_search_term
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+from bench_common import REPO_DIR, load_console, run_metadata, default_results_path
+
+from rich.console import Console
+from rich.table import Table
+
+from y360_synthetic_org import generate_org, load_into_settings
+
+DEFAULT_SIZES = [10000, 100000]
+DEFAULT_REPEAT = 5
+SEARCH_QUERIES = 10000
+GROUP_SEARCH_QUERIES = 500
+EMAIL_TEMPLATES = ["*@old-example.com", "*.example.com", "a.*@*", "sales@*", "example.com"]
+
+console = Console()
+
+
+@dataclass
+class MicroBenchmark:
+    """run(inputs) processes all inputs, time per operation = time of run / number of operations."""
+    name : str
+    run : object
+    inputs : list
+    ops : int
+
+
+def make_settings(console_module, data: dict):
+    """Settings with caches filled from dataset, without reading .env and checking tokens."""
+    settings = console_module.SettingParams(**{field.name: None for field in fields(console_module.SettingParams)})
+    settings.new_login_default_format = "alias@domain.tld"
+    settings.ignore_user_domain = False
+    settings.dry_run = True
+    settings.interactive = False
+    load_into_settings(settings, data)
+    return settings
+
+
+def build_benchmarks(console_module, data: dict, rnd: random.Random) -> list:
+    settings = make_settings(console_module, data)
+    users = settings.all_users
+    domain = data['domain']
+
+    emails = [user['email'] for user in users] + [f"{alias}@{domain}" for user in users for alias in user['aliases']]
+    emails += [email['value'] for user in data['scim_users'] for email in user['emails']]
+    local_parts = [email.split("@")[0] for email in emails]
+
+    domains = [f"{user['nickname'].replace('.', '-')}.{domain}" for user in users]
+    # невалидные имена: пустые части, дефисы по краям, недопустимые символы, без точки
+    domains += [rnd.choice(["-bad.", "bad..", "bad_name.", "", "bad-.", "localhost"]) + name for name in domains[:len(domains) // 5]]
+
+    template = open(os.path.join(REPO_DIR, "signature_template.html"), "r", encoding="utf-8").read()
+    deps_tree = console_module.build_departments_tree(settings.all_deps)
+
+    def render_signatures(items):
+        for user in items:
+            console_module.substitute_template_variables(template, user, deps_tree, user['email'])
+
+    def build_deps_hierarchy(deps):
+        settings.all_deps = deps
+        settings.all_deps_get_timestamp = datetime.now()
+        settings.deps_tree = None
+        console_module.generate_deps_hierarchy_from_api(settings)
+
+    group_queries = []
+    for group in rnd.sample(data['groups'], min(GROUP_SEARCH_QUERIES, len(data['groups']))):
+        group_queries.append((rnd.choice([group['email'].split("@")[0], group['name'][:4], "no-such-group"]), "alias"))
+        group_queries.append((str(group['id']), "id"))
+
+    def find_groups(queries):
+        for search_string, search_type in queries:
+            console_module.find_group_by_param(data['groups'], search_string, search_type)
+
+    user_queries = []
+    for user in rnd.sample(users, min(SEARCH_QUERIES, len(users))):
+        user_queries.append(rnd.choice([user['nickname'], user['email'], user['id'], user['name']['last']]))
+
+    def find_users(queries):
+        for query in queries:
+            console_module.find_user_by_search_term(settings, query)
+
+    # индекс поиска строится при первом вызове, в замер не входит
+    console_module.get_users_search_index(settings)
+
+    scim_user_names = [user['userName'] for user in data['scim_users']]
+
+    def match_templates(items):
+        for email in items:
+            for email_template in EMAIL_TEMPLATES:
+                console_module.match_email_with_template(email_template, email)
+
+    def match_wildcards(items):
+        for text in items:
+            console_module.match_with_wildcard("a*v*", text)
+
+    def validate_domains(items):
+        for name in items:
+            console_module.validate_domain_name(name)
+
+    def format_user_names(items):
+        for user_name in items:
+            console_module.format_new_userName(user_name, settings.new_login_default_format)
+
+    return [
+        MicroBenchmark("match_email_with_template", match_templates, emails, len(emails) * len(EMAIL_TEMPLATES)),
+        MicroBenchmark("match_with_wildcard", match_wildcards, local_parts, len(local_parts)),
+        MicroBenchmark("validate_domain_name", validate_domains, domains, len(domains)),
+        MicroBenchmark("substitute_template_variables", render_signatures, users, len(users)),
+        MicroBenchmark("generate_deps_hierarchy_from_api", build_deps_hierarchy, settings.all_deps, len(settings.all_deps)),
+        MicroBenchmark("find_group_by_param", find_groups, group_queries, len(group_queries)),
+        MicroBenchmark("find_user_by_search_term", find_users, user_queries, len(user_queries)),
+        MicroBenchmark("format_new_userName", format_user_names, scim_user_names, len(scim_user_names)),
+    ]
+
+
+def measure(benchmark: MicroBenchmark, repeat: int) -> dict:
+    benchmark.run(benchmark.inputs)  # прогрев: кэши шаблонов и регулярных выражений
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            benchmark.run(benchmark.inputs)
+            timings.append(time.perf_counter_ns() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        benchmark.run(benchmark.inputs)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        "ops": benchmark.ops,
+        "ns_per_op": round(best / benchmark.ops, 1),
+        "median_ns_per_op": round(sorted(timings)[len(timings) // 2] / benchmark.ops, 1),
+        "total_ms": round(best / 1e6, 2),
+        "peak_alloc_kib": round(peak / 1024, 1),
+        "retained_kib": round(retained / 1024, 1),
+    }
+
+
+def compare_runs(runs: list, baseline_path: str, threshold: float) -> dict:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(run['benchmark'], run['size']): run for run in json.load(f)['runs']}
+    comparison = {}
+    for run in runs:
+        old = baseline.get((run['benchmark'], run['size']))
+        if old:
+            change = run['ns_per_op'] / old['ns_per_op'] - 1
+            comparison[(run['benchmark'], run['size'])] = {"baseline_ns_per_op": old['ns_per_op'], "change": round(change, 3), "regression": change > threshold}
+    return comparison
+
+
+def show_results(runs: list, comparison: dict):
+    table = Table(title="Hot paths micro-benchmarks")
+    for column in ("Benchmark", "Users", "Ops", "ns/op", "Median ns/op", "Peak alloc, KiB", "Retained, KiB"):
+        table.add_column(column, justify="left" if column == "Benchmark" else "right")
+    if comparison:
+        table.add_column("vs baseline", justify="right")
+    for run in runs:
+        row = [run['benchmark'], str(run['size']), str(run['ops']), f"{run['ns_per_op']:,.0f}", f"{run['median_ns_per_op']:,.0f}",
+               f"{run['peak_alloc_kib']:,.1f}", f"{run['retained_kib']:,.1f}"]
+        if comparison:
+            diff = comparison.get((run['benchmark'], run['size']))
+            row.append("" if diff is None else f"[{'red' if diff['regression'] else 'green'}]{diff['change']:+.0%}[/]")
+        table.add_row(*row)
+    console.print(table)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of CPU-bound helpers of 360_text_admin_console.py")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help=f"Organization sizes, users (default {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"Timed runs of each benchmark (default {DEFAULT_REPEAT})")
+    parser.add_argument("--only", nargs="+", help="Run only benchmarks with these names")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of synthetic organization and queries (default 42)")
+    parser.add_argument("--output", "-o", help="Results file (default benchmarks/results/hot_paths_<date>.json)")
+    parser.add_argument("--compare", help="Previous results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Slowdown treated as regression (default 0.15)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    output = os.path.abspath(args.output or default_results_path("hot_paths"))
+
+    # лог консоли создается в текущем каталоге при импорте
+    os.chdir(tempfile.mkdtemp(prefix="y360_bench_"))
+    console_module = load_console()
+    console_module.logger.disabled = True
+
+    runs = []
+    for size in args.sizes:
+        console.print(f"[bold]Generating organization with {size} users (seed {args.seed})...[/bold]")
+        data = generate_org(size, seed=args.seed)
+        for benchmark in build_benchmarks(console_module, data, random.Random(args.seed)):
+            if args.only and benchmark.name not in args.only:
+                continue
+            console.print(f"  {benchmark.name}: {benchmark.ops} operations...")
+            runs.append(dict(benchmark=benchmark.name, size=size, **measure(benchmark, args.repeat)))
+
+    comparison = compare_runs(runs, args.compare, args.threshold) if args.compare else {}
+    show_results(runs, comparison)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": dict(run_metadata(), sizes=args.sizes, repeat=args.repeat, seed=args.seed),
+                   "runs": runs,
+                   "comparison": [dict(benchmark=key[0], size=key[1], **value) for key, value in comparison.items()]},
+                  f, ensure_ascii=False, indent=2)
+    console.print(f"Results saved to {output}")
+    sys.exit(1 if any(value['regression'] for value in comparison.values()) else 0)
@@ -0,0 +1,572 @@
+"""
+Local stand-in for Yandex 360 API used by 360_text_admin_console.py (offline testing and benchmarking).
+
+Implements the endpoints the console calls: directory users/groups/departments, SCIM /v2/Users,
+admin mail settings (sender_info, user_rules), shared mailboxes, mail list permissions (cloud-api),
+security 2FA / domain sessions and whoami. Latency, page size, 429 and error responses are configurable.
+
+Usage:
+    python y360_mock_server.py --port 8361 --latency-ms 50 --rate-429 0.01
+and in .env of the console:
+    Y360_API_URL=http://127.0.0.1:8361
+    Y360_SCIM_API_URL=http://127.0.0.1:8361/scim/{domain_id}
+    Y360_API_URL_V2=http://127.0.0.1:8361/v1/admin/org
+"""
+import argparse
+import copy
+import gzip
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+MOCK_DEFAULT_HOST = "127.0.0.1"
+MOCK_DEFAULT_PORT = 8361
+MOCK_MAX_PAGE_SIZE = 1000
+MOCK_MAX_SCIM_PAGE_SIZE = 100
+MOCK_SHARED_PAGE_SIZE = 100
+
+SCIM_LIST_SCHEMA = "urn:ietf:params:scim:api:messages:2.0:ListResponse"
+SCIM_USER_SCHEMA = "urn:ietf:params:scim:schemas:core:2.0:User"
+SCIM_ENTERPRISE_SCHEMA = "urn:ietf:params:scim:schemas:extension:enterprise:2.0:User"
+SCIM_YANDEX_SCHEMA = "urn:ietf:params:scim:schemas:extension:yandex360:2.0:User"
+
+# Права токена, которые возвращает whoami (все, что нужны консоли)
+MOCK_TOKEN_SCOPES = [
+    "directory:read_users",
+    "directory:write_users",
+    "directory:read_departments",
+    "directory:write_departments",
+    "directory:read_groups",
+    "directory:write_groups",
+    "directory:read_organization",
+    "ya360_admin:mail_read_shared_mailbox_inventory",
+    "ya360_admin:mail_read_mail_list_permissions",
+    "ya360_admin:mail_write_mail_list_permissions",
+    "ya360_security:domain_2fa_write",
+    "ya360_security:domain_sessions_read",
+    "ya360_admin:mail_read_user_settings",
+    "ya360_admin:mail_write_user_settings",
+]
+
+logger = logging.getLogger("y360_mock_server")
+
+
+@dataclass
+class MockOptions:
+    """Fault and performance knobs of the mock server"""
+    latency_ms : float = 0.0
+    jitter_ms : float = 0.0
+    rate_429 : float = 0.0
+    error_rate : float = 0.0
+    rate_limit : float = 0.0
+    max_page_size : int = MOCK_MAX_PAGE_SIZE
+    max_scim_page_size : int = MOCK_MAX_SCIM_PAGE_SIZE
+    seed : int = 0
+
+
+@dataclass
+class MockStats:
+    requests : int = 0
+    injected_429 : int = 0
+    injected_errors : int = 0
+    by_route : dict = field(default_factory=dict)
+
+
+def sample_dataset(org_id: int = 1, domain: str = "example.com") -> dict:
+    """Small built-in organization used when no dataset file is given."""
+    def user(uid, nickname, first, last, department_id, aliases=()):
+        return {
+            "id": str(uid), "nickname": nickname, "departmentId": department_id,
+            "email": f"{nickname}@{domain}", "name": {"first": first, "last": last, "middle": ""},
+            "displayName": f"{first} {last}", "gender": "", "position": "", "about": "", "birthday": "",
+            "contacts": [{"type": "email", "value": f"{nickname}@{domain}", "main": True, "alias": False, "synthetic": True}],
+            "aliases": list(aliases), "groups": [], "externalId": "", "isAdmin": False, "isRobot": False,
+            "isDismissed": False, "isEnabled": True, "timezone": "Europe/Moscow", "language": "ru",
+            "createdAt": "2024-01-01T00:00:00Z", "updatedAt": "2024-01-01T00:00:00Z",
+        }
+    users = [
+        user(1130000000000001, "ivanov", "Ivan", "Ivanov", 1, ["ivan"]),
+        user(1130000000000002, "petrov", "Petr", "Petrov", 2),
+        user(1130000000000003, "sidorova", "Anna", "Sidorova", 2, ["anna", "sales-head"]),
+    ]
+    return {
+        "org_id": org_id,
+        "domain": domain,
+        "users": users,
+        "departments": [
+            {"id": 1, "name": "Все", "parentId": 0, "description": "", "externalId": "", "label": "", "email": "", "aliases": [], "membersCount": 3, "headId": "", "createdAt": "2024-01-01T00:00:00Z"},
+            {"id": 2, "name": "Sales", "parentId": 1, "description": "", "externalId": "", "label": "sales", "email": f"sales@{domain}", "aliases": [], "membersCount": 2, "headId": "", "createdAt": "2024-01-01T00:00:00Z"},
+        ],
+        "groups": [
+            {"id": 1, "name": "Managers", "type": "generic", "description": "", "label": "managers", "email": f"managers@{domain}",
+             "emailId": 1130000000100001, "aliases": [], "externalId": "", "removed": False, "membersCount": 2,
+             "members": [{"type": "user", "id": "1130000000000001"}, {"type": "user", "id": "1130000000000003"}],
+             "adminIds": [], "authorId": "", "memberOf": [], "createdAt": "2024-01-01T00:00:00Z"},
+        ],
+        "shared_mailboxes": [
+            {"id": "1130000000200001", "email": f"support@{domain}", "name": "Support", "description": "Support mailbox"},
+        ],
+    }
+
+
+class MockOrg:
+    """
+    In-memory organization. Missing per-user data (SCIM users, sender_info, rules, 2FA) is derived from directory users.
+    """
+    def __init__(self, data: dict):
+        self.lock = threading.Lock()
+        self.org_id = str(data.get('org_id', 1))
+        self.domain = data.get('domain', "example.com")
+        self.users = list(data.get('users', []))
+        self.users_by_id = {str(user['id']): user for user in self.users}
+        self.departments = list(data.get('departments', []))
+        self.groups = list(data.get('groups', []))
+        self.shared_mailboxes = {str(mailbox['id']): mailbox for mailbox in data.get('shared_mailboxes', [])}
+        scim_users = data.get('scim_users') or [scim_user_from_directory(user) for user in self.users]
+        self.scim_users = scim_users
+        self.scim_users_by_id = {str(user['id']): user for user in scim_users}
+        self.sender_info = dict(data.get('sender_info', {}))
+        self.user_rules = dict(data.get('user_rules', {}))
+        self.user_2fa = dict(data.get('user_2fa', {}))
+        self.domain_2fa = data.get('domain_2fa') or {"enabled": False, "duration": 0, "scope": "all"}
+        self.mail_list_permissions = dict(data.get('mail_list_permissions', {}))
+
+    def get_sender_info(self, uid: str) -> dict:
+        if uid not in self.sender_info:
+            user = self.users_by_id[uid]
+            self.sender_info[uid] = {
+                "defaultFrom": user.get('email', ''),
+                "fromName": user.get('displayName') or f"{user['name']['first']} {user['name']['last']}",
+                "signs": [],
+                "signPosition": "bottom",
+            }
+        return self.sender_info[uid]
+
+    def get_user_rules(self, uid: str) -> dict:
+        return self.user_rules.setdefault(uid, {"forwards": [], "autoreplies": []})
+
+    def get_user_2fa(self, uid: str) -> dict:
+        return self.user_2fa.setdefault(uid, {"has2fa": False, "hasSecurityPhone": False, "is2faEnabled": False})
+
+    def get_permissions(self, email_id: str) -> dict:
+        return self.mail_list_permissions.setdefault(email_id, {"grants": {"items": [
+            {"subject": {"type": "anonymous", "id": 0}, "roles": ["mail_list_sender"]}
+        ]}})
+
+
+def scim_user_from_directory(user: dict) -> dict:
+    domain = user.get('email', '@').split('@')[1]
+    return {
+        "schemas": [SCIM_USER_SCHEMA, SCIM_ENTERPRISE_SCHEMA, SCIM_YANDEX_SCHEMA],
+        "id": str(user['id']),
+        "userName": user.get('email', ''),
+        "displayName": user.get('displayName', ''),
+        "name": {"givenName": user['name'].get('first', ''), "familyName": user['name'].get('last', ''), "middleName": user['name'].get('middle', '')},
+        "emails": [{"value": user.get('email', ''), "primary": True, "type": "work"}],
+        "phoneNumbers": [],
+        "title": user.get('position', ''),
+        "active": not user.get('isDismissed', False),
+        SCIM_ENTERPRISE_SCHEMA: {"department": str(user.get('departmentId', ''))},
+        SCIM_YANDEX_SCHEMA: {"aliases": [{"login": f"{alias}@{domain}"} for alias in user.get('aliases', [])]},
+        "meta": {"resourceType": "User", "created": user.get('createdAt', ''), "lastModified": user.get('updatedAt', '')},
+    }
+
+
+def paginate(items: list, query: dict, max_page_size: int) -> tuple:
+    """Directory API pagination (page, perPage) - returns page items and pages count."""
+    per_page = min(int(query.get('perPage', 10)), max_page_size)
+    page = max(int(query.get('page', 1)), 1)
+    pages = max((len(items) + per_page - 1) // per_page, 1)
+    return items[(page - 1) * per_page:page * per_page], page, per_page, pages
+
+
+def apply_scim_patch(user: dict, patch: dict):
+    for operation in patch.get('Operations', []):
+        path = operation.get('path', '')
+        op = operation.get('op', 'replace').lower()
+        if path.startswith("urn:"):
+            schema, attribute = path.rsplit('.', 1)
+            target = user.setdefault(schema, {})
+        else:
+            target, attribute = user, path
+        if op == 'remove':
+            target.pop(attribute, None)
+        elif op == 'add' and isinstance(target.get(attribute), list):
+            value = operation.get('value')
+            target[attribute].extend(value if isinstance(value, list) else [value])
+        else:
+            target[attribute] = operation.get('value')
+
+
+def apply_role_actions(permissions: dict, role_actions: list):
+    items = permissions.setdefault('grants', {}).setdefault('items', [])
+    for action in role_actions:
+        subjects = action.get('subjects', [])
+        keys = {(subject.get('type'), str(subject.get('id'))) for subject in subjects}
+        if action.get('type') == 'overwrite':
+            items[:] = []
+        if action.get('type') == 'revoke':
+            items[:] = [item for item in items if (item['subject'].get('type'), str(item['subject'].get('id'))) not in keys]
+        else:
+            existing = {(item['subject'].get('type'), str(item['subject'].get('id'))) for item in items}
+            for subject in subjects:
+                if (subject.get('type'), str(subject.get('id'))) not in existing:
+                    items.append({"subject": {"type": subject.get('type'), "id": subject.get('id')}, "roles": list(action.get('roles', []))})
+
+
+class MockApi:
+    """
+    Routes requests to in-memory organization, injects latency, 429 and errors.
+    handle() returns (status, body, headers).
+    """
+    ROUTES = [
+        ("GET", r"/whoami", "whoami"),
+        ("GET", r"/directory/v1/org/(?P<org>\d+)/users", "users"),
+        ("GET", r"/directory/v1/org/(?P<org>\d+)/users/(?P<uid>\d+)", "user"),
+        ("PATCH", r"/directory/v1/org/(?P<org>\d+)/users/(?P<uid>\d+)", "user_patch"),
+        ("DELETE", r"/directory/v1/org/(?P<org>\d+)/users/(?P<uid>\d+)/aliases/(?P<alias>[^/]+)", "alias_delete"),
+        ("GET", r"/directory/v1/org/(?P<org>\d+)/users/(?P<uid>\d+)/2fa", "user_2fa"),
+        ("DELETE", r"/directory/v1/org/(?P<org>\d+)/users/(?P<uid>\d+)/2fa", "user_2fa_delete"),
+        ("GET", r"/directory/v1/org/(?P<org>\d+)/users/(?P<uid>\d+)/domain_2fa", "user_domain_2fa"),
+        ("GET", r"/directory/v1/org/(?P<org>\d+)/groups", "groups"),
+        ("GET", r"/directory/v1/org/(?P<org>\d+)/departments", "departments"),
+        ("GET", r"/admin/v1/org/(?P<org>\d+)/mail/users/(?P<uid>\d+)/settings/sender_info", "sender_info"),
+        ("POST", r"/admin/v1/org/(?P<org>\d+)/mail/users/(?P<uid>\d+)/settings/sender_info", "sender_info_post"),
+        ("GET", r"/admin/v1/org/(?P<org>\d+)/mail/users/(?P<uid>\d+)/settings/user_rules", "user_rules"),
+        ("DELETE", r"/admin/v1/org/(?P<org>\d+)/mail/users/(?P<uid>\d+)/settings/user_rules/(?P<rule>[^/]+)", "user_rule_delete"),
+        ("GET", r"/admin/v1/org/(?P<org>\d+)/mailboxes/shared", "shared_mailboxes"),
+        ("GET", r"/admin/v1/org/(?P<org>\d+)/mailboxes/shared/(?P<mailbox>\d+)", "shared_mailbox"),
+        ("GET", r"/security/v2/org/(?P<org>\d+)/domain_2fa", "domain_2fa"),
+        ("PUT", r"/security/v1/org/(?P<org>\d+)/domain_sessions/users/(?P<uid>\d+)/logout", "logout"),
+        ("GET", r"/v1/admin/org/(?P<org>\d+)/mail-lists/(?P<email_id>\d+)/permissions", "permissions"),
+        ("POST", r"/v1/admin/org/(?P<org>\d+)/mail-lists/(?P<email_id>\d+)/update-permissions", "update_permissions"),
+        ("GET", r"/scim(?:/[^/]+)?/v2/Users", "scim_users"),
+        ("GET", r"/scim(?:/[^/]+)?/v2/Users/(?P<uid>\d+)", "scim_user"),
+        ("PATCH", r"/scim(?:/[^/]+)?/v2/Users/(?P<uid>\d+)", "scim_user_patch"),
+        ("GET", r"/_mock/stats", "stats"),
+    ]
+
+    def __init__(self, org: MockOrg, options: MockOptions):
+        self.org = org
+        self.options = options
+        self.stats = MockStats()
+        self.random = random.Random(options.seed)
+        self.random_lock = threading.Lock()
+        self.limiter_lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.routes = [(method, re.compile(pattern + "$"), name) for method, pattern, name in self.ROUTES]
+
+    def draw(self) -> float:
+        with self.random_lock:
+            return self.random.random()
+
+    def over_rate_limit(self) -> bool:
+        if self.options.rate_limit <= 0:
+            return False
+        with self.limiter_lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count > self.options.rate_limit
+
+    def handle(self, method: str, path: str, query: dict, body: bytes):
+        for route_method, pattern, name in self.routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            return HTTPStatus.NOT_FOUND, {"code": "not_found", "message": f"{method} {path} is not implemented by mock"}
+
+        if name == "stats":
+            return HTTPStatus.OK, self.stats_body()
+
+        with self.random_lock:
+            self.stats.requests += 1
+            self.stats.by_route[name] = self.stats.by_route.get(name, 0) + 1
+
+        if self.options.latency_ms or self.options.jitter_ms:
+            time.sleep(max(0.0, self.options.latency_ms + (self.draw() * 2 - 1) * self.options.jitter_ms) / 1000)
+        if self.over_rate_limit() or (self.options.rate_429 and self.draw() < self.options.rate_429):
+            with self.random_lock:
+                self.stats.injected_429 += 1
+            return HTTPStatus.TOO_MANY_REQUESTS, {"code": "too_many_requests", "message": "Rate limit exceeded"}
+        if self.options.error_rate and self.draw() < self.options.error_rate:
+            with self.random_lock:
+                self.stats.injected_errors += 1
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"code": "internal", "message": "Injected error"}
+
+        params = match.groupdict()
+        if 'org' in params and params['org'] != self.org.org_id:
+            return HTTPStatus.FORBIDDEN, {"code": "forbidden", "message": f"Unknown organization {params['org']}"}
+        payload = json.loads(body) if body else {}
+        with self.org.lock:
+            return getattr(self, f"route_{name}")(params, query, payload)
+
+    def stats_body(self) -> dict:
+        with self.random_lock:
+            return {"requests": self.stats.requests, "injected_429": self.stats.injected_429,
+                    "injected_errors": self.stats.injected_errors, "by_route": dict(self.stats.by_route)}
+
+    def user_or_404(self, uid: str):
+        user = self.org.users_by_id.get(uid)
+        if user is None:
+            return None, (HTTPStatus.NOT_FOUND, {"code": "not_found", "message": f"User {uid} not found"})
+        return user, None
+
+    def route_whoami(self, params, query, payload):
+        return HTTPStatus.OK, {"login": "admin@" + self.org.domain, "orgIds": [int(self.org.org_id)], "scopes": MOCK_TOKEN_SCOPES}
+
+    def route_users(self, params, query, payload):
+        users, page, per_page, pages = paginate(self.org.users, query, self.options.max_page_size)
+        return HTTPStatus.OK, {"users": users, "page": page, "pages": pages, "perPage": per_page, "total": len(self.org.users)}
+
+    def route_user(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        return error or (HTTPStatus.OK, user)
+
+    def route_user_patch(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        if error:
+            return error
+        user.update(payload)
+        return HTTPStatus.OK, user
+
+    def route_alias_delete(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        if error:
+            return error
+        if params['alias'] not in user.get('aliases', []):
+            return HTTPStatus.NOT_FOUND, {"code": "not_found", "message": f"Alias {params['alias']} not found"}
+        user['aliases'].remove(params['alias'])
+        return HTTPStatus.OK, {"alias": params['alias'], "removed": True}
+
+    def route_user_2fa(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        if error:
+            return error
+        mfa = self.org.get_user_2fa(params['uid'])
+        return HTTPStatus.OK, {"userId": user['id'], "has2fa": mfa['has2fa'], "hasSecurityPhone": mfa['hasSecurityPhone']}
+
+    def route_user_2fa_delete(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        if error:
+            return error
+        self.org.get_user_2fa(params['uid'])['hasSecurityPhone'] = False
+        return HTTPStatus.OK, {}
+
+    def route_user_domain_2fa(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        if error:
+            return error
+        return HTTPStatus.OK, {"userId": user['id'], "is2faEnabled": self.org.get_user_2fa(params['uid'])['is2faEnabled']}
+
+    def route_groups(self, params, query, payload):
+        groups, page, per_page, pages = paginate(self.org.groups, query, self.options.max_page_size)
+        return HTTPStatus.OK, {"groups": groups, "page": page, "pages": pages, "perPage": per_page, "total": len(self.org.groups)}
+
+    def route_departments(self, params, query, payload):
+        departments, page, per_page, pages = paginate(self.org.departments, query, self.options.max_page_size)
+        return HTTPStatus.OK, {"departments": departments, "page": page, "pages": pages, "perPage": per_page, "total": len(self.org.departments)}
+
+    def route_sender_info(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        return error or (HTTPStatus.OK, self.org.get_sender_info(params['uid']))
+
+    def route_sender_info_post(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        if error:
+            return error
+        sender_info = self.org.get_sender_info(params['uid'])
+        sender_info.update(payload)
+        return HTTPStatus.OK, sender_info
+
+    def route_user_rules(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        return error or (HTTPStatus.OK, self.org.get_user_rules(params['uid']))
+
+    def route_user_rule_delete(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        if error:
+            return error
+        rules = self.org.get_user_rules(params['uid'])
+        for kind in ("forwards", "autoreplies"):
+            rules[kind] = [rule for rule in rules[kind] if str(rule.get('ruleId')) != params['rule']]
+        return HTTPStatus.OK, {}
+
+    def route_shared_mailboxes(self, params, query, payload):
+        mailboxes = [{"resourceId": mailbox_id, "count": 1} for mailbox_id in self.org.shared_mailboxes]
+        per_page = min(int(query.get('perPage', 10)), MOCK_SHARED_PAGE_SIZE)
+        page = max(int(query.get('page', 1)), 1)
+        return HTTPStatus.OK, {"resources": mailboxes[(page - 1) * per_page:page * per_page], "page": page, "perPage": per_page, "total": len(mailboxes)}
+
+    def route_shared_mailbox(self, params, query, payload):
+        mailbox = self.org.shared_mailboxes.get(params['mailbox'])
+        if mailbox is None:
+            return HTTPStatus.NOT_FOUND, {"code": "not_found", "message": f"Shared mailbox {params['mailbox']} not found"}
+        return HTTPStatus.OK, mailbox
+
+    def route_domain_2fa(self, params, query, payload):
+        return HTTPStatus.OK, self.org.domain_2fa
+
+    def route_logout(self, params, query, payload):
+        user, error = self.user_or_404(params['uid'])
+        return error or (HTTPStatus.OK, {})
+
+    def route_permissions(self, params, query, payload):
+        return HTTPStatus.OK, self.org.get_permissions(params['email_id'])
+
+    def route_update_permissions(self, params, query, payload):
+        apply_role_actions(self.org.get_permissions(params['email_id']), payload.get('role_actions', []))
+        return HTTPStatus.OK, {"task_id": str(uuid.uuid4())}
+
+    def route_scim_users(self, params, query, payload):
+        count = min(int(query.get('count', MOCK_MAX_SCIM_PAGE_SIZE)), self.options.max_scim_page_size)
+        start_index = max(int(query.get('startIndex', 1)), 1)
+        resources = self.org.scim_users[start_index - 1:start_index - 1 + count]
+        return HTTPStatus.OK, {"schemas": [SCIM_LIST_SCHEMA], "totalResults": len(self.org.scim_users),
+                               "itemsPerPage": count, "startIndex": start_index, "Resources": resources}
+
+    def route_scim_user(self, params, query, payload):
+        user = self.org.scim_users_by_id.get(params['uid'])
+        if user is None:
+            return HTTPStatus.NOT_FOUND, {"schemas": ["urn:ietf:params:scim:api:messages:2.0:Error"], "status": "404", "detail": "User not found"}
+        return HTTPStatus.OK, copy.deepcopy(user)
+
+    def route_scim_user_patch(self, params, query, payload):
+        user = self.org.scim_users_by_id.get(params['uid'])
+        if user is None:
+            return HTTPStatus.NOT_FOUND, {"schemas": ["urn:ietf:params:scim:api:messages:2.0:Error"], "status": "404", "detail": "User not found"}
+        apply_scim_patch(user, payload)
+        return HTTPStatus.OK, user
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # заголовки и тело пишутся отдельно: без TCP_NODELAY keep-alive клиент ждет delayed ACK (~40 мс на запрос)
+    disable_nagle_algorithm = True
+    api : MockApi = None
+
+    def handle_request(self, method: str):
+        parsed = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            status, payload = self.api.handle(method, parsed.path.rstrip("/") or "/", query, body)
+        except (ValueError, KeyError) as e:
+            status, payload = HTTPStatus.BAD_REQUEST, {"code": "bad_request", "message": f"{type(e).__name__}: {e}"}
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("x-request-id", uuid.uuid4().hex)
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_PATCH(self):
+        self.handle_request("PATCH")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def load_dataset(path: str) -> dict:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def create_mock_server(data: dict, options: MockOptions, host: str = MOCK_DEFAULT_HOST, port: int = MOCK_DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Create (not started) mock server. Port 0 - any free port (see server.server_address)."""
+    handler = type("BoundMockRequestHandler", (MockRequestHandler,), {"api": MockApi(MockOrg(data), options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_mock_server(data: dict, options: MockOptions = None, host: str = MOCK_DEFAULT_HOST, port: int = 0):
+    """Start mock server in background thread. Returns server and base URL."""
+    server = create_mock_server(data, options or MockOptions(), host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{server.server_address[0]}:{server.server_address[1]}"
+
+
+def mock_env(base_url: str, org_id) -> dict:
+    """Environment variables pointing the console at mock server."""
+    return {
+        "Y360_API_URL": base_url,
+        "Y360_SCIM_API_URL": f"{base_url}/scim/{{domain_id}}",
+        "Y360_API_URL_V2": f"{base_url}/v1/admin/org",
+        "ORG_ID_ARG": str(org_id),
+        "OAUTH_TOKEN_ARG": "mock-oauth-token",
+        "SCIM_TOKEN_ARG": "mock-scim-token",
+        "SCIM_DOMAIN_ID_ARG": "1",
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Local mock of Yandex 360 API for 360_text_admin_console.py")
+    parser.add_argument("--host", default=MOCK_DEFAULT_HOST, help=f"Listen address (default {MOCK_DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=MOCK_DEFAULT_PORT, help=f"Listen port (default {MOCK_DEFAULT_PORT})")
+    parser.add_argument("--data", help="Organization dataset (.json or .json.gz, see y360_synthetic_org.py). Default - small built-in organization")
+    parser.add_argument("--generate-users", type=int, help="Generate synthetic organization with this number of users instead of --data")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every response, ms")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- latency jitter, ms")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429 (0..1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500 (0..1)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests per second above which 429 is returned (0 - no limit)")
+    parser.add_argument("--max-page-size", type=int, default=MOCK_MAX_PAGE_SIZE, help=f"Max perPage of directory lists (default {MOCK_MAX_PAGE_SIZE})")
+    parser.add_argument("--max-scim-page-size", type=int, default=MOCK_MAX_SCIM_PAGE_SIZE, help=f"Max count of SCIM list (default {MOCK_MAX_SCIM_PAGE_SIZE})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of latency jitter, fault injection and generated organization")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    if args.generate_users:
+        from y360_synthetic_org import generate_org
+        data = generate_org(args.generate_users, seed=args.seed)
+    elif args.data:
+        data = load_dataset(args.data)
+    else:
+        data = sample_dataset()
+    options = MockOptions(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_429=args.rate_429, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, max_page_size=args.max_page_size, max_scim_page_size=args.max_scim_page_size, seed=args.seed,
+    )
+    server = create_mock_server(data, options, args.host, args.port)
+    base_url = f"http://{args.host}:{args.port}"
+    logger.info(f"Mock Y360 API for organization {data.get('org_id', 1)} ({len(data.get('users', []))} users) listening on {base_url}")
+    for key, value in mock_env(base_url, data.get('org_id', 1)).items():
+        logger.info(f"  {key}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopped.")
@@ -0,0 +1,320 @@
+"""
+Deterministic (seeded) generator of synthetic Yandex 360 organizations for benchmarks and scale tests.
+
+Produces dataset in the JSON shapes of Y360 API responses used by 360_text_admin_console.py
+(directory users/departments/groups, SCIM users, shared mailbox details, sender_info with signatures,
+user_rules, 2FA states, mail list permissions). The dataset can be served by y360_mock_server.py (--data)
+or loaded directly into console caches with load_into_settings().
+
+Usage:
+    python y360_synthetic_org.py --users 100000 --seed 42 -o org_100k.json.gz
+"""
+import argparse
+import gzip
+import json
+import random
+from datetime import datetime, timedelta
+
+from y360_mock_server import scim_user_from_directory, SCIM_YANDEX_SCHEMA
+
+FIRST_USER_ID = 1130000000000001
+FIRST_ROBOT_ID = 1120000000000001
+FIRST_GROUP_EMAIL_ID = 1130000000500001
+FIRST_SHARED_MAILBOX_ID = 1130000000900001
+BASE_DATE = datetime(2020, 1, 1)
+
+# (кириллица, транслитерация) - имена для правдоподобного поиска по ФИО и nickname
+FIRST_NAMES = [
+    ("Александр", "aleksandr"), ("Алексей", "aleksey"), ("Андрей", "andrey"), ("Анна", "anna"), ("Виктор", "viktor"),
+    ("Дмитрий", "dmitriy"), ("Евгений", "evgeniy"), ("Екатерина", "ekaterina"), ("Елена", "elena"), ("Иван", "ivan"),
+    ("Ирина", "irina"), ("Мария", "mariya"), ("Михаил", "mikhail"), ("Наталья", "natalya"), ("Николай", "nikolay"),
+    ("Ольга", "olga"), ("Павел", "pavel"), ("Светлана", "svetlana"), ("Сергей", "sergey"), ("Татьяна", "tatyana"),
+    ("Юлия", "yuliya"), ("Юрий", "yuriy"), ("Владимир", "vladimir"), ("Ксения", "kseniya"), ("Роман", "roman"),
+]
+LAST_NAMES = [
+    ("Иванов", "ivanov"), ("Смирнов", "smirnov"), ("Кузнецов", "kuznetsov"), ("Попов", "popov"), ("Васильев", "vasilev"),
+    ("Петров", "petrov"), ("Соколов", "sokolov"), ("Михайлов", "mikhaylov"), ("Новиков", "novikov"), ("Федоров", "fedorov"),
+    ("Морозов", "morozov"), ("Волков", "volkov"), ("Алексеев", "alekseev"), ("Лебедев", "lebedev"), ("Семенов", "semenov"),
+    ("Егоров", "egorov"), ("Павлов", "pavlov"), ("Козлов", "kozlov"), ("Степанов", "stepanov"), ("Николаев", "nikolaev"),
+    ("Орлов", "orlov"), ("Андреев", "andreev"), ("Макаров", "makarov"), ("Никитин", "nikitin"), ("Захаров", "zakharov"),
+    ("Зайцев", "zaytsev"), ("Соловьев", "solovev"), ("Борисов", "borisov"), ("Яковлев", "yakovlev"), ("Григорьев", "grigorev"),
+]
+MIDDLE_NAMES = ["Александрович", "Сергеевич", "Иванович", "Андреевич", "Петрович", "Владимирович", "Николаевич", ""]
+POSITIONS = ["Менеджер", "Инженер", "Бухгалтер", "Руководитель отдела", "Аналитик", "Разработчик", "Юрист", "Специалист", ""]
+DEPARTMENT_WORDS = ["Продажи", "Маркетинг", "Разработка", "Бухгалтерия", "Логистика", "Поддержка", "Закупки", "Финансы",
+                    "Кадры", "Безопасность", "Аналитика", "Производство", "Склад", "Сервис", "Качество", "Юридический"]
+GROUP_WORDS = ["team", "project", "news", "sales", "dev", "ops", "hr", "finance", "support", "office", "board", "all"]
+SIGNATURE_TEMPLATE = "<div>С уважением,<br/>{name}<br/>{position}<br/>{email}</div>"
+
+
+def generate_org(users: int = 1000, departments: int = None, groups: int = None, shared_mailboxes: int = None,
+                 max_department_depth: int = 8, seed: int = 0, org_id: int = 1, domain: str = "example.com") -> dict:
+    """
+    Generate organization dataset. The same arguments always give the same dataset.
+    By default: departments - users/50, groups - users/10, shared mailboxes - users/200.
+    """
+    rnd = random.Random(seed)
+    departments_count = departments if departments is not None else max(users // 50, 1)
+    groups_count = groups if groups is not None else users // 10
+    shared_count = shared_mailboxes if shared_mailboxes is not None else users // 200
+
+    deps = generate_departments(rnd, departments_count, max_department_depth, domain)
+    dir_users, scim_users = generate_users(rnd, users, deps, domain)
+    real_users = [user for user in dir_users if not user['isRobot']]
+    mailboxes = generate_shared_mailboxes(rnd, shared_count, domain)
+    dir_groups = generate_groups(rnd, groups_count, real_users, domain)
+
+    for dep in deps:
+        dep['membersCount'] = 0
+    deps_by_id = {dep['id']: dep for dep in deps}
+    for user in real_users:
+        deps_by_id[user['departmentId']]['membersCount'] += 1
+
+    return {
+        "org_id": org_id,
+        "domain": domain,
+        "seed": seed,
+        "users": dir_users,
+        "scim_users": scim_users,
+        "departments": deps,
+        "groups": dir_groups,
+        "shared_mailboxes": mailboxes,
+        "sender_info": {user['id']: generate_sender_info(rnd, user) for user in real_users},
+        "user_rules": {user['id']: rules for user in real_users if (rules := generate_user_rules(rnd, user, domain))},
+        "user_2fa": {user['id']: generate_user_2fa(rnd) for user in real_users},
+        "domain_2fa": {"enabled": True, "duration": 86400, "scope": "all"},
+        "mail_list_permissions": generate_mail_list_permissions(rnd, dir_groups, real_users, mailboxes, org_id),
+    }
+
+
+def iso_date(rnd: random.Random) -> str:
+    return (BASE_DATE + timedelta(seconds=rnd.randrange(5 * 365 * 86400))).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def generate_departments(rnd: random.Random, count: int, max_depth: int, domain: str) -> list:
+    """Department 1 is the root; every next department hangs under a random one not deeper than max_depth."""
+    deps = [department_record(1, "Все", 0, "", domain, BASE_DATE.strftime("%Y-%m-%dT%H:%M:%S.000Z"))]
+    depth = {1: 0}
+    parents = [1]
+    for dep_id in range(2, count + 1):
+        # чаще выбираются недавние подразделения, чтобы дерево было глубоким
+        parent = parents[-1 - min(int(rnd.expovariate(0.3)), len(parents) - 1)]
+        depth[dep_id] = depth[parent] + 1
+        name = f"{rnd.choice(DEPARTMENT_WORDS)} {dep_id}"
+        deps.append(department_record(dep_id, name, parent, f"dep{dep_id}", domain, iso_date(rnd)))
+        if depth[dep_id] < max_depth:
+            parents.append(dep_id)
+    return deps
+
+
+def department_record(dep_id: int, name: str, parent_id: int, label: str, domain: str, created: str) -> dict:
+    return {
+        "id": dep_id, "name": name, "parentId": parent_id, "description": "", "externalId": "",
+        "label": label, "email": f"{label}@{domain}" if label else "", "aliases": [],
+        "membersCount": 0, "headId": "", "createdAt": created,
+    }
+
+
+def generate_users(rnd: random.Random, count: int, deps: list, domain: str) -> tuple:
+    """Directory users (about 1% robots) and matching SCIM users (some with extra emails)."""
+    dir_users = []
+    scim_users = []
+    nicknames = {}
+    for index in range(count):
+        first, first_lat = rnd.choice(FIRST_NAMES)
+        last, last_lat = rnd.choice(LAST_NAMES)
+        if first_lat[-1] == "a" and not last.endswith("а"):
+            last, last_lat = last + "а", last_lat + "a"
+        nickname = f"{first_lat[0]}.{last_lat}"
+        if nickname in nicknames:
+            nicknames[nickname] += 1
+            nickname = f"{nickname}{nicknames[nickname]}"
+        nicknames[nickname] = 1
+        is_robot = rnd.random() < 0.01
+        uid = str((FIRST_ROBOT_ID if is_robot else FIRST_USER_ID) + index)
+        email = f"{nickname}@{domain}"
+        aliases = [f"{last_lat}{index}"] if rnd.random() < 0.3 else []
+        if rnd.random() < 0.1:
+            aliases.append(f"{first_lat}.{last_lat}.{index}")
+        contacts = [{"type": "email", "value": email, "main": True, "alias": False, "synthetic": True}]
+        contacts.extend({"type": "email", "value": f"{alias}@{domain}", "main": False, "alias": True, "synthetic": True} for alias in aliases)
+        if rnd.random() < 0.6:
+            contacts.append({"type": "phone", "value": f"+7 9{rnd.randrange(10**9):09d}", "main": False, "alias": False, "synthetic": False})
+        middle = rnd.choice(MIDDLE_NAMES)
+        if first_lat[-1] == "a" and middle:
+            middle = middle[:-3] + "вна"
+        created = iso_date(rnd)
+        user = {
+            "id": uid, "nickname": nickname, "departmentId": rnd.choice(deps)['id'],
+            "email": email, "name": {"first": first, "last": last, "middle": middle},
+            "displayName": f"{first} {last}", "gender": "female" if first_lat[-1] == "a" else "male",
+            "position": rnd.choice(POSITIONS), "about": "", "birthday": "",
+            "contacts": contacts, "aliases": aliases, "groups": [], "externalId": "",
+            "isAdmin": rnd.random() < 0.005, "isRobot": is_robot, "isDismissed": rnd.random() < 0.03,
+            "isEnabled": rnd.random() >= 0.03, "timezone": "Europe/Moscow", "language": "ru",
+            "createdAt": created, "updatedAt": created,
+        }
+        dir_users.append(user)
+        if is_robot:
+            continue
+        scim_user = scim_user_from_directory(user)
+        if rnd.random() < 0.05:
+            # письма на старых (отвязанных) доменах - для сценариев очистки SCIM
+            scim_user['emails'].append({"value": f"{nickname}@old-{domain}", "primary": False, "type": "other"})
+        scim_users.append(scim_user)
+    return dir_users, scim_users
+
+
+def generate_groups(rnd: random.Random, count: int, users: list, domain: str) -> list:
+    """Groups with user members and nested groups (group i may contain only groups with bigger id - no cycles)."""
+    groups = []
+    for group_id in range(1, count + 1):
+        label = f"{rnd.choice(GROUP_WORDS)}-{group_id}"
+        members = [{"type": "user", "id": user['id']} for user in rnd.sample(users, min(len(users), int(rnd.paretovariate(1.2) * 3)))] if users else []
+        groups.append({
+            "id": group_id, "name": label.replace("-", " ").title(), "type": "generic", "description": "",
+            "label": label, "email": f"{label}@{domain}", "emailId": FIRST_GROUP_EMAIL_ID + group_id,
+            "aliases": [f"{label}-list"] if rnd.random() < 0.1 else [], "externalId": "", "removed": False,
+            "members": members, "adminIds": [], "authorId": "", "memberOf": [], "createdAt": iso_date(rnd),
+        })
+    for group in groups:
+        if group['id'] < count and rnd.random() < 0.2:
+            for child_id in rnd.sample(range(group['id'] + 1, count + 1), min(rnd.randint(1, 3), count - group['id'])):
+                group['members'].append({"type": "group", "id": child_id})
+                groups[child_id - 1]['memberOf'].append(group['id'])
+    for group in groups:
+        group['membersCount'] = len(group['members'])
+    return groups
+
+
+def generate_shared_mailboxes(rnd: random.Random, count: int, domain: str) -> list:
+    mailboxes = []
+    for index in range(count):
+        name = f"{rnd.choice(GROUP_WORDS)}-box-{index + 1}"
+        mailboxes.append({"id": str(FIRST_SHARED_MAILBOX_ID + index), "email": f"{name}@{domain}",
+                          "name": name.replace("-", " ").title(), "description": f"Shared mailbox {index + 1}"})
+    return mailboxes
+
+
+def generate_sender_info(rnd: random.Random, user: dict) -> dict:
+    signs = []
+    if rnd.random() < 0.7:
+        text = SIGNATURE_TEMPLATE.format(name=user['displayName'], position=user['position'], email=user['email'])
+        signs.append({"text": text, "lang": "ru", "isDefault": True, "emails": []})
+        if rnd.random() < 0.2:
+            signs.append({"text": text.replace("С уважением", "Best regards"), "lang": "en", "isDefault": False, "emails": []})
+    default_from = user['email']
+    if user['aliases'] and rnd.random() < 0.2:
+        default_from = f"{user['aliases'][0]}@{user['email'].split('@')[1]}"
+    return {"defaultFrom": default_from, "fromName": user['displayName'], "signs": signs, "signPosition": rnd.choice(["bottom", "under"])}
+
+
+def generate_user_rules(rnd: random.Random, user: dict, domain: str) -> dict:
+    forwards = []
+    autoreplies = []
+    if rnd.random() < 0.05:
+        forwards.append({"ruleId": rnd.randrange(10**6), "ruleName": "forward", "address": f"{user['nickname']}@external-{domain}", "withStore": rnd.random() < 0.8})
+    if rnd.random() < 0.02:
+        autoreplies.append({"ruleId": rnd.randrange(10**6), "ruleName": "autoreply", "text": "Я в отпуске."})
+    if not (forwards or autoreplies):
+        return {}
+    return {"forwards": forwards, "autoreplies": autoreplies}
+
+
+def generate_user_2fa(rnd: random.Random) -> dict:
+    has2fa = rnd.random() < 0.6
+    return {"has2fa": has2fa, "hasSecurityPhone": has2fa and rnd.random() < 0.8, "is2faEnabled": rnd.random() < 0.5}
+
+
+def generate_mail_list_permissions(rnd: random.Random, groups: list, users: list, mailboxes: list, org_id: int) -> dict:
+    """Restricted senders for about 30% of groups, other groups are open (anonymous) - default of mock server."""
+    permissions = {}
+    for group in groups:
+        if rnd.random() >= 0.3:
+            continue
+        items = [{"subject": {"type": "user", "id": int(user['id']), "org_id": org_id}, "roles": ["mail_list_sender"]}
+                 for user in rnd.sample(users, min(len(users), rnd.randint(1, 5)))]
+        if mailboxes and rnd.random() < 0.2:
+            items.append({"subject": {"type": "shared_mailbox", "id": int(rnd.choice(mailboxes)['id']), "org_id": org_id}, "roles": ["mail_list_sender"]})
+        permissions[str(group['emailId'])] = {"grants": {"items": items}}
+    return permissions
+
+
+def save_dataset(data: dict, path: str):
+    # json.dumps целиком заметно быстрее потокового json.dump на больших наборах
+    text = json.dumps(data, ensure_ascii=False)
+    if path.endswith(".gz"):
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(text)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def load_dataset(path: str) -> dict:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_into_settings(settings, data: dict):
+    """
+    Put dataset into caches of console settings (as if it was just received from API), derived indexes are rebuilt on next use.
+    Robots are skipped like in get_all_api360_users_from_api.
+    """
+    now = datetime.now()
+    settings.all_users = [user for user in data['users'] if not user.get('isRobot') and int(user['id']) >= FIRST_USER_ID - 1]
+    settings.all_users_get_timestamp = now
+    settings.users_index = None
+    settings.all_scim_users = list(data.get('scim_users', []))
+    settings.all_scim_users_get_timestamp = now
+    settings.all_deps = list(data['departments'])
+    settings.all_deps_get_timestamp = now
+    settings.deps_tree = None
+    settings.all_groups = list(data['groups'])
+    settings.all_groups_get_timestamp = now
+    settings.shared_mailboxes = list(data.get('shared_mailboxes', []))
+    settings.shared_mailboxes_get_timestamp = now
+    settings.shared_mailboxes_index = None
+    settings.alias_owners_map = {}
+    settings.alias_owners_sources = ()
+
+
+def dataset_summary(data: dict) -> dict:
+    return {
+        "users": len(data['users']),
+        "robots": sum(1 for user in data['users'] if user['isRobot']),
+        "aliases": sum(len(user['aliases']) for user in data['users']),
+        "scim_users": len(data['scim_users']),
+        "scim_aliases": sum(len(user[SCIM_YANDEX_SCHEMA]['aliases']) for user in data['scim_users']),
+        "departments": len(data['departments']),
+        "groups": len(data['groups']),
+        "nested_groups": sum(1 for group in data['groups'] if group['memberOf']),
+        "shared_mailboxes": len(data['shared_mailboxes']),
+        "signatures": sum(len(info['signs']) for info in data['sender_info'].values()),
+        "forward_rules": sum(len(rules['forwards']) + len(rules['autoreplies']) for rules in data['user_rules'].values()),
+        "users_with_2fa": sum(1 for mfa in data['user_2fa'].values() if mfa['has2fa']),
+        "restricted_mail_lists": len(data['mail_list_permissions']),
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate synthetic Yandex 360 organization (JSON dataset for y360_mock_server.py)")
+    parser.add_argument("--users", type=int, default=1000, help="Number of users (default 1000)")
+    parser.add_argument("--departments", type=int, help="Number of departments (default users/50)")
+    parser.add_argument("--groups", type=int, help="Number of groups (default users/10)")
+    parser.add_argument("--shared-mailboxes", type=int, help="Number of shared mailboxes (default users/200)")
+    parser.add_argument("--max-department-depth", type=int, default=8, help="Max depth of departments tree (default 8)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default 0)")
+    parser.add_argument("--org-id", type=int, default=1, help="Organization id (default 1)")
+    parser.add_argument("--domain", default="example.com", help="Organization domain (default example.com)")
+    parser.add_argument("--output", "-o", required=True, help="Output file (.json or .json.gz)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    dataset = generate_org(args.users, args.departments, args.groups, args.shared_mailboxes, args.max_department_depth,
+                           args.seed, args.org_id, args.domain)
+    save_dataset(dataset, args.output)
+    print(f"Dataset saved to {args.output}: " + ", ".join(f"{key} {value}" for key, value in dataset_summary(dataset).items()))